@@ -67,7 +67,8 @@ function localFallbackReply(message) {
 }
 
 /* ------------- Quiz state ------------- */
-const quiz = { active:false, questions:[], idx:0, yesSymptoms:[], progressEl:null, progressBarEl:null, progressMsgEl:null };
+const quiz = { active:false, questions:[], idx:0, yesSymptoms:[], progressEl:null, progressBarEl:null, progressMsgEl:null,
+               adaptive:false, token:null, node:null, answers:[], total:0, waiting:false };
 
 /* ---------- Progress UI (circular ring card) ---------- */
 function attachProgressBar(total) {
@@ -222,6 +223,7 @@ function triggerConfetti(originX = window.innerWidth/2, originY = window.innerHe
 
 /* ------------- Quiz flow (same as before) ------------- */
 async function startQuiz(numQuestions=12) {
+  if (await startAdaptiveQuiz()) return;
   try {
     const res = await fetch(`${API_BASE_URL || ''}/quiz_questions?n=${numQuestions}`);
     if (!res.ok) throw new Error('Failed to load questions from server');
@@ -265,6 +267,66 @@ function askNextQuizQuestion() {
   updateProgress(quiz.questions.length);
 }
 
+/* ------------- Adaptive quiz (server picks each next question) ------------- */
+// Each response carries the next few questions as a yes/no tree (`plan`); answers are
+// collected locally and sent back only when the tree runs out or says the quiz is done.
+async function postAdaptiveQuiz(body) {
+  const res = await fetch(`${API_BASE_URL || ''}/quiz_adaptive`, {
+    method: 'POST',
+    headers: {'Content-Type':'application/json'},
+    body: JSON.stringify(body)
+  });
+  if (!res.ok) throw new Error('Adaptive quiz request failed');
+  return res.json();
+}
+
+async function startAdaptiveQuiz() {
+  let data;
+  try { data = await postAdaptiveQuiz({}); } catch (err) { return false; }
+  if (!data || data.done || !data.plan) return false;
+  quiz.questions=[]; quiz.idx=0; quiz.yesSymptoms=[]; quiz.active=true;
+  quiz.adaptive=true; quiz.token=data.token; quiz.node=data.plan; quiz.answers=[]; quiz.total=data.max_questions;
+  appendMessage("Let's do a quick self-check. I'll ask a few yes/no questions and stop as soon as the picture is clear.", 'bot');
+  attachProgressBar(quiz.total);
+  updateProgress(quiz.total);
+  askAdaptiveQuestion();
+  return true;
+}
+
+function askAdaptiveQuestion() {
+  appendMessage(quiz.node.question.text, 'bot');
+  showQuickReplies();
+  updateProgress(quiz.total);
+}
+
+async function adaptiveAnswer(yes) {
+  if (quiz.waiting || !quiz.node) return;
+  const key = quiz.node.question.symptom_key;
+  if (yes && key) quiz.yesSymptoms.push(key);
+  quiz.answers.push(yes);
+  quiz.idx++;
+  const next = yes ? quiz.node.yes : quiz.node.no;
+  if (next && !next.done) { quiz.node = next; askAdaptiveQuestion(); return; }
+
+  quiz.waiting = true;
+  try {
+    const data = await postAdaptiveQuiz({ token: quiz.token, answers: quiz.answers });
+    quiz.waiting = false;
+    if (data.done) {
+      showQuizResults(data.results || []);
+      resetQuiz();
+      return;
+    }
+    quiz.token=data.token; quiz.node=data.plan; quiz.answers=[];
+    askAdaptiveQuestion();
+  } catch (err) {
+    console.error(err);
+    // score the answers so far the classic way (it has its own client-side fallback)
+    quiz.waiting = false; quiz.adaptive = false;
+    submitQuizAnswers();
+  }
+}
+
 function showQuickReplies() {
   const html = `<div class="quick-replies">
     <button class="yes" id="qr-yes">Yes</button>
@@ -287,8 +349,8 @@ function showQuickReplies() {
   }, 20);
 }
 
-function quizAnswerYes() { if (!quiz.active) return; const q=quiz.questions[quiz.idx]; if(q&&q.symptom_key) quiz.yesSymptoms.push(q.symptom_key); quiz.idx++; updateProgress(quiz.questions.length); askNextQuizQuestion(); }
-function quizAnswerNo() { if (!quiz.active) return; quiz.idx++; updateProgress(quiz.questions.length); askNextQuizQuestion(); }
+function quizAnswerYes() { if (!quiz.active) return; if (quiz.adaptive) { adaptiveAnswer(true); return; } const q=quiz.questions[quiz.idx]; if(q&&q.symptom_key) quiz.yesSymptoms.push(q.symptom_key); quiz.idx++; updateProgress(quiz.questions.length); askNextQuizQuestion(); }
+function quizAnswerNo() { if (!quiz.active) return; if (quiz.adaptive) { adaptiveAnswer(false); return; } quiz.idx++; updateProgress(quiz.questions.length); askNextQuizQuestion(); }
 
 function showQuizFinishButtons() {
   document.querySelectorAll('.quiz-finish').forEach(el=>el.remove());
@@ -313,29 +375,36 @@ async function submitQuizAnswers() {
     });
     if (!res.ok) { appendMessage("Sorry — couldn't fetch results. Showing client-side suggestions.", 'bot'); clientSideQuizResults(); return; }
     const data = await res.json();
-    const results = data.results || [];
     document.querySelectorAll('.quiz-finish').forEach(el=>el.remove());
-
-    // celebration + pulse
-    try {
-      const ring = document.querySelector('.progress-ring');
-      const rect = ring ? ring.getBoundingClientRect() : null;
-      const originX = rect ? rect.left + rect.width/2 : window.innerWidth/2;
-      const originY = rect ? rect.top + rect.height/2 : window.innerHeight/3;
-      triggerConfetti(originX, originY, 22);
-    } catch(e){ /* ignore */ }
-
-    removeProgressBar();
-    displayResultsAsCards(results);
+    showQuizResults(data.results || []);
   } catch (err) {
     console.error(err);
     appendMessage("Error getting results. Showing client-side suggestions.", 'bot');
     clientSideQuizResults();
   } finally {
-    quiz.active=false; quiz.questions=[]; quiz.idx=0; quiz.yesSymptoms=[];
+    resetQuiz();
   }
 }
 
+function showQuizResults(results) {
+  // celebration + pulse
+  try {
+    const ring = document.querySelector('.progress-ring');
+    const rect = ring ? ring.getBoundingClientRect() : null;
+    const originX = rect ? rect.left + rect.width/2 : window.innerWidth/2;
+    const originY = rect ? rect.top + rect.height/2 : window.innerHeight/3;
+    triggerConfetti(originX, originY, 22);
+  } catch(e){ /* ignore */ }
+
+  removeProgressBar();
+  displayResultsAsCards(results);
+}
+
+function resetQuiz() {
+  quiz.active=false; quiz.questions=[]; quiz.idx=0; quiz.yesSymptoms=[];
+  quiz.adaptive=false; quiz.token=null; quiz.node=null; quiz.answers=[]; quiz.waiting=false;
+}
+
 function clientSideQuizResults() {
   const diseaseMap = {
     "Depression": ["feeling sad","loss of interest","sleep disturbance","appetite change","concentration problems"],
@@ -364,6 +433,7 @@ function displayResultsAsCards(results) {
     const card = document.createElement('div'); card.className='result-card';
     const title = document.createElement('h4'); title.textContent = r.disease; card.appendChild(title);
     const score = document.createElement('div'); score.className='score'; score.textContent = `Score: ${Number(r.score).toFixed(3)}`; card.appendChild(score);
+    if (typeof r.probability === 'number') score.textContent += ` · Likelihood: ${Math.round(r.probability * 100)}%`;
     const matchedWrap = document.createElement('div');
     if (r.matched_symptoms && r.matched_symptoms.length>0) {
       r.matched_symptoms.forEach(s => { const pill = document.createElement('span'); pill.className='symptom-pill'; pill.textContent=s; matchedWrap.appendChild(pill); });
@@ -384,9 +454,13 @@ async function sendMessageToServer(text) {
   const typing = document.createElement('div'); typing.className='message bot-message'; typing.textContent='...';
   if (mm) mm.appendChild(typing);
   try {
+    const headers = {'Content-Type':'application/json'};
+    // lets the server rate-limit per user instead of per IP only
+    const token = window.MentallifyAuth ? window.MentallifyAuth.getAuthToken() : '';
+    if (token) headers['Authorization'] = `Bearer ${token}`;
     const res = await fetch(`${API_BASE_URL || ''}/chat`, {
       method: 'POST',
-      headers: {'Content-Type':'application/json'},
+      headers,
       body: JSON.stringify({ message: text })
     });
     if (mm) typing.remove();
@@ -495,8 +569,115 @@ document.addEventListener('DOMContentLoaded', ()=> {
   // NOTE: floating/chat-toggle behavior removed intentionally.
 });
 
-/* ------------- Optional: attempt to load browser model (vocab + web_model.json) ------------- */
+/* ------------- Optional: attempt to load browser model ------------- */
+/* Prefers the compact binary export (models/web_model.manifest.json -> web_model.<hash>.bin,
+   see backend/export_model_for_browser.py); falls back to vocab.json + web_model.json. */
+function halfToFloat(h) {
+  const s = (h & 0x8000) ? -1 : 1, e = (h >> 10) & 0x1f, f = h & 0x3ff;
+  if (e === 0) return s * Math.pow(2, -14) * (f / 1024);
+  if (e === 31) return f ? NaN : s * Infinity;
+  return s * Math.pow(2, e - 15) * (1 + f / 1024);
+}
+
+function decodeBinaryModel(buf) {
+  const bytes = new Uint8Array(buf);
+  if (String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]) !== 'MNTL') throw new Error('not a MNTL model');
+  const dv = new DataView(buf);
+  if (dv.getUint16(4, true) !== 1) throw new Error('unsupported MNTL version');
+  const hlen = dv.getUint32(8, true);
+  const header = JSON.parse(new TextDecoder().decode(bytes.subarray(12, 12 + hlen)));
+  // browserModelPredict's tokenizer is the JS form of sklearn's default token_pattern only
+  if (header.tokenizer.token_pattern !== '(?u)\\b\\w\\w+\\b') throw new Error('unsupported MNTL token_pattern');
+  const sec = (name, Ctor) => {
+    const [off, len] = header.sections[name];
+    return new Ctor(buf, off, len / Ctor.BYTES_PER_ELEMENT);
+  };
+  const half = header.quant === 'float16';
+  return {
+    header,
+    idf: sec('idf', Uint16Array),
+    featurePtr: sec('feature_ptr', Uint32Array),
+    entryClass: sec('entry_class', Uint8Array),
+    entryWeight: half ? sec('entry_weight', Uint16Array) : sec('entry_weight', Int8Array),
+    termOffsets: sec('term_offsets', Uint32Array),
+    termBytes: sec('term_bytes', Uint8Array),
+    stopWords: new Set(header.tokenizer.stop_words),
+    encoder: new TextEncoder()
+  };
+}
+
+// binary search over the sorted UTF-8 term table; returns the feature id or -1
+function binaryModelLookup(m, term) {
+  const q = m.encoder.encode(term);
+  let lo = 0, hi = m.header.n_features - 1;
+  while (lo <= hi) {
+    const mid = (lo + hi) >> 1;
+    const start = m.termOffsets[mid], end = m.termOffsets[mid + 1];
+    let cmp = 0;
+    for (let i = 0; cmp === 0 && i < Math.min(q.length, end - start); i++) cmp = m.termBytes[start + i] - q[i];
+    if (cmp === 0) cmp = (end - start) - q.length;
+    if (cmp === 0) return mid;
+    if (cmp < 0) lo = mid + 1; else hi = mid - 1;
+  }
+  return -1;
+}
+
+function browserModelPredict(m, text) {
+  const tok = m.header.tokenizer;
+  const src = tok.lowercase ? String(text || '').toLowerCase() : String(text || '');
+  const toks = (src.match(/[\p{L}\p{N}_]{2,}/gu) || []).filter(t => !m.stopWords.has(t));
+  const [minN, maxN] = tok.ngram_range;
+  const grams = minN === 1 ? toks.slice() : [];
+  for (let n = Math.max(minN, 2); n <= Math.min(maxN, toks.length); n++) {
+    for (let i = 0; i + n <= toks.length; i++) grams.push(toks.slice(i, i + n).join(' '));
+  }
+  const counts = new Map();
+  grams.forEach(g => { const j = binaryModelLookup(m, g); if (j >= 0) counts.set(j, (counts.get(j) || 0) + 1); });
+
+  const k = m.header.intercept.length, scales = m.header.scales, half = m.header.quant === 'float16';
+  const acc = new Float64Array(k);
+  let normSq = 0, normL1 = 0;
+  counts.forEach((c, j) => {
+    const tf = tok.binary ? 1 : (tok.sublinear_tf ? 1 + Math.log(c) : c);
+    const w = tf * halfToFloat(m.idf[j]);
+    normSq += w * w;
+    normL1 += Math.abs(w);
+    for (let e = m.featurePtr[j]; e < m.featurePtr[j + 1]; e++) {
+      const cls = m.entryClass[e];
+      const q = half ? halfToFloat(m.entryWeight[e]) : m.entryWeight[e];
+      acc[cls] += tf * q * scales[cls];
+    }
+  });
+  const norm = (tok.norm === 'l2' ? Math.sqrt(normSq) : tok.norm === 'l1' ? normL1 : 1) || 1;
+  const dec = m.header.intercept.map((b, i) => b + acc[i] / norm);
+
+  let probs;
+  if (m.header.proba === 'softmax') {
+    const mx = Math.max(...dec), ex = dec.map(d => Math.exp(d - mx)), sum = ex.reduce((a, b) => a + b, 0);
+    probs = ex.map(v => v / sum);
+  } else {
+    const p = dec.map(d => 1 / (1 + Math.exp(-d)));
+    if (m.header.proba === 'binary') probs = [1 - p[0], p[0]];
+    else { const sum = p.reduce((a, b) => a + b, 0); probs = p.map(v => v / sum); }
+  }
+  const idx = probs.indexOf(Math.max(...probs));
+  return { label: m.header.classes[idx], probs };
+}
+
 async function tryLoadBrowserModel() {
+  try {
+    const manifestRes = await fetch('/models/web_model.manifest.json').catch(()=>null);
+    if (manifestRes && manifestRes.ok) {
+      const manifest = await manifestRes.json();
+      const binRes = await fetch(`/models/${manifest.file}`);
+      if (binRes.ok) {
+        const model = decodeBinaryModel(await binRes.arrayBuffer());
+        return { format: 'binary', model, predict: (text) => browserModelPredict(model, text) };
+      }
+    }
+  } catch(e) {
+    console.warn('binary browser model load failed, trying JSON', e);
+  }
   try {
     const [vocabRes, modelRes] = await Promise.all([
       fetch('/models/vocab.json').catch(()=>null),
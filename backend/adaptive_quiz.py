@@ -0,0 +1,201 @@
+# backend/adaptive_quiz.py
+"""
+Adaptive self-check: asks whichever question is expected to say the most about
+which disease fits, and stops as soon as one clearly stands out.
+
+Model (naive Bayes over the symptom bank): uniform prior over diseases; someone
+with disease d answers "yes" to a question about one of d's symptoms with
+probability `p_hit` and to any other question with `p_false`, so
+
+    log P(d | answers) = const + sum over answered q of log P(answer_q | d)
+
+The next question is the unasked one with the largest expected information
+gain, H(D) - E_answer[H(D | answer)]. That is the mutual information between the
+answer and the disease, Hb(P(yes)) - sum_d P(d) Hb(P(yes | d)) with Hb the
+binary entropy, so with Hb(P(yes | d)) precomputed per (question, disease),
+scoring every question is two matrix-vector products. The quiz stops when the
+top disease reaches `confidence`, when no question gains `min_gain` bits, or
+after `max_questions`.
+
+The whole state is two bitmasks over question ids (answered, answered yes),
+carried in an HMAC-signed token, so any worker can continue any quiz. The next
+question is a pure function of that state and is memoized. Every response
+carries the next `lookahead` levels of the decision tree; the client walks them
+locally and only sends back the answers it collected, so a quiz costs roughly
+questions / lookahead round trips.
+"""
+import base64
+import hashlib
+import hmac
+import json
+
+import numpy as np
+
+
+class QuizTokenError(ValueError):
+    pass
+
+
+def _bits(x):
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def _binary_entropy(p):
+    p = np.clip(p, 1e-12, 1.0 - 1e-12)
+    return -(p * np.log2(p) + (1.0 - p) * np.log2(1.0 - p))
+
+
+class AdaptiveQuiz:
+    def __init__(self, index, secret, p_hit=0.85, p_false=0.1, confidence=0.85, min_gain=0.02,
+                 max_questions=None, cache_size=100000):
+        self.index = index
+        self.diseases = [d[0] for d in index.diseases]
+        # one question per symptom key; the first wording wins
+        self.questions, seen = [], set()
+        for q in index.questions:
+            key = q.get('symptom_key') if isinstance(q, dict) else None
+            if key is not None and key not in seen:
+                seen.add(key)
+                self.questions.append(q)
+        n_q = len(self.questions)
+        self.max_questions = min(int(max_questions), n_q) if max_questions else n_q
+        self.confidence = float(confidence)
+        self.min_gain = float(min_gain)
+
+        member = np.zeros((n_q, len(self.diseases)), dtype=bool)
+        for qi, q in enumerate(self.questions):
+            sid = index.symptom_ids[q['symptom_key']]
+            for di, disease in enumerate(index.diseases):
+                member[qi, di] = (disease[2] >> sid) & 1
+        self.p_yes = np.where(member, p_hit, p_false)            # P(yes | disease), questions x diseases
+        self.noise = _binary_entropy(self.p_yes)                 # H(answer | disease)
+        self.log_yes = np.log(self.p_yes)
+        self.log_no = np.log(1.0 - self.p_yes)
+
+        # tokens from another bank or another model configuration fail verification
+        fingerprint = json.dumps([self.diseases, [q['symptom_key'] for q in self.questions], member.tolist(),
+                                  p_hit, p_false, self.confidence, self.min_gain, self.max_questions])
+        self._key = hmac.new(secret if isinstance(secret, bytes) else secret.encode('utf-8'),
+                             fingerprint.encode('utf-8'), hashlib.sha256).digest()
+        self._next = {}                # (answered, yes) -> question id, or -1 when finished
+        self.cache_size = cache_size
+        self.started = self.finished = self.questions_asked = 0
+
+    # -----------------------------
+    # Model
+    # -----------------------------
+    def posterior(self, answered, yes):
+        asked = list(_bits(answered))
+        log_p = (self.log_yes[[q for q in asked if (yes >> q) & 1]].sum(axis=0)
+                 + self.log_no[[q for q in asked if not (yes >> q) & 1]].sum(axis=0))
+        p = np.exp(log_p - log_p.max())
+        return p / p.sum()
+
+    def _choose(self, answered, yes):
+        if not self.diseases or bin(answered).count("1") >= self.max_questions:
+            return -1
+        p = self.posterior(answered, yes)
+        if p.max() >= self.confidence:
+            return -1
+        gain = _binary_entropy(self.p_yes @ p) - self.noise @ p
+        gain[list(_bits(answered))] = -1.0
+        best = int(gain.argmax())
+        return best if gain[best] >= self.min_gain else -1
+
+    def next_question(self, answered, yes):
+        """Question id to ask in this state, or -1 if the quiz is over."""
+        key = (answered, yes)
+        q = self._next.get(key)
+        if q is None:
+            if len(self._next) >= self.cache_size:
+                self._next.clear()
+            q = self._next[key] = self._choose(answered, yes)
+        return q
+
+    # -----------------------------
+    # Tokens
+    # -----------------------------
+    def _sign(self, payload):
+        digest = hmac.new(self._key, payload.encode('ascii'), hashlib.sha256).digest()[:12]
+        return base64.urlsafe_b64encode(digest).decode('ascii')
+
+    def encode(self, answered, yes):
+        payload = f"{answered:x}.{yes:x}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def decode(self, token):
+        try:
+            a, y, sig = token.split('.')
+            answered, yes = int(a, 16), int(y, 16)
+            valid = hmac.compare_digest(sig.encode('utf-8'), self._sign(f"{a}.{y}").encode('ascii'))
+        except (AttributeError, ValueError):
+            valid = False
+        if not valid:
+            raise QuizTokenError("invalid or expired quiz token")
+        return answered, yes
+
+    # -----------------------------
+    # Steps
+    # -----------------------------
+    def plan(self, answered, yes, depth):
+        """The decision tree below this state, `depth` questions deep (None past that)."""
+        if depth <= 0:
+            return None
+        qi = self.next_question(answered, yes)
+        if qi < 0:
+            return {'done': True}
+        bit = 1 << qi
+        return {
+            'question': self.questions[qi],
+            'yes': self.plan(answered | bit, yes | bit, depth - 1),
+            'no': self.plan(answered | bit, yes, depth - 1),
+        }
+
+    def results(self, answered, yes):
+        """/quiz_result entries plus each disease's `probability`, most probable first."""
+        yes_keys = [self.questions[qi]['symptom_key'] for qi in _bits(yes)]
+        probs = dict(zip(self.diseases, self.posterior(answered, yes).tolist()))
+        results = self.index.score(yes_keys)
+        for r in results:
+            r['probability'] = round(probs.get(r['disease'], 0.0), 4)
+        results.sort(key=lambda r: r['probability'], reverse=True)
+        return results
+
+    def step(self, token=None, answers=(), lookahead=3):
+        """
+        Applies `answers` (booleans, in the order the plan asked them) to the
+        state in `token` (a new quiz when None) and returns either
+        {'done': False, 'token', 'asked', 'max_questions', 'plan'} or
+        {'done': True, 'asked', 'results'}. Raises QuizTokenError.
+        """
+        if token is None:
+            answered = yes = 0
+            self.started += 1
+        else:
+            answered, yes = self.decode(token)
+        for answer in answers:
+            qi = self.next_question(answered, yes)
+            if qi < 0:
+                raise QuizTokenError("more answers than questions")
+            answered |= 1 << qi
+            if answer:
+                yes |= 1 << qi
+        asked = bin(answered).count("1")
+        if self.next_question(answered, yes) < 0:
+            self.finished += 1
+            self.questions_asked += asked
+            return {'done': True, 'asked': asked, 'results': self.results(answered, yes)}
+        return {'done': False, 'token': self.encode(answered, yes), 'asked': asked,
+                'max_questions': self.max_questions, 'plan': self.plan(answered, yes, lookahead)}
+
+    def stats(self):
+        return {
+            'questions': len(self.questions),
+            'started': self.started,
+            'finished': self.finished,
+            'avg_questions': round(self.questions_asked / self.finished, 3) if self.finished else None,
+            'cached_states': len(self._next),
+        }
@@ -0,0 +1,206 @@
+# backend/admission.py
+"""
+Admission control for the expensive endpoints (/chat, /send_contact, OAuth).
+
+Each guarded endpoint gets a Policy with:
+  - token buckets per client IP and per signed-in user (`ip_rate`/`ip_burst`,
+    `user_rate`/`user_burst`, in requests per second). An empty bucket means a
+    429 with Retry-After set to when the next token arrives;
+  - a concurrency limit (`concurrency` slots) with a bounded queue. A request
+    that would wait longer than `queue_ms` gets a 503 with Retry-After. Going by
+    the recent service time, it is turned away before it starts waiting;
+  - optionally `degrade_ms`. Once the average queue wait goes over that, the
+    endpoint is "degraded": a request only runs normally if a slot is free
+    right now, and otherwise it is admitted with g.degraded set, so the view
+    can answer cheaply (/chat uses keyword_fallback()). Normal service resumes
+    when the average drops below half the threshold.
+
+Requests are turned away before the view runs, so under overload the p99 of
+admitted requests stays near `queue_ms` plus the service time instead of
+growing with the backlog. All state is per process; under serve.py the
+effective limits are multiplied by the worker count.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class TokenBuckets:
+    """One token bucket per key; the least recently used keys are dropped past `max_keys`."""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()     # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1.0):
+        """0.0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / self.rate if self.rate > 0 else 3600.0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyLimit:
+    def __init__(self, limit, queue_timeout, max_waiting=None, alpha=0.2):
+        self.limit = max(1, int(limit))
+        self.queue_timeout = float(queue_timeout)
+        self.max_waiting = self.limit * 4 if max_waiting is None else int(max_waiting)
+        self.alpha = alpha
+        self._cond = threading.Condition()
+        self.in_flight = self.waiting = 0
+        self.wait_avg = 0.0            # EWMA of queue wait, seconds
+        self.service_avg = 0.0         # EWMA of time a slot is held
+        self.admitted = self.rejected = 0
+
+    def _record_wait(self, waited, admitted=True):
+        # turned-away requests count with the wait they would have had, so the
+        # average tracks demand rather than only what got through
+        self.wait_avg += self.alpha * (waited - self.wait_avg)
+        if admitted:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+
+    def expected_wait(self):
+        """Rough queue time for a new arrival, from the recent service time."""
+        if self.in_flight < self.limit:
+            return 0.0
+        return self.service_avg * (self.waiting + 1) / self.limit
+
+    def try_acquire(self):
+        """Takes a slot only if one is free and nobody is queued; never waits."""
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                self._record_wait(0.0)
+                return True
+            return False
+
+    def acquire(self):
+        """Waits up to queue_timeout for a slot; returns the wait in seconds or raises Rejected(503)."""
+        started = time.monotonic()
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                self._record_wait(0.0)
+                return 0.0
+            expected = self.expected_wait()
+            if self.waiting >= self.max_waiting or expected > self.queue_timeout:
+                self._record_wait(max(expected, self.queue_timeout), admitted=False)
+                raise Rejected(503, 'queue_full' if self.waiting >= self.max_waiting else 'queue_budget',
+                               expected)
+            deadline = started + self.queue_timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._record_wait(self.queue_timeout, admitted=False)
+                        raise Rejected(503, 'queue_timeout', self.expected_wait())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            waited = time.monotonic() - started
+            self._record_wait(waited)
+            return waited
+
+    def release(self, held_seconds):
+        with self._cond:
+            self.in_flight -= 1
+            self.service_avg += self.alpha * (held_seconds - self.service_avg)
+            self._cond.notify()
+
+
+class Policy:
+    def __init__(self, concurrency=None, queue_ms=1000.0, max_waiting=None, ip_rate=None, ip_burst=None,
+                 user_rate=None, user_burst=None, degrade_ms=None):
+        self.limit = ConcurrencyLimit(concurrency, queue_ms / 1000.0, max_waiting) if concurrency else None
+        self.ip_buckets = TokenBuckets(ip_rate, ip_burst or ip_rate) if ip_rate else None
+        self.user_buckets = TokenBuckets(user_rate, user_burst or user_rate) if user_rate else None
+        self.degrade_after = degrade_ms / 1000.0 if degrade_ms else None
+        self.degraded = False
+        self.degraded_requests = 0
+        self.rate_limited = {'ip': 0, 'user': 0}
+
+    def is_degraded(self):
+        if self.degrade_after is None or self.limit is None:
+            return False
+        avg = self.limit.wait_avg
+        if not self.degraded and avg > self.degrade_after:
+            self.degraded = True
+            print(f"[admission] degraded: queue wait {avg * 1000.0:.0f}ms")
+        elif self.degraded and avg < self.degrade_after / 2:
+            self.degraded = False
+            print(f"[admission] recovered: queue wait {avg * 1000.0:.0f}ms")
+        return self.degraded
+
+    def check_rates(self, ip, user):
+        for kind, buckets, key in (('ip', self.ip_buckets, ip), ('user', self.user_buckets, user)):
+            if buckets is None or key is None:
+                continue
+            wait = buckets.take(key)
+            if wait:
+                self.rate_limited[kind] += 1
+                raise Rejected(429, f'{kind}_rate', wait)
+
+    def admit(self):
+        """(slot held, degraded). Raises Rejected when the request should be turned away."""
+        if self.limit is None:
+            return False, False
+        if self.is_degraded():
+            if self.limit.try_acquire():
+                return True, False
+            self.degraded_requests += 1
+            return False, True
+        try:
+            self.limit.acquire()
+        except Rejected:
+            if self.degrade_after is None:
+                raise
+            self.degraded_requests += 1
+            return False, True
+        return True, False
+
+    def release(self, held_seconds):
+        self.limit.release(held_seconds)
+
+    def stats(self):
+        out = {
+            'degraded': self.degraded,
+            'degraded_requests': self.degraded_requests,
+            'rate_limited': dict(self.rate_limited),
+        }
+        if self.limit is not None:
+            lim = self.limit
+            out.update(concurrency=lim.limit, in_flight=lim.in_flight, waiting=lim.waiting,
+                       admitted=lim.admitted, rejected=lim.rejected,
+                       queue_wait_ms=round(lim.wait_avg * 1000.0, 3),
+                       service_ms=round(lim.service_avg * 1000.0, 3))
+        return out
@@ -1,19 +1,30 @@
 # backend/app.py
+import time
+STARTUP_T0 = time.perf_counter()
+
 import os
 import json
 import traceback
-import csv
-import time
 from io import StringIO
-from flask import Flask, request, jsonify, send_from_directory, Response, send_file
+from flask import Flask, request, jsonify, Response, send_file, abort, g, stream_with_context
 from flask_cors import CORS
-import joblib
-import smtplib
-from email.message import EmailMessage
 from dotenv import load_dotenv
-import requests
-import jwt
 import datetime
+import signal
+import threading
+from contextlib import contextmanager
+from microbatch import MicroBatcher
+from prediction_cache import PredictionCache
+from keyword_matcher import KeywordMatcher
+from symptom_index import SymptomIndex
+from static_assets import StaticAssets
+from feedback_log import FeedbackLog
+from metrics import REGISTRY as metrics, SamplingProfiler
+from admission import Policy, Rejected
+import artifact_store
+from artifact_store import ArtifactBundle
+# joblib/sklearn, numpy, requests, jwt, smtplib and email are imported where
+# they are first used, so static pages don't wait on them (see STARTUP_MODE).
 
 # -----------------------------
 # Load environment (.env at project root)
@@ -23,11 +34,34 @@ FRONTEND_ROOT = os.path.abspath(os.path.join(BASE, '..'))   # .../project
 ENV_PATH = os.path.join(FRONTEND_ROOT, '.env')
 load_dotenv(ENV_PATH)
 
+# -----------------------------
+# Startup mode / timings
+# -----------------------------
+#   eager       load artifacts, symptom bank, outbox and message store at import (default)
+#   lazy        load each on first use; the first /readyz starts a background warm-up
+#   background  return from import right away and warm up in a background thread
+STARTUP_MODE = (os.getenv("STARTUP_MODE") or "eager").lower()
+
+# stage -> milliseconds, logged as "[startup] ..." and reported by /readyz
+startup_timings = {'imports': round((time.perf_counter() - STARTUP_T0) * 1000.0, 1)}
+
+@contextmanager
+def startup_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[stage] = round((time.perf_counter() - started) * 1000.0, 1)
+
 # Google / OAuth config from env
 GOOGLE_CLIENT_ID = os.getenv("ID")
 GOOGLE_CLIENT_SECRET = os.getenv("Pasww")
 OAUTH_SECRET_KEY = os.getenv("Nothing")  # used to sign JWT tokens for session
 
+# Endpoints are overridable for local testing (see fake_oauth_server.py); unset means Google's.
+GOOGLE_AUTH_URL = os.getenv("GOOGLE_AUTH_URL") or "https://accounts.google.com/o/oauth2/v2/auth"
+OAUTH_REDIRECT_URI = os.getenv("OAUTH_REDIRECT_URI") or "http://localhost:5000/auth/google/callback"
+
 # For localhost testing only: allow insecure transport for oauthlib
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
@@ -37,6 +71,123 @@ os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 app = Flask(__name__, static_folder=None)
 CORS(app)
 
+# -----------------------------
+# Metrics (GET /metrics in Prometheus text format; see metrics.py)
+# -----------------------------
+metrics.describe('mentallify_http_requests_total', 'counter', "HTTP requests by endpoint, method and status")
+metrics.describe('mentallify_http_in_flight', 'gauge', "Requests currently being handled, by endpoint")
+metrics.describe('mentallify_http_request_seconds', 'histogram', "Request latency by endpoint")
+metrics.describe('mentallify_chat_fallback_total', 'counter', "Chat replies served by keyword_fallback, by reason")
+metrics.describe('mentallify_artifact_load_seconds', 'gauge', "Duration of the most recent artifact load")
+metrics.describe('mentallify_artifact_loads_total', 'counter', "Artifact loads by result")
+metrics.describe('mentallify_smtp_seconds', 'histogram', "SMTP connect/send time")
+metrics.describe('mentallify_oauth_seconds', 'histogram', "Google OAuth call time by step")
+metrics.describe('mentallify_oauth_userinfo_fallback_total', 'counter',
+                 "Logins that needed the userinfo call, by reason")
+
+# Opt-in wall-clock sampling profiler; toggle at runtime with POST /admin/profile.
+# Started on the first request so that, under serve.py, it runs in each worker.
+profiler = SamplingProfiler(interval_ms=float(os.getenv("PROFILER_INTERVAL_MS") or 10))
+PROFILER = os.getenv("PROFILER", "0") == "1"
+
+@app.before_request
+def _metrics_before():
+    if PROFILER and not profiler.running:
+        profiler.start()
+    g.started = time.perf_counter()
+    g.endpoint = request.endpoint or 'unmatched'
+    metrics.inc('mentallify_http_in_flight', endpoint=g.endpoint)
+
+@app.after_request
+def _metrics_after(response):
+    endpoint = g.get('endpoint', 'unmatched')
+    metrics.inc('mentallify_http_requests_total', endpoint=endpoint, method=request.method,
+                status=str(response.status_code))
+    if 'started' in g:
+        metrics.observe('mentallify_http_request_seconds', time.perf_counter() - g.started, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def _metrics_teardown(exc):
+    if 'endpoint' in g:
+        metrics.dec('mentallify_http_in_flight', endpoint=g.endpoint)
+
+# -----------------------------
+# Admission control (opt-in, see admission.py)
+# -----------------------------
+# Per-endpoint limits, keyed by Flask endpoint name. ADMISSION_POLICY is JSON
+# merged over these, e.g. {"chat": {"concurrency": 16}, "send_contact": null}.
+ADMISSION = os.getenv("ADMISSION", "0") == "1"
+ADMISSION_DEFAULTS = {
+    'chat': {'concurrency': 8, 'queue_ms': 250, 'degrade_ms': 100,
+             'ip_rate': 5, 'ip_burst': 20, 'user_rate': 10, 'user_burst': 40},
+    'chat_batch_endpoint': {'concurrency': 2, 'queue_ms': 1000, 'ip_rate': 0.5, 'ip_burst': 5},
+    'send_contact': {'concurrency': 4, 'queue_ms': 2000, 'ip_rate': 0.1, 'ip_burst': 5,
+                     'user_rate': 0.1, 'user_burst': 5},
+    'auth_google_callback': {'concurrency': 8, 'queue_ms': 2000, 'ip_rate': 1, 'ip_burst': 10},
+}
+# X-Forwarded-For is only trusted behind a proxy that sets it
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"
+
+def build_admission_policies():
+    config = {name: dict(cfg) for name, cfg in ADMISSION_DEFAULTS.items()}
+    for name, override in json.loads(os.getenv("ADMISSION_POLICY") or "{}").items():
+        if override is None:
+            config.pop(name, None)
+        else:
+            config.setdefault(name, {}).update(override)
+    return {name: Policy(**cfg) for name, cfg in config.items()}
+
+admission_policies = build_admission_policies() if ADMISSION else {}
+metrics.describe('mentallify_admission_rejected_total', 'counter', "Requests turned away, by endpoint and reason")
+
+def client_ip(headers, remote_addr):
+    if TRUST_PROXY_HEADERS and headers.get('X-Forwarded-For'):
+        return headers['X-Forwarded-For'].split(',')[0].strip()
+    return remote_addr or 'unknown'
+
+def request_user(authorization):
+    """Email from a valid session token (the JWT /auth/google/callback issues), else None."""
+    auth = authorization or ''
+    if not auth.startswith('Bearer ') or not OAUTH_SECRET_KEY:
+        return None
+    import jwt
+    try:
+        return jwt.decode(auth[7:], OAUTH_SECRET_KEY, algorithms=["HS256"]).get('email')
+    except jwt.InvalidTokenError:
+        return None
+
+def rejection_body(e):
+    error = "Too many requests." if e.status == 429 else "Server busy, please retry shortly."
+    return {'error': error, 'retry_after': e.retry_after}
+
+@app.before_request
+def _admission_before():
+    policy = admission_policies.get(request.endpoint)
+    if policy is None:
+        return None
+    try:
+        policy.check_rates(client_ip(request.headers, request.remote_addr),
+                           request_user(request.headers.get('Authorization')))
+        slot, g.degraded = policy.admit()
+    except Rejected as e:
+        metrics.inc('mentallify_admission_rejected_total', endpoint=request.endpoint, reason=e.reason)
+        resp = jsonify(rejection_body(e))
+        resp.headers['Retry-After'] = str(e.retry_after)
+        return resp, e.status
+    if slot:
+        g.admission = (policy, time.perf_counter())
+    return None
+
+def _release_admission(held):
+    if held is not None:
+        policy, started = held
+        policy.release(time.perf_counter() - started)
+
+@app.teardown_request
+def _admission_teardown(exc):
+    _release_admission(g.pop('admission', None))
+
 MAIL_SERVER = os.getenv("MAIL_SERVER")
 MAIL_PORT = int(os.getenv("MAIL_PORT") or 587)
 MAIL_USERNAME = os.getenv("MAIL_USERNAME")
@@ -54,6 +205,15 @@ if not (MAIL_SERVER and MAIL_USERNAME and MAIL_PASSWORD and MAIL_TO):
 MODELS_DIR = os.path.join(FRONTEND_ROOT, 'models')
 DATA_DIR = os.path.join(FRONTEND_ROOT, 'data')
 
+# Frontend + models/ files served from memory with gzip/br variants and ETags
+# (see static_assets.py). STATIC_CACHE_MAX_BYTES=0 streams everything from disk.
+static_assets = StaticAssets(
+    FRONTEND_ROOT,
+    max_file_bytes=int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES") or 16 * 1024 * 1024),
+    max_total_bytes=int(os.getenv("STATIC_CACHE_MAX_BYTES") or 128 * 1024 * 1024),
+    check_interval=float(os.getenv("STATIC_CACHE_CHECK_INTERVAL") or 2),
+)
+
 # -----------------------------
 # ML artifact loading (optional)
 # -----------------------------
@@ -61,13 +221,39 @@ TFIDF_PATH = os.path.join(BASE, 'tfidf_vectorizer.pkl')
 MODEL_PATH = os.path.join(BASE, 'mental_health_model.pkl')
 LE_PATH = os.path.join(BASE, 'label_encoder.pkl')
 
-tfidf = model = label_encoder = None
+# Versioned artifacts (see artifact_store.py) are used when ARTIFACTS_DIR/CURRENT
+# exists; otherwise the pickles above are loaded directly.
+ARTIFACTS_DIR = artifact_store.ARTIFACTS_DIR
+
+INFERENCE_STAGE = artifact_store.INFERENCE_STAGE
+
+# 'sklearn' serves the pickled TfidfVectorizer + LogisticRegression;
+# 'compiled' serves compiled_model.npz with NumPy only (see compiled_model.py).
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "sklearn")
+
+# The one reference request handlers read. load_artifacts() builds a complete
+# new bundle before swapping it in, so a request sees either the old model or
+# the new one, never a mix.
+artifacts = ArtifactBundle()
+_reload_lock = threading.Lock()
+_artifacts_loaded = threading.Event()
+_first_load_lock = threading.Lock()
+reload_status = {'state': 'idle', 'version': None, 'error': None, 'finished_at': None}
+
+# Prediction cache keyed on normalized message text; cleared on every artifact load.
+# CHAT_CACHE_MAX_ENTRIES=0 disables it.
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES") or 10000),
+    max_bytes=int(os.getenv("CHAT_CACHE_MAX_BYTES") or 32 * 1024 * 1024),
+    ttl_seconds=float(os.getenv("CHAT_CACHE_TTL") or 0) or None,
+)
 
 def safe_load(path, name):
     if not os.path.exists(path):
         print(f"[artifact] {name} not found at {path}")
         return None
     try:
+        import joblib
         obj = joblib.load(path)
         print(f"[artifact] Loaded {name}")
         return obj
@@ -76,68 +262,210 @@ def safe_load(path, name):
         traceback.print_exc()
         return None
 
-def load_artifacts():
-    global tfidf, model, label_encoder
-    tfidf = safe_load(TFIDF_PATH, 'tfidf_vectorizer.pkl')
-    model = safe_load(MODEL_PATH, 'mental_health_model.pkl')
-    label_encoder = safe_load(LE_PATH, 'label_encoder.pkl')
-    print("Artifacts status -> tfidf:", bool(tfidf), "model:", bool(model), "label_encoder:", bool(label_encoder))
+def load_compiled():
+    """Loads compiled_model.npz, recompiling it from the pickles if it is missing or stale."""
+    from compiled_model import CompiledLinearModel, COMPILED_PATH, compile_artifacts, save_compiled
+    stale = os.path.exists(MODEL_PATH) and (
+        not os.path.exists(COMPILED_PATH) or os.path.getmtime(COMPILED_PATH) < os.path.getmtime(MODEL_PATH))
+    if stale:
+        t, m, le = (safe_load(TFIDF_PATH, 'tfidf_vectorizer.pkl'), safe_load(MODEL_PATH, 'mental_health_model.pkl'),
+                    safe_load(LE_PATH, 'label_encoder.pkl'))
+        if t is not None and m is not None and le is not None:
+            try:
+                save_compiled(compile_artifacts(t, m, le), COMPILED_PATH)
+                print("[artifact] Compiled model written to", COMPILED_PATH)
+            except Exception as e:
+                # never serve an older compiled model than the pickles
+                print("[artifact] Failed to compile model:", e)
+                return None
+    if not os.path.exists(COMPILED_PATH):
+        print(f"[artifact] compiled_model.npz not found at {COMPILED_PATH}")
+        return None
+    try:
+        obj = CompiledLinearModel.load(COMPILED_PATH)
+        print("[artifact] Loaded compiled_model.npz")
+        return obj
+    except Exception as e:
+        print(f"[artifact] Failed to load compiled_model.npz: {e}")
+        traceback.print_exc()
+        return None
+
+def load_legacy_bundle(engine):
+    if engine == 'compiled':
+        compiled = load_compiled()
+        if compiled is not None:
+            return ArtifactBundle('legacy', 'compiled', compiled=compiled)
+        print("[artifact] compiled engine unavailable, falling back to sklearn")
+    return ArtifactBundle(
+        'legacy', 'sklearn',
+        tfidf=safe_load(TFIDF_PATH, 'tfidf_vectorizer.pkl'),
+        model=safe_load(MODEL_PATH, 'mental_health_model.pkl'),
+        label_encoder=safe_load(LE_PATH, 'label_encoder.pkl'),
+    )
+
+def load_artifacts(engine=None, version=None):
+    """Builds a bundle (versioned if available, else legacy pickles) and swaps it in."""
+    global artifacts
+    engine = engine or INFERENCE_ENGINE
+    started = time.perf_counter()
+    with _reload_lock:
+        bundle = None
+        if version or artifact_store.current_version(ARTIFACTS_DIR):
+            try:
+                bundle = artifact_store.load_version(version, engine, root=ARTIFACTS_DIR)
+                print(f"[artifact] Loaded version {bundle.version} ({bundle.engine})")
+            except Exception as e:
+                print("[artifact] Failed to load versioned artifacts:", e)
+                traceback.print_exc()
+                metrics.inc('mentallify_artifact_loads_total', result='failed')
+                if version:
+                    raise
+        if bundle is None:
+            bundle = load_legacy_bundle(engine)
+        artifacts = bundle
+        prediction_cache.clear()
+        _artifacts_loaded.set()
+    metrics.set('mentallify_artifact_load_seconds', time.perf_counter() - started)
+    metrics.inc('mentallify_artifact_loads_total', result='ok' if bundle.ready else 'not_ready')
+    print("Artifacts status ->", bundle.describe())
+    return bundle
+
+def ensure_artifacts():
+    """The serving bundle, loading it first if nothing has been loaded yet (lazy/background startup)."""
+    if not _artifacts_loaded.is_set():
+        with _first_load_lock:
+            if not _artifacts_loaded.is_set():
+                with startup_timer('artifacts'):
+                    load_artifacts()
+    return artifacts
+
+def reload_artifacts_async(version=None, engine=None):
+    """Loads in a background thread; the current bundle keeps serving until the swap."""
+    def run():
+        reload_status.update(state='loading', version=version, error=None)
+        try:
+            bundle = load_artifacts(engine, version)
+            reload_status.update(state='idle', version=bundle.version, error=None)
+        except Exception as e:
+            reload_status.update(state='failed', error=str(e))
+        reload_status['finished_at'] = time.time()
+    t = threading.Thread(target=run, name="artifact-reload", daemon=True)
+    t.start()
+    return t
+
+def _sighup_reload(signum, frame):
+    print("[artifact] SIGHUP received, reloading CURRENT")
+    reload_artifacts_async()
 
-load_artifacts()
+if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGHUP, _sighup_reload)
 
 # -----------------------------
 # Symptom bank (quiz)
 # -----------------------------
 SYMPTOM_BANK_PATH = os.path.join(DATA_DIR, 'symptom_bank.json')
-if os.path.exists(SYMPTOM_BANK_PATH):
-    try:
-        with open(SYMPTOM_BANK_PATH, 'r', encoding='utf-8') as f:
-            SYMPTOM_BANK = json.load(f)
-    except Exception:
-        SYMPTOM_BANK = {"diseases": {}, "questions": []}
-        print("[data] failed to read symptom_bank.json, using fallback")
-else:
-    SYMPTOM_BANK = {"diseases": {}, "questions": []}
-    print("[data] symptom_bank.json not found, using fallback questions")
+
+FALLBACK_QUESTIONS = [
+    {"text":"Have you been feeling sad or down recently?","symptom_key":"feeling sad"},
+    {"text":"Have you lost interest in activities you usually enjoy?","symptom_key":"loss of interest"},
+    {"text":"Have you been feeling unusually worried or anxious?","symptom_key":"excessive worry"},
+    {"text":"Are you having trouble sleeping, or sleeping much more?","symptom_key":"insomnia or hypersomnia"},
+    {"text":"Have you experienced panic attacks?","symptom_key":"panic attacks"}
+]
+
+def load_symptom_bank():
+    if os.path.exists(SYMPTOM_BANK_PATH):
+        try:
+            with open(SYMPTOM_BANK_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            print("[data] failed to read symptom_bank.json, using fallback")
+    else:
+        print("[data] symptom_bank.json not found, using fallback questions")
+    return {"diseases": {}, "questions": []}
+
+# Compiled once (on first use or during warm-up); request handlers only read it.
+_symptom_index = None
+_symptom_index_lock = threading.Lock()
+
+def get_symptom_index():
+    global _symptom_index
+    if _symptom_index is None:
+        with _symptom_index_lock:
+            if _symptom_index is None:
+                with startup_timer('symptom_bank'):
+                    index = SymptomIndex(load_symptom_bank())
+                    if not index.questions:
+                        index.questions = list(FALLBACK_QUESTIONS)
+                _symptom_index = index
+    return _symptom_index
+
+# Adaptive quiz (/quiz_adaptive): picks questions by information gain and stops
+# early. The token secret must be shared by every process serving the quiz.
+# Without QUIZ_SECRET/OAUTH_SECRET_KEY each process draws a random key, which
+# only works for a single process or serve.py (whose workers fork after the
+# master's warm-up built the quiz). Separately started workers (uvicorn or
+# gunicorn --workers N, asgi_app.py --workers N, several hosts) each get their
+# own key, so a quiz that continues on another worker fails its token check.
+QUIZ_SECRET = os.getenv("QUIZ_SECRET") or OAUTH_SECRET_KEY
+QUIZ_CONFIDENCE = float(os.getenv("QUIZ_CONFIDENCE") or 0.85)
+QUIZ_MAX_QUESTIONS = int(os.getenv("QUIZ_MAX_QUESTIONS") or 0) or None
+QUIZ_LOOKAHEAD = int(os.getenv("QUIZ_LOOKAHEAD") or 4)
+QUIZ_MAX_LOOKAHEAD = 6
+_adaptive_quiz = None
+
+def get_adaptive_quiz():
+    global _adaptive_quiz
+    if _adaptive_quiz is None:
+        index = get_symptom_index()
+        with _symptom_index_lock:
+            if _adaptive_quiz is None:
+                from adaptive_quiz import AdaptiveQuiz
+                secret = QUIZ_SECRET
+                if not secret:
+                    print("[quiz] WARNING: QUIZ_SECRET not set; using a random per-process key. Adaptive quiz "
+                          "tokens fail ('invalid or expired quiz token') after a restart or when a quiz continues "
+                          "on another worker process - set QUIZ_SECRET for multi-worker uvicorn/gunicorn setups")
+                    secret = os.urandom(32)
+                _adaptive_quiz = AdaptiveQuiz(index, secret, confidence=QUIZ_CONFIDENCE,
+                                              max_questions=QUIZ_MAX_QUESTIONS)
+    return _adaptive_quiz
 
 # -----------------------------
 # Keyword fallback for chat
 # -----------------------------
+KEYWORDS_PATH = os.path.join(DATA_DIR, 'keywords.json')
+try:
+    KEYWORD_MATCHER = KeywordMatcher.from_file(KEYWORDS_PATH)
+except Exception as e:
+    KEYWORD_MATCHER = KeywordMatcher([])
+    print("[data] failed to read keywords.json, keyword fallback disabled:", e)
+
+def keyword_matches(text):
+    """Single-pass scan: {category: {"hits": n, "matches": [(start, keyword), ...]}}."""
+    return KEYWORD_MATCHER.scan(text)
+
 def keyword_fallback(text):
-    t = (text or "").lower()
-    depression = ['sad','depress','hopeless','empty','guilty','worthless','tired','suicidal']
-    anxiety = ['anxious','worried','panic','nervous','tense','restless','heart','sweat']
-    bipolar = ['manic','high','euphoric','impulsive','spending','risky','mood swing','mood swings']
-    ptsd = ['trauma','flashback','nightmare','trigger','hypervigilant','startle','avoid']
-    ocd = ['obsession','compulsion','ritual','repeat','check','clean','order']
-    schizo = ['hallucination','delusion','paranoid','disorganized','withdrawn']
-
-    matches = []
-    if any(k in t for k in depression): matches.append('Depression')
-    if any(k in t for k in anxiety): matches.append('Anxiety')
-    if any(k in t for k in bipolar): matches.append('Bipolar Disorder')
-    if any(k in t for k in ptsd): matches.append('PTSD')
-    if any(k in t for k in ocd): matches.append('OCD')
-    if any(k in t for k in schizo): matches.append('Schizophrenia')
+    matches = list(keyword_matches(text))
 
     if not matches:
         return ("Thanks for sharing — I might need a bit more detail. "
                 "Could you tell me whether this affects sleep, appetite, mood, or daily activities?")
     resp = "Based on what you said, these might be related: " + ", ".join(matches) + ".\n\nGeneral suggestions:\n"
-    if 'Depression' in matches:
-        resp += "• Depression: Consider therapy, staying active, and consult a professional.\n"
-    if 'Anxiety' in matches:
-        resp += "• Anxiety: Try grounding/breathing exercises and seek help if interfering with life.\n"
+    for name in matches:
+        if name in KEYWORD_MATCHER.suggestions:
+            resp += f"• {name}: {KEYWORD_MATCHER.suggestions[name]}\n"
     resp += "\nThis is informational only — please consult a healthcare professional."
     return resp
 
 # -----------------------------
 # Helper: send email via SMTP
 # -----------------------------
-def send_contact_email(sender_name: str, sender_email: str, message_text: str) -> None:
-    if not (MAIL_SERVER and MAIL_USERNAME and MAIL_PASSWORD and MAIL_TO):
-        raise RuntimeError("SMTP not configured on server.")
+def smtp_configured():
+    return bool(MAIL_SERVER and MAIL_USERNAME and MAIL_PASSWORD and MAIL_TO)
 
+def build_contact_email(sender_name: str, sender_email: str, message_text: str) -> "EmailMessage":
+    from email.message import EmailMessage
     msg = EmailMessage()
     msg["Subject"] = f"[Mentallify Contact] Message from {sender_name}"
     msg["From"] = f"{MAIL_FROM_NAME} <{MAIL_USERNAME}>"
@@ -164,39 +492,264 @@ Message:
 
     msg.set_content(plain)
     msg.add_alternative(html, subtype='html')
+    return msg
 
-    with smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=15) as server:
-        server.ehlo()
-        if MAIL_PORT in (587,):
-            server.starttls()
+def smtp_connect() -> "smtplib.SMTP":
+    """Opens an SMTP connection and logs in (skipped if the server offers no AUTH, e.g. a local debug server)."""
+    import smtplib
+    with metrics.timer('mentallify_smtp_seconds', op='connect'):
+        server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=15)
+        try:
             server.ehlo()
-        server.login(MAIL_USERNAME, MAIL_PASSWORD)
+            if MAIL_PORT in (587,):
+                server.starttls()
+                server.ehlo()
+            if server.has_extn('auth'):
+                server.login(MAIL_USERNAME, MAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+    return server
+
+def send_contact_email(sender_name: str, sender_email: str, message_text: str) -> None:
+    if not smtp_configured():
+        raise RuntimeError("SMTP not configured on server.")
+
+    msg = build_contact_email(sender_name, sender_email, message_text)
+    with smtp_connect() as server, metrics.timer('mentallify_smtp_seconds', op='send'):
         server.send_message(msg)
 
+# Contact mail goes through a durable outbox (backend/data/outbox.sqlite3, outside
+# the served tree) drained by a background sender with one pooled SMTP
+# connection. MAIL_OUTBOX=0 sends inline.
+MAIL_OUTBOX = os.getenv("MAIL_OUTBOX", "1") == "1"
+DEFAULT_OUTBOX_PATH = os.path.join(BASE, 'data', 'outbox.sqlite3')
+OUTBOX_PATH = os.getenv("OUTBOX_PATH") or DEFAULT_OUTBOX_PATH
+mail_outbox = None
+message_store = None
+_mail_init_lock = threading.Lock()
+_mail_initialized = False
+
+def init_mail():
+    """Opens the outbox and the message store once (at warm-up or on first use)."""
+    global mail_outbox, message_store, _mail_initialized
+    if _mail_initialized:
+        return
+    with _mail_init_lock:
+        if _mail_initialized:
+            return
+        with startup_timer('mail'):
+            if MAIL_OUTBOX:
+                try:
+                    from mail_outbox import MailOutbox
+                    from message_store import move_sqlite_file
+                    if OUTBOX_PATH == DEFAULT_OUTBOX_PATH:
+                        move_sqlite_file(os.path.join(DATA_DIR, 'outbox.sqlite3'), OUTBOX_PATH)
+                    os.makedirs(os.path.dirname(OUTBOX_PATH), exist_ok=True)
+                    mail_outbox = MailOutbox(
+                        OUTBOX_PATH, smtp_connect,
+                        batch_size=int(os.getenv("MAIL_OUTBOX_BATCH") or 20),
+                        max_attempts=int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS") or 8),
+                    )
+                    if mail_outbox.stats()['queue_depth']:
+                        mail_outbox.start()   # resume messages left over from a previous run
+                except Exception as e:
+                    print("[outbox] failed to open outbox, sending inline:", e)
+                    traceback.print_exc()
+
+            # Backup of every contact message (see message_store.py: backend/data/messages.sqlite3;
+            # MESSAGE_STORE=csv keeps data/messages.csv)
+            try:
+                from message_store import open_message_store
+                message_store = open_message_store(data_dir=DATA_DIR)
+            except Exception as e:
+                print("[send_contact] failed to open message store:", e)
+                traceback.print_exc()
+        _mail_initialized = True
+
+def queue_contact_email(sender_name: str, sender_email: str, message_text: str) -> None:
+    """Enqueues the contact email when the outbox is enabled, otherwise sends it inline."""
+    if mail_outbox is None:
+        return send_contact_email(sender_name, sender_email, message_text)
+    if not smtp_configured():
+        raise RuntimeError("SMTP not configured on server.")
+    mail_outbox.enqueue(build_contact_email(sender_name, sender_email, message_text))
+
+# -----------------------------
+# Inference helpers (single + batch)
+# -----------------------------
+# Max messages vectorized in one transform/predict_proba call. Non-streaming
+# /chat/batch requests above this are rejected; streaming ones are chunked.
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX") or 512)
+
+def predict_messages(messages):
+    """
+    Runs one sparse tfidf.transform + one predict_proba over all messages.
+    Returns a list of (label, probs) pairs, or None when artifacts are missing.
+    """
+    return ensure_artifacts().predict(messages)
+
+# Opt-in micro-batching: concurrent /chat requests arriving within
+# CHAT_MICROBATCH_LATENCY_MS are scored together (up to CHAT_MICROBATCH_MAX).
+CHAT_MICROBATCH = os.getenv("CHAT_MICROBATCH", "0") == "1"
+chat_batcher = MicroBatcher(
+    predict_messages,
+    max_batch=int(os.getenv("CHAT_MICROBATCH_MAX") or 32),
+    max_latency_ms=float(os.getenv("CHAT_MICROBATCH_LATENCY_MS") or 3),
+) if CHAT_MICROBATCH else None
+
+def predict_one(message):
+    """(label, probs) for a single message, via the cache and micro-batcher when enabled."""
+    cached = prediction_cache.get(message)
+    if cached is not None:
+        return cached
+    generation = prediction_cache.generation
+    if chat_batcher is not None:
+        pred = chat_batcher.submit(message, timeout=30)
+    else:
+        preds = predict_messages([message])
+        pred = preds[0] if preds is not None else None
+    if pred is not None:
+        prediction_cache.put(message, pred, generation)
+    return pred
+
+def chat_reply(label, probs):
+    reply = f"I detect text patterns most associated with {label} (informational only)."
+    return {'reply': reply, 'label': label, 'probs': probs}
+
+def fallback_reply(message, reason):
+    metrics.inc('mentallify_chat_fallback_total', reason=reason)
+    return {'reply': keyword_fallback(message), 'label': 'fallback', 'probs': []}
+
+# Opt-in log of /chat predictions for reviewers; labelled exports feed
+# update_model.py. Messages are stored verbatim, so it is off by default and
+# lives under backend/, outside the tree serve_frontend() serves.
+FEEDBACK_LOG = os.getenv("FEEDBACK_LOG", "0") == "1"
+FEEDBACK_LOG_PATH = os.getenv("FEEDBACK_LOG_PATH") or os.path.join(BASE, 'feedback', 'feedback.jsonl')
+feedback_log = FeedbackLog(
+    FEEDBACK_LOG_PATH,
+    max_bytes=int(os.getenv("FEEDBACK_LOG_MAX_BYTES") or 64 * 1024 * 1024),
+    backups=int(os.getenv("FEEDBACK_LOG_BACKUPS") or 20),
+) if FEEDBACK_LOG else None
+
+def log_feedback(message, result):
+    if feedback_log is not None:
+        bundle = artifacts
+        feedback_log.append(message, result['label'], result['probs'], bundle.classes, bundle.version)
+
+def chat_batch(messages):
+    """
+    In-process batch equivalent of /chat: returns one result dict per message,
+    in order. Empty messages get an 'error' entry instead of a prediction.
+    """
+    cleaned = [(m or "").strip() if isinstance(m, str) else "" for m in messages]
+    results = [None] * len(cleaned)
+    todo = [i for i, m in enumerate(cleaned) if m]
+    for i, m in enumerate(cleaned):
+        if not m:
+            results[i] = {'reply': 'Please enter a message.', 'label': None, 'probs': [], 'error': 'empty message'}
+
+    misses = []
+    for i in todo:
+        cached = prediction_cache.get(cleaned[i])
+        if cached is not None:
+            results[i] = chat_reply(*cached)
+        else:
+            misses.append(i)
+
+    for start in range(0, len(misses), CHAT_BATCH_MAX):
+        chunk = misses[start:start + CHAT_BATCH_MAX]
+        generation = prediction_cache.generation
+        preds = None
+        reason = 'no_model'
+        try:
+            preds = predict_messages([cleaned[i] for i in chunk])
+        except Exception as e:
+            reason = 'error'
+            print("[ml] batch inference failed:", e)
+            traceback.print_exc()
+        for j, i in enumerate(chunk):
+            if preds is not None:
+                prediction_cache.put(cleaned[i], preds[j], generation)
+                results[i] = chat_reply(*preds[j])
+            else:
+                results[i] = fallback_reply(cleaned[i], reason)
+    return results
+
 # -----------------------------
 # API endpoints (ML / Quiz / Chat)
 # -----------------------------
 @app.route('/chat', methods=['POST'])
 def chat():
-    body = request.get_json(silent=True) or {}
+    with metrics.timer(INFERENCE_STAGE, stage='parse'):
+        body = request.get_json(silent=True) or {}
     message = (body.get('message') or "").strip()
     if not message:
         return jsonify({'reply': 'Please enter a message.'}), 400
+    if g.get('degraded'):
+        # inference is queueing past ADMISSION degrade_ms: answer without the model
+        result = fallback_reply(message, 'degraded')
+        log_feedback(message, result)
+        resp = jsonify(result)
+        resp.headers['X-Degraded'] = '1'
+        return resp
 
+    reason = 'no_model'
     try:
-        if tfidf is not None and model is not None and label_encoder is not None:
-            X = tfidf.transform([message])
-            proba = model.predict_proba(X)[0]
-            idx = int(proba.argmax())
-            label = label_encoder.inverse_transform([idx])[0] if hasattr(label_encoder, 'inverse_transform') else str(model.classes_[idx])
-            reply = f"I detect text patterns most associated with {label} (informational only)."
-            return jsonify({'reply': reply, 'label': label, 'probs': proba.tolist()})
+        pred = predict_one(message)
+        if pred is not None:
+            result = chat_reply(*pred)
+            log_feedback(message, result)
+            with metrics.timer(INFERENCE_STAGE, stage='serialize'):
+                return jsonify(result)
     except Exception as e:
+        reason = 'error'
         print("[ml] inference failed:", e)
         traceback.print_exc()
 
-    reply = keyword_fallback(message)
-    return jsonify({'reply': reply, 'label': 'fallback', 'probs': []})
+    result = fallback_reply(message, reason)
+    log_feedback(message, result)
+    return jsonify(result)
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """
+    Body: {"messages": [...], "stream": false}
+    Returns {"results": [...]} in input order. With "stream": true (or an
+    Accept: application/x-ndjson header) results are streamed as NDJSON, one
+    {"index": i, ...} line per message, computed CHAT_BATCH_MAX at a time.
+    """
+    body = request.get_json(silent=True) or {}
+    messages = body.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({'error': "Provide a non-empty 'messages' list."}), 400
+
+    stream = bool(body.get('stream')) or 'application/x-ndjson' in (request.headers.get('Accept') or '')
+    if not stream:
+        if len(messages) > CHAT_BATCH_MAX:
+            return jsonify({'error': f"Batch too large (max {CHAT_BATCH_MAX}); use stream=true."}), 413
+        return jsonify({'results': chat_batch(messages)})
+
+    def generate():
+        for start in range(0, len(messages), CHAT_BATCH_MAX):
+            chunk = messages[start:start + CHAT_BATCH_MAX]
+            for offset, result in enumerate(chat_batch(chunk)):
+                yield json.dumps({'index': start + offset, **result}) + "\n"
+
+    # teardown runs before the body is iterated, so the streamed response takes
+    # over the admission slot and releases it when the server closes it
+    held = g.pop('admission', None)
+    resp = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    resp.call_on_close(lambda: _release_admission(held))
+    return resp
+
+@app.route('/chat/stats', methods=['GET'])
+def chat_stats():
+    return jsonify({
+        'microbatch': chat_batcher.stats() if chat_batcher is not None else None,
+        'cache': prediction_cache.stats(),
+        'admission': {name: policy.stats() for name, policy in admission_policies.items()},
+    })
 
 @app.route('/quiz_questions', methods=['GET'])
 def quiz_questions():
@@ -204,51 +757,52 @@ def quiz_questions():
         n = int(request.args.get('n', '12'))
     except:
         n = 12
-    questions = SYMPTOM_BANK.get('questions', [])
-    if not questions:
-        questions = [
-            {"text":"Have you been feeling sad or down recently?","symptom_key":"feeling sad"},
-            {"text":"Have you lost interest in activities you usually enjoy?","symptom_key":"loss of interest"},
-            {"text":"Have you been feeling unusually worried or anxious?","symptom_key":"excessive worry"},
-            {"text":"Are you having trouble sleeping, or sleeping much more?","symptom_key":"insomnia or hypersomnia"},
-            {"text":"Have you experienced panic attacks?","symptom_key":"panic attacks"}
-        ]
-    import random
-    random.shuffle(questions)
-    return jsonify({"questions": questions[:n]})
+    return jsonify({"questions": get_symptom_index().sample_questions(n)})
 
 @app.route('/quiz_result', methods=['POST'])
 def quiz_result():
     body = request.get_json(silent=True) or {}
     yes_symptoms = body.get('yes_symptoms', []) or []
-    diseases = SYMPTOM_BANK.get('diseases', {})
-    results = []
-    for disease, meta in diseases.items():
-        s = meta.get('symptoms', [])
-        matched = [si for si in s if si in yes_symptoms]
-        score = (len(matched) / len(s)) if s else 0.0
-        results.append({
-            "disease": disease,
-            "score": round(score, 3),
-            "matched_symptoms": matched,
-            "precautions": meta.get('precautions', '')
-        })
-    results = sorted(results, key=lambda r: r['score'], reverse=True)
-    return jsonify({'results': results})
+    return jsonify({'results': get_symptom_index().score(yes_symptoms)})
+
+@app.route('/quiz_adaptive', methods=['POST'])
+def quiz_adaptive():
+    """
+    Start: {} -> {'done': false, 'token', 'asked', 'max_questions', 'plan'}.
+    The plan is a yes/no tree of the next questions ({'question', 'yes', 'no'});
+    answer down it until a branch is null or {'done': true}, then send
+    {'token', 'answers': [true, false, ...]} for the next plan, or for
+    {'done': true, 'asked', 'results'} (the /quiz_result list plus 'probability').
+    """
+    from adaptive_quiz import QuizTokenError
+    body = request.get_json(silent=True) or {}
+    answers = body.get('answers') or []
+    if not isinstance(answers, list) or not all(isinstance(a, bool) for a in answers):
+        return jsonify({'error': "'answers' must be a list of booleans"}), 400
+    try:
+        lookahead = max(1, min(int(body.get('lookahead') or QUIZ_LOOKAHEAD), QUIZ_MAX_LOOKAHEAD))
+    except (TypeError, ValueError):
+        lookahead = QUIZ_LOOKAHEAD
+    try:
+        return jsonify(get_adaptive_quiz().step(body.get('token'), answers, lookahead))
+    except QuizTokenError as e:
+        return jsonify({'error': str(e)}), 400
 
 # -----------------------------
 # Contact page + send_contact
 # -----------------------------
+def render_contact(body):
+    return body.decode('utf-8').replace("{{ site_contact_email }}", SITE_CONTACT_EMAIL).encode('utf-8')
+
 @app.route('/contact', methods=['GET'])
 def contact_page():
-    contact_path = os.path.join(FRONTEND_ROOT, 'contact.html')
-    if not os.path.exists(contact_path):
+    contact_path = static_assets.resolve('contact.html')
+    if contact_path is None:
         return "contact.html not found on server", 500
     try:
-        with open(contact_path, 'r', encoding='utf-8') as f:
-            html = f.read()
-        html = html.replace("{{ site_contact_email }}", SITE_CONTACT_EMAIL)
-        return Response(html, mimetype='text/html')
+        # rendered once per file version, then served from memory
+        return static_assets.response(contact_path, render=render_contact, render_key='contact',
+                                      mimetype='text/html')
     except Exception as e:
         print("[contact_page] failed to read contact.html:", e)
         traceback.print_exc()
@@ -265,20 +819,19 @@ def send_contact():
         if not (name and email and message_text):
             return jsonify({"ok": False, "error": "Please provide name, email and message."}), 400
 
-        # backup to data/messages.csv
+        init_mail()
+
+        # backup to the message store
         try:
-            backup_dir = os.path.join(FRONTEND_ROOT, 'data')
-            os.makedirs(backup_dir, exist_ok=True)
-            backup_file = os.path.join(backup_dir, 'messages.csv')
-            with open(backup_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([int(time.time()), name, email, message_text])
+            if message_store is None:
+                raise RuntimeError("message store unavailable")
+            message_store.append(time.time(), name, email, message_text)
         except Exception as e:
             print("[send_contact] backup failed:", e)
 
-        # send email
+        # send email (queued for the background sender when the outbox is enabled)
         try:
-            send_contact_email(name, email, message_text)
+            queue_contact_email(name, email, message_text)
         except Exception as send_err:
             print("[send_contact] failed to send email:", send_err)
             traceback.print_exc()
@@ -290,9 +843,34 @@ def send_contact():
         traceback.print_exc()
         return jsonify({"ok": False, "error": "Server error"}), 500
 
+@app.route('/send_contact/stats', methods=['GET'])
+def send_contact_stats():
+    init_mail()
+    return jsonify({'outbox': mail_outbox.stats() if mail_outbox is not None else None})
+
 # -----------------------------
 # Google OAuth routes
 # -----------------------------
+PROFILE_CLAIMS = ('email', 'name', 'picture')
+_oauth_client = None
+_oauth_client_lock = threading.Lock()
+
+def oauth_client():
+    """GoogleOAuthClient built from env on first use (imports requests/jwt then)."""
+    global _oauth_client
+    if _oauth_client is None:
+        with _oauth_client_lock:
+            if _oauth_client is None:
+                from google_oauth import GoogleOAuthClient
+                urls = {key: os.getenv(env) for key, env in (('token_url', 'GOOGLE_TOKEN_URL'),
+                                                             ('userinfo_url', 'GOOGLE_USERINFO_URL'),
+                                                             ('jwks_url', 'GOOGLE_JWKS_URL'))}
+                kwargs = {key: url for key, url in urls.items() if url}
+                if os.getenv("GOOGLE_ISSUERS"):
+                    kwargs['issuers'] = [i.strip() for i in os.getenv("GOOGLE_ISSUERS").split(',') if i.strip()]
+                _oauth_client = GoogleOAuthClient(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, **kwargs)
+    return _oauth_client
+
 # NOTE: frontend should open /auth/google (to get auth_url) in a popup, or call it to get the URL.
 @app.route('/auth/google', methods=['GET'])
 def auth_google_start():
@@ -305,10 +883,10 @@ def auth_google_start():
 
     # Choose redirect URI matching Google Cloud Console config
     # Use exact origin + path you added to Google Console
-    redirect_uri = request.args.get('redirect_uri') or "http://localhost:5000/auth/google/callback"
+    redirect_uri = request.args.get('redirect_uri') or OAUTH_REDIRECT_URI
 
     scope = "openid email profile"
-    auth_base = "https://accounts.google.com/o/oauth2/v2/auth"
+    auth_base = GOOGLE_AUTH_URL
     params = {
         "client_id": GOOGLE_CLIENT_ID,
         "redirect_uri": redirect_uri,
@@ -322,58 +900,8 @@ def auth_google_start():
     auth_url = f"{auth_base}?{urlencode(params)}"
     return jsonify({"auth_url": auth_url})
 
-@app.route('/auth/google/callback', methods=['GET'])
-def auth_google_callback():
-    """
-    Google redirects to this URL with ?code=... . Exchange code for tokens, fetch userinfo,
-    then send a small HTML page that posts a message to the opener window and closes.
-    """
-    code = request.args.get('code')
-    if not code:
-        return "Missing code parameter", 400
-
-    redirect_uri = "http://localhost:5000/auth/google/callback"
-
-    # 1) Exchange code for tokens
-    token_url = "https://oauth2.googleapis.com/token"
-    token_data = {
-        "code": code,
-        "client_id": GOOGLE_CLIENT_ID,
-        "client_secret": GOOGLE_CLIENT_SECRET,
-        "redirect_uri": redirect_uri,
-        "grant_type": "authorization_code"
-    }
-    try:
-        token_r = requests.post(token_url, data=token_data, timeout=10)
-        token_r.raise_for_status()
-        token_json = token_r.json()
-    except Exception as e:
-        print("[auth] token exchange failed:", e, getattr(e, "response", None))
-        return "Token exchange failed", 500
-
-    access_token = token_json.get("access_token")
-    if not access_token:
-        print("[auth] no access_token in token response:", token_json)
-        return "Token exchange didn't return access token", 500
-
-    # 2) Fetch user info
-    try:
-        userinfo_r = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=10
-        )
-        userinfo_r.raise_for_status()
-        userinfo = userinfo_r.json()
-    except Exception as e:
-        print("[auth] userinfo fetch failed:", e)
-        return "Failed to fetch user info", 500
-
-    # 3) Issue a signed JWT (expires in 7 days)
-    if not OAUTH_SECRET_KEY:
-        print("[auth] OAUTH_SECRET_KEY not set in environment")
-        return "Server not configured for sessions", 500
-
+def session_token(userinfo):
+    """Session JWT (HS256, 7 days) for a verified Google profile."""
     payload = {
         "email": userinfo.get("email"),
         "name": userinfo.get("name"),
@@ -381,10 +909,11 @@ def auth_google_callback():
         "iat": datetime.datetime.utcnow(),
         "exp": datetime.datetime.utcnow() + datetime.timedelta(days=7)
     }
-    token = jwt.encode(payload, OAUTH_SECRET_KEY, algorithm="HS256")
+    import jwt
+    return jwt.encode(payload, OAUTH_SECRET_KEY, algorithm="HS256")
 
-    # 4) Return a simple HTML that posts token to the opener window and closes the popup
-    #    The frontend listens for window.postMessage(...) to receive token + profile.
+def login_popup_html(token, userinfo):
+    """Page that posts the token + profile to the opener window and closes the popup."""
     safe_name = (userinfo.get("name") or "").replace('"', '\\"')
     safe_email = (userinfo.get("email") or "").replace('"', '\\"')
     safe_picture = (userinfo.get("picture") or "").replace('"', '\\"')
@@ -417,14 +946,268 @@ def auth_google_callback():
       </body>
     </html>
     """
-    return Response(html, mimetype='text/html')
+    return html
+
+@app.route('/auth/google/callback', methods=['GET'])
+def auth_google_callback():
+    """
+    Google redirects to this URL with ?code=... . Exchange code for tokens, take the profile
+    from the verified id_token (userinfo endpoint only as a fallback), then send a small HTML page that posts a message to the opener window and closes.
+    """
+    code = request.args.get('code')
+    if not code:
+        return "Missing code parameter", 400
+
+    redirect_uri = OAUTH_REDIRECT_URI
+    client = oauth_client()
+
+    # 1) Exchange code for tokens (pooled keep-alive session)
+    try:
+        with metrics.timer('mentallify_oauth_seconds', step='token'):
+            token_json = client.exchange_code(code, redirect_uri)
+    except Exception as e:
+        print("[auth] token exchange failed:", e, getattr(e, "response", None))
+        return "Token exchange failed", 500
+
+    access_token = token_json.get("access_token")
+    id_token = token_json.get("id_token")
+    if not (access_token or id_token):
+        print("[auth] no access_token in token response:", token_json)
+        return "Token exchange didn't return access token", 500
+
+    # 2) Profile from the id_token, verified locally against the cached JWKS keys
+    userinfo = None
+    fallback_reason = 'no_id_token'
+    if id_token and not client.can_verify_locally:
+        fallback_reason = 'no_crypto'
+    elif id_token:
+        try:
+            with metrics.timer('mentallify_oauth_seconds', step='verify_id_token'):
+                claims = client.verify_id_token(id_token)
+            userinfo = {k: claims.get(k) for k in PROFILE_CLAIMS}
+            if not userinfo.get('email'):
+                userinfo, fallback_reason = None, 'no_email_claim'
+        except Exception as e:
+            fallback_reason = 'invalid_id_token'
+            print("[auth] id_token verification failed, using userinfo:", e)
+
+    # 3) Fallback: fetch user info
+    if userinfo is None:
+        metrics.inc('mentallify_oauth_userinfo_fallback_total', reason=fallback_reason)
+        if not access_token:
+            return "Failed to fetch user info", 500
+        try:
+            with metrics.timer('mentallify_oauth_seconds', step='userinfo'):
+                userinfo = client.fetch_userinfo(access_token)
+        except Exception as e:
+            print("[auth] userinfo fetch failed:", e)
+            return "Failed to fetch user info", 500
+
+    # 4) Issue a signed JWT (expires in 7 days)
+    if not OAUTH_SECRET_KEY:
+        print("[auth] OAUTH_SECRET_KEY not set in environment")
+        return "Server not configured for sessions", 500
+
+    token = session_token(userinfo)
+
+    # 5) Return a simple HTML that posts token to the opener window and closes the popup
+    #    The frontend listens for window.postMessage(...) to receive token + profile.
+    return Response(login_popup_html(token, userinfo), mimetype='text/html')
+
+# -----------------------------
+# Warm-up / health checks
+# -----------------------------
+warm_state = {'state': 'cold', 'started_at': None, 'finished_at': None}
+_warm_up_lock = threading.Lock()
+_warm_thread = None
+_warm_thread_lock = threading.Lock()
+
+def log_startup():
+    stages = " ".join(f"{k}={v}ms" for k, v in startup_timings.items())
+    since = (time.perf_counter() - STARTUP_T0) * 1000.0
+    print(f"[startup] mode={STARTUP_MODE} {stages} (t+{since:.1f}ms)")
+
+def warm_up():
+    """Loads everything request handlers need. Idempotent; concurrent callers wait for the first one."""
+    with _warm_up_lock:
+        if warm_state['state'] == 'ready':
+            return
+        warm_state.update(state='warming', started_at=time.time())
+        started = time.perf_counter()
+        bundle = ensure_artifacts()
+        if bundle.ready:
+            # first call pays for sklearn/scipy code paths that unpickling doesn't touch
+            with startup_timer('first_predict'):
+                try:
+                    bundle.predict(["warm up"])
+                except Exception as e:
+                    print("[startup] warm-up prediction failed:", e)
+        get_symptom_index()
+        get_adaptive_quiz().plan(0, 0, QUIZ_LOOKAHEAD)     # memoizes the first questions
+        init_mail()
+        with startup_timer('static'):
+            static_assets.index()
+        if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
+            oauth_client().jwks.start()     # fetch signing keys in the background
+        startup_timings['warm_up'] = round((time.perf_counter() - started) * 1000.0, 1)
+        warm_state.update(state='ready', finished_at=time.time())
+    log_startup()
+
+def start_warm_up():
+    """Runs warm_up() in a background thread (once)."""
+    global _warm_thread
+    with _warm_thread_lock:
+        if _warm_thread is None and warm_state['state'] != 'ready':
+            _warm_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warm_thread.start()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once artifacts, symptom bank and mail are loaded, 503 before."""
+    ready = warm_state['state'] == 'ready'
+    if not ready:
+        start_warm_up()
+    return jsonify({
+        "ready": ready,
+        "state": warm_state['state'],
+        "startup_mode": STARTUP_MODE,
+        "model": artifacts.describe(),
+        "timings_ms": startup_timings,
+    }), 200 if ready else 503
 
 # -----------------------------
-# Serve model JSON files
+# Admin: artifact versions / hot reload
+# -----------------------------
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def admin_authorized():
+    auth = request.headers.get('Authorization') or ''
+    return bool(ADMIN_TOKEN) and auth == f"Bearer {ADMIN_TOKEN}"
+
+@app.route('/admin/artifacts', methods=['GET'])
+def admin_artifacts():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({
+        "serving": artifacts.describe(),
+        "current": artifact_store.current_version(ARTIFACTS_DIR),
+        "versions": artifact_store.list_versions(ARTIFACTS_DIR),
+        "reload": reload_status,
+    })
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Body: {"version": optional, "activate": false}. Loads in the background; 202 immediately."""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
+    version = body.get('version')
+    if version and version not in artifact_store.list_versions(ARTIFACTS_DIR):
+        return jsonify({"error": f"Unknown version {version}"}), 404
+    master_pid = os.getenv('PREFORK_MASTER_PID')
+    if master_pid and version and not body.get('activate'):
+        return jsonify({"error": "Under serve.py only CURRENT can be reloaded; pass \"activate\": true."}), 409
+    if version and body.get('activate'):
+        artifact_store.set_current(version, ARTIFACTS_DIR)
+    if master_pid:
+        # serve.py reloads in the master and rolls the workers so the model stays shared
+        os.kill(int(master_pid), signal.SIGHUP)
+    else:
+        reload_artifacts_async(version, body.get('engine'))
+    return jsonify({"ok": True, "reloading": version or artifact_store.current_version(ARTIFACTS_DIR)}), 202
+
+# -----------------------------
+# Metrics / profiler
+# -----------------------------
+def collect_runtime_metrics():
+    """Scrape-time gauges from the components that keep their own stats."""
+    info = artifacts.describe()
+    yield ('mentallify_artifact_info', 'gauge', "Serving artifact version (value is always 1)", 1,
+           {'version': info['version'] or 'none', 'engine': info['engine'], 'ready': str(info['ready']).lower()})
+    cache = prediction_cache.stats()
+    yield ('mentallify_prediction_cache_hits_total', 'counter', "Prediction cache hits", cache['hits'], {})
+    yield ('mentallify_prediction_cache_misses_total', 'counter', "Prediction cache misses", cache['misses'], {})
+    yield ('mentallify_prediction_cache_entries', 'gauge', "Prediction cache entries", cache['entries'], {})
+    if chat_batcher is not None:
+        mb = chat_batcher.stats()
+        yield ('mentallify_microbatch_batches_total', 'counter', "Micro-batches scored", mb['batches'], {})
+        yield ('mentallify_microbatch_items_total', 'counter', "Messages scored via micro-batching", mb['items'], {})
+        yield ('mentallify_microbatch_queue_depth', 'gauge', "Messages waiting for a micro-batch", mb['queue_depth'], {})
+    if mail_outbox is not None:
+        ob = mail_outbox.stats()
+        yield ('mentallify_outbox_queue_depth', 'gauge', "Contact emails waiting to be sent", ob['queue_depth'], {})
+        yield ('mentallify_outbox_dead_letters', 'gauge', "Contact emails that gave up", ob['dead_letters'], {})
+        yield ('mentallify_outbox_sent_total', 'counter', "Contact emails sent by this process", ob['sent'], {})
+    st = static_assets.stats()
+    yield ('mentallify_static_cache_bytes', 'gauge', "Bytes held by the static asset cache", st['bytes'], {})
+    yield ('mentallify_static_not_modified_total', 'counter', "Static responses answered with 304",
+           st['not_modified'], {})
+    if feedback_log is not None:
+        fb = feedback_log.stats()
+        yield ('mentallify_feedback_records_total', 'counter', "Predictions written to the feedback log",
+               fb['written'], {})
+        yield ('mentallify_feedback_errors_total', 'counter', "Feedback log write failures", fb['errors'], {})
+    if _adaptive_quiz is not None:
+        qz = _adaptive_quiz.stats()
+        yield ('mentallify_quiz_adaptive_started_total', 'counter', "Adaptive quizzes started", qz['started'], {})
+        yield ('mentallify_quiz_adaptive_finished_total', 'counter', "Adaptive quizzes finished", qz['finished'], {})
+        yield ('mentallify_quiz_adaptive_questions_total', 'counter', "Questions answered in finished adaptive quizzes",
+               _adaptive_quiz.questions_asked, {})
+    for name, policy in admission_policies.items():
+        st = policy.stats()
+        yield ('mentallify_admission_degraded', 'gauge', "1 while the endpoint answers in degraded mode",
+               int(st['degraded']), {'endpoint': name})
+        if 'waiting' in st:
+            yield ('mentallify_admission_waiting', 'gauge', "Requests queued for a concurrency slot",
+                   st['waiting'], {'endpoint': name})
+            yield ('mentallify_admission_queue_wait_seconds', 'gauge', "Moving average of queue wait",
+                   st['queue_wait_ms'] / 1000.0, {'endpoint': name})
+    for stage, ms in startup_timings.items():
+        yield ('mentallify_startup_stage_seconds', 'gauge', "Startup time by stage", ms / 1000.0, {'stage': stage})
+
+metrics.add_collector(collect_runtime_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    GET: collapsed stacks (flamegraph.pl input) sampled so far in this process.
+    POST {"action": "start"|"stop"|"reset", "interval_ms": 10}: toggles the profiler.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        limit = request.args.get('limit', 200, type=int)
+        return Response(profiler.collapsed(limit), mimetype='text/plain')
+    body = request.get_json(silent=True) or {}
+    action = body.get('action')
+    if action == 'start':
+        profiler.start(body.get('interval_ms'))
+    elif action == 'stop':
+        profiler.stop()
+    elif action == 'reset':
+        profiler.reset()
+    else:
+        return jsonify({"error": "action must be start, stop or reset"}), 400
+    return jsonify({"ok": True, "pid": os.getpid(), "profiler": profiler.stats()})
+
+# -----------------------------
+# Serve model files (web_model.<hash>.bin is immutable; .gz/.br variants are used when accepted)
 # -----------------------------
 @app.route('/models/<path:filename>')
 def models_static(filename):
-    return send_from_directory(MODELS_DIR, filename)
+    full = static_assets.resolve(os.path.join('models', filename))
+    if full is None or not full.startswith(MODELS_DIR + os.sep):
+        abort(404)
+    return static_assets.response(full)
 
 # -----------------------------
 # Serve frontend files (repo root) - keep last
@@ -436,17 +1219,28 @@ def serve_frontend(path):
     requested_full = os.path.normpath(os.path.join(FRONTEND_ROOT, safe_path))
     if not requested_full.startswith(FRONTEND_ROOT):
         return "Invalid path", 400
-    if os.path.exists(requested_full) and os.path.isfile(requested_full):
-        rel = os.path.relpath(requested_full, FRONTEND_ROOT)
-        return send_from_directory(FRONTEND_ROOT, rel)
-    front_file = os.path.join(FRONTEND_ROOT, 'front.html')
-    index_file = os.path.join(FRONTEND_ROOT, 'index.html')
-    if os.path.exists(front_file):
-        return send_from_directory(FRONTEND_ROOT, 'front.html')
-    if os.path.exists(index_file):
-        return send_from_directory(FRONTEND_ROOT, 'index.html')
+    if static_assets.is_private(os.path.relpath(requested_full, FRONTEND_ROOT)):
+        abort(404)
+    full = static_assets.resolve(safe_path)
+    if full is not None:
+        return static_assets.response(full)
+    for name in ('front.html', 'index.html'):
+        full = static_assets.resolve(name)
+        if full is not None:
+            return static_assets.response(full)
     return "front.html/index.html not found on server", 500
 
+# -----------------------------
+# Startup
+# -----------------------------
+startup_timings['module'] = round((time.perf_counter() - STARTUP_T0) * 1000.0, 1)
+if STARTUP_MODE == 'eager':
+    warm_up()
+else:
+    log_startup()
+    if STARTUP_MODE == 'background':
+        start_warm_up()
+
 # -----------------------------
 # Run server
 # -----------------------------
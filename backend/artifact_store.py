@@ -0,0 +1,276 @@
+# backend/artifact_store.py
+"""
+Versioned model artifacts.
+
+Layout (ARTIFACTS_DIR, default backend/artifacts):
+    CURRENT                      name of the active version (replaced atomically)
+    <version>/manifest.json      files + sha256 checksums + metadata
+    <version>/tfidf_vectorizer.pkl, mental_health_model.pkl, label_encoder.pkl
+                                 uncompressed joblib dumps, so joblib.load(mmap_mode='r')
+                                 maps their arrays instead of copying them
+    <version>/compiled/*.npy     compiled scorer arrays (see compiled_model.py), one raw
+                                 .npy per array so np.load(mmap_mode='r') can map them
+
+Memory-mapped arrays live in the page cache and are shared by every worker
+process serving the same version.
+
+ArtifactBundle groups everything one version needs to serve /chat, so the app
+can swap a single reference on hot reload.
+
+CLI (from backend/):
+    python artifact_store.py publish [--version NAME]   # snapshot the current pickles
+    python artifact_store.py list
+    python artifact_store.py activate NAME
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from metrics import REGISTRY as metrics
+
+# joblib / numpy / compiled_model are imported inside the functions that use
+# them, so importing this module (app.py does at startup) stays cheap.
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR") or os.path.join(BASE, 'artifacts')
+
+PICKLES = {
+    'tfidf': 'tfidf_vectorizer.pkl',
+    'model': 'mental_health_model.pkl',
+    'label_encoder': 'label_encoder.pkl',
+}
+COMPILED_DIR = 'compiled'
+
+INFERENCE_STAGE = 'mentallify_inference_stage_seconds'
+metrics.describe(INFERENCE_STAGE, 'histogram', "Time per inference stage (per batch)")
+
+
+class ArtifactBundle:
+    """Everything needed to serve one model version; treated as immutable once built."""
+
+    def __init__(self, version=None, engine='sklearn', tfidf=None, model=None, label_encoder=None,
+                 compiled=None, manifest=None):
+        self.version = version
+        self.engine = engine
+        self.tfidf = tfidf
+        self.model = model
+        self.label_encoder = label_encoder
+        self.compiled = compiled
+        self.manifest = manifest or {}
+        self.loaded_at = time.time()
+
+    @property
+    def ready(self):
+        if self.compiled is not None:
+            return True
+        return self.tfidf is not None and self.model is not None and self.label_encoder is not None
+
+    @property
+    def classes(self):
+        """Class names in probability order, or None."""
+        if self.compiled is not None:
+            return [str(c) for c in self.compiled.classes_]
+        source = self.label_encoder if hasattr(self.label_encoder, 'classes_') else self.model
+        if source is None or not hasattr(source, 'classes_'):
+            return None
+        return [str(c) for c in source.classes_]
+
+    def predict(self, messages):
+        """List of (label, probs) pairs, or None when the bundle can't serve predictions."""
+        if self.compiled is not None:
+            with metrics.timer(INFERENCE_STAGE, stage='compiled_predict'):
+                return self.compiled.predict(messages)
+        if not self.ready:
+            return None
+        with metrics.timer(INFERENCE_STAGE, stage='transform'):
+            X = self.tfidf.transform(messages)
+        with metrics.timer(INFERENCE_STAGE, stage='predict_proba'):
+            proba = self.model.predict_proba(X)
+        with metrics.timer(INFERENCE_STAGE, stage='inverse_transform'):
+            idx = proba.argmax(axis=1)
+            if hasattr(self.label_encoder, 'inverse_transform'):
+                labels = self.label_encoder.inverse_transform(idx)
+            else:
+                labels = self.model.classes_[idx]
+            return [(str(label), row.tolist()) for label, row in zip(labels, proba)]
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'engine': 'compiled' if self.compiled is not None else self.engine,
+            'ready': self.ready,
+            'loaded_at': self.loaded_at,
+            'created': self.manifest.get('created'),
+        }
+
+
+# -----------------------------
+# Publishing
+# -----------------------------
+def _sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def current_version(root=ARTIFACTS_DIR):
+    try:
+        with open(os.path.join(root, 'CURRENT'), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, root=ARTIFACTS_DIR):
+    if not os.path.exists(os.path.join(root, version, 'manifest.json')):
+        raise ValueError(f"Unknown artifact version: {version}")
+    tmp = os.path.join(root, f'CURRENT.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(root, 'CURRENT'))
+
+
+def list_versions(root=ARTIFACTS_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root)
+                  if not v.startswith('.') and os.path.exists(os.path.join(root, v, 'manifest.json')))
+
+
+def publish(tfidf, model, label_encoder, version=None, root=ARTIFACTS_DIR, activate=True, metadata=None):
+    """
+    Writes a new version directory (via a temp dir + rename) and optionally makes
+    it CURRENT; returns the version name. The default name has microsecond
+    resolution, and if a concurrent publish still takes it first, a -2, -3, ...
+    suffix is added. An explicit `version` that exists raises ValueError.
+    """
+    import joblib
+    import numpy as np
+    from compiled_model import compile_artifacts
+
+    explicit = version is not None
+    version = version or datetime.datetime.utcnow().strftime('v%Y%m%d-%H%M%S-%f')
+    if explicit and os.path.exists(os.path.join(root, version)):
+        raise ValueError(f"Artifact version already exists: {version}")
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f'.{version}.', suffix='.tmp', dir=root)
+
+    for key, obj in (('tfidf', tfidf), ('model', model), ('label_encoder', label_encoder)):
+        joblib.dump(obj, os.path.join(tmp, PICKLES[key]))   # uncompressed => mmap-able
+    try:
+        arrays = compile_artifacts(tfidf, model, label_encoder)
+        os.makedirs(os.path.join(tmp, COMPILED_DIR))
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, COMPILED_DIR, f'{name}.npy'), arr, allow_pickle=False)
+    except ValueError as e:
+        print(f"[artifact] not compiling version {version}: {e}")
+
+    files = {}
+    for dirpath, _, filenames in os.walk(tmp):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            files[os.path.relpath(path, tmp)] = {'sha256': _sha256(path), 'bytes': os.path.getsize(path)}
+    manifest = {
+        'version': version,
+        'created': datetime.datetime.utcnow().isoformat() + 'Z',
+        'classes': [str(c) for c in getattr(label_encoder, 'classes_', [])],
+        'files': files,
+        'metadata': metadata or {},
+    }
+    base = version
+    for n in range(2, 100):
+        with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            # unlike os.replace, fails if another publish created the directory meanwhile
+            os.rename(tmp, os.path.join(root, version))
+            break
+        except OSError:
+            if explicit or not os.path.exists(os.path.join(root, version)):
+                shutil.rmtree(tmp, ignore_errors=True)
+                if explicit and os.path.exists(os.path.join(root, version)):
+                    raise ValueError(f"Artifact version already exists: {version}")
+                raise
+        version = manifest['version'] = f"{base}-{n}"
+    else:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise ValueError(f"Could not find a free artifact version name after {base}")
+    if activate:
+        set_current(version, root)
+    return version
+
+
+# -----------------------------
+# Loading
+# -----------------------------
+def verify(version_dir, manifest):
+    for rel, info in manifest.get('files', {}).items():
+        path = os.path.join(version_dir, rel)
+        if not os.path.exists(path) or _sha256(path) != info['sha256']:
+            raise ValueError(f"Checksum mismatch for {rel} in {version_dir}")
+
+
+def load_version(version=None, engine='sklearn', root=ARTIFACTS_DIR, mmap=True, check=True):
+    """Builds an ArtifactBundle for `version` (default: CURRENT). Raises on any failure."""
+    import joblib
+    import numpy as np
+    from compiled_model import CompiledLinearModel
+
+    version = version or current_version(root)
+    if not version:
+        raise ValueError(f"No CURRENT artifact version in {root}")
+    vdir = os.path.join(root, version)
+    with open(os.path.join(vdir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if check:
+        verify(vdir, manifest)
+    mmap_mode = 'r' if mmap else None
+
+    cdir = os.path.join(vdir, COMPILED_DIR)
+    if engine == 'compiled' and os.path.isdir(cdir):
+        arrays = {name[:-4]: np.load(os.path.join(cdir, name), mmap_mode=mmap_mode, allow_pickle=False)
+                  for name in os.listdir(cdir) if name.endswith('.npy')}
+        return ArtifactBundle(version, 'compiled', compiled=CompiledLinearModel(arrays), manifest=manifest)
+    if engine == 'compiled':
+        print(f"[artifact] version {version} has no compiled arrays, serving with sklearn")
+
+    objs = {key: joblib.load(os.path.join(vdir, name), mmap_mode=mmap_mode) for key, name in PICKLES.items()}
+    return ArtifactBundle(version, 'sklearn', manifest=manifest, **objs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned model artifact tool")
+    parser.add_argument('--root', default=ARTIFACTS_DIR)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_pub = sub.add_parser('publish', help="snapshot the pickles in backend/ as a new version")
+    p_pub.add_argument('--version', default=None)
+    p_pub.add_argument('--no-activate', action='store_true')
+    sub.add_parser('list', help="list versions (* marks CURRENT)")
+    p_act = sub.add_parser('activate', help="point CURRENT at an existing version")
+    p_act.add_argument('version')
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'publish':
+        import joblib
+        objs = {key: joblib.load(os.path.join(BASE, name)) for key, name in PICKLES.items()}
+        version = publish(objs['tfidf'], objs['model'], objs['label_encoder'], version=args.version,
+                          root=args.root, activate=not args.no_activate)
+        print("Published artifact version", version)
+    elif args.cmd == 'list':
+        cur = current_version(args.root)
+        for v in list_versions(args.root):
+            print(('* ' if v == cur else '  ') + v)
+    elif args.cmd == 'activate':
+        set_current(args.version, args.root)
+        print("CURRENT ->", args.version)
+
+
+if __name__ == '__main__':
+    main()
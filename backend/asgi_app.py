@@ -0,0 +1,608 @@
+# backend/asgi_app.py
+"""
+ASGI variant of app.py, for deployments where slow I/O (SMTP, Google OAuth,
+big static files) shouldn't tie up a worker thread per request.
+
+Optional dependencies: starlette, httpx, aiosmtplib, uvicorn (and a2wsgi,
+if installed, for the Flask bridge). The Flask app stays the default; this
+module imports app.py and shares its state (artifacts, prediction cache,
+static asset cache, admission policies, metrics), so both serve the same
+model and JSON contracts.
+
+Natively async here:
+    /chat, /chat/batch   cache lookups on the event loop; tfidf/model inference
+                         runs in a bounded pool (ASGI_INFERENCE_POOL=thread|process,
+                         ASGI_INFERENCE_WORKERS). Past ASGI_INFERENCE_QUEUE pending
+                         calls, /chat answers from keyword_fallback() (X-Degraded: 1)
+                         and /chat/batch returns 503, as under ADMISSION in app.py
+    /send_contact        aiosmtplib when MAIL_OUTBOX=0 (the outbox already sends
+                         in the background)
+    /auth/google/callback  token exchange and userinfo over a pooled httpx.AsyncClient
+    static files, /contact, /quiz_*
+Every other Flask route (/healthz, /readyz, /metrics, /admin/*, ...) is
+forwarded to the Flask app through a WSGI bridge, so new routes work in both.
+
+Usage (from backend/):
+    python asgi_app.py --bind 0.0.0.0:5000          # or: uvicorn asgi_app:app
+    python parity_check.py                          # compare responses with app.py
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import NotFound
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as core
+from admission import Rejected
+from metrics import REGISTRY as metrics
+
+
+# -----------------------------
+# Inference pool
+# -----------------------------
+class PoolBusy(Exception):
+    pass
+
+
+def _worker_init():
+    # forked workers inherit uvicorn's handlers, which would swallow SIGTERM/SIGINT
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class InferencePool:
+    """
+    Runs CPU-bound calls off the event loop with at most `max_pending` queued or
+    running. 'process' workers are forked with the loaded model (copy-on-write)
+    and replaced when the serving artifact version changes.
+    """
+
+    def __init__(self, kind='thread', workers=2, max_pending=256):
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.pending = 0
+        self.completed = self.rejected = 0
+        self._executor = None
+        self._bundle = None
+
+    def stale(self):
+        """True when process workers must be (re)forked to pick up the serving bundle."""
+        return self.kind == 'process' and self._bundle is not core.artifacts
+
+    def executor(self):
+        if self.stale():
+            # a reloaded model only reaches process workers through a fresh fork
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self._bundle = core.ensure_artifacts()
+        if self._executor is None:
+            if self.kind == 'process':
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_worker_init)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolBusy()
+        self.pending += 1
+        try:
+            if self.stale():
+                # the first load (STARTUP_MODE=lazy) must finish before forking; keep it off the loop
+                await run_in_threadpool(core.ensure_artifacts)
+            return await asyncio.get_running_loop().run_in_executor(self.executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {'kind': self.kind, 'workers': self.workers, 'pending': self.pending,
+                'max_pending': self.max_pending, 'completed': self.completed, 'rejected': self.rejected}
+
+
+# threads share the GIL with the event loop, so a couple are enough; processes scale with cores
+ASGI_INFERENCE_POOL = os.getenv("ASGI_INFERENCE_POOL", "thread")
+inference = InferencePool(
+    ASGI_INFERENCE_POOL,
+    workers=int(os.getenv("ASGI_INFERENCE_WORKERS")
+                or ((os.cpu_count() or 2) if ASGI_INFERENCE_POOL == 'process' else 2)),
+    max_pending=int(os.getenv("ASGI_INFERENCE_QUEUE") or 256),
+)
+
+
+def collect_asgi_metrics():
+    st = inference.stats()
+    yield ('mentallify_asgi_inference_pending', 'gauge', "Inference calls queued or running in the pool",
+           st['pending'], {})
+    yield ('mentallify_asgi_inference_rejected_total', 'counter', "Inference calls refused by a full pool",
+           st['rejected'], {})
+
+metrics.add_collector(collect_asgi_metrics)
+
+
+# -----------------------------
+# Request helpers
+# -----------------------------
+def endpoint(name):
+    """Records the same per-endpoint HTTP metrics as app.py's request hooks."""
+    def wrap(fn):
+        async def handler(request):
+            started = time.perf_counter()
+            metrics.inc('mentallify_http_in_flight', endpoint=name)
+            status = '500'
+            try:
+                resp = await fn(request)
+                status = str(resp.status_code)
+                return resp
+            finally:
+                metrics.dec('mentallify_http_in_flight', endpoint=name)
+                metrics.inc('mentallify_http_requests_total', endpoint=name, method=request.method, status=status)
+                metrics.observe('mentallify_http_request_seconds', time.perf_counter() - started, endpoint=name)
+        handler.__name__ = fn.__name__
+        return handler
+    return wrap
+
+
+async def json_body(request):
+    """Like Flask's get_json(silent=True): None for a missing or malformed body."""
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+def rate_limited(request, name):
+    """429 response when the admission token buckets for `name` are empty, else None."""
+    policy = core.admission_policies.get(name)
+    if policy is None:
+        return None
+    try:
+        policy.check_rates(core.client_ip(request.headers, request.client.host if request.client else None),
+                           core.request_user(request.headers.get('Authorization')))
+    except Rejected as e:
+        metrics.inc('mentallify_admission_rejected_total', endpoint=name, reason=e.reason)
+        return JSONResponse(core.rejection_body(e), e.status, headers={'Retry-After': str(e.retry_after)})
+    return None
+
+
+async def predict(messages):
+    """(label, probs) per message via the prediction cache and the inference pool, or None."""
+    results = [core.prediction_cache.get(m) for m in messages]
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        generation = core.prediction_cache.generation
+        preds = await inference.run(core.predict_messages, [messages[i] for i in misses])
+        if preds is None:
+            return None
+        for i, pred in zip(misses, preds):
+            core.prediction_cache.put(messages[i], pred, generation)
+            results[i] = pred
+    return results
+
+
+# -----------------------------
+# Chat
+# -----------------------------
+@endpoint('chat')
+async def chat(request):
+    limited = rate_limited(request, 'chat')
+    if limited is not None:
+        return limited
+    with metrics.timer(core.INFERENCE_STAGE, stage='parse'):
+        body = await json_body(request) or {}
+    message = (body.get('message') or "").strip()
+    if not message:
+        return JSONResponse({'reply': 'Please enter a message.'}, 400)
+
+    reason = 'no_model'
+    try:
+        preds = await predict([message])
+        if preds is not None:
+            result = core.chat_reply(*preds[0])
+            core.log_feedback(message, result)
+            with metrics.timer(core.INFERENCE_STAGE, stage='serialize'):
+                return JSONResponse(result)
+    except PoolBusy:
+        result = core.fallback_reply(message, 'degraded')
+        core.log_feedback(message, result)
+        return JSONResponse(result, headers={'X-Degraded': '1'})
+    except Exception as e:
+        reason = 'error'
+        print("[ml] inference failed:", e)
+        traceback.print_exc()
+
+    result = core.fallback_reply(message, reason)
+    core.log_feedback(message, result)
+    return JSONResponse(result)
+
+
+async def chat_batch(messages):
+    """Async twin of app.chat_batch()."""
+    cleaned = [(m or "").strip() if isinstance(m, str) else "" for m in messages]
+    results = [None] * len(cleaned)
+    todo = []
+    for i, m in enumerate(cleaned):
+        if m:
+            todo.append(i)
+        else:
+            results[i] = {'reply': 'Please enter a message.', 'label': None, 'probs': [], 'error': 'empty message'}
+
+    for start in range(0, len(todo), core.CHAT_BATCH_MAX):
+        chunk = todo[start:start + core.CHAT_BATCH_MAX]
+        preds = None
+        reason = 'no_model'
+        try:
+            preds = await predict([cleaned[i] for i in chunk])
+        except PoolBusy:
+            raise
+        except Exception as e:
+            reason = 'error'
+            print("[ml] batch inference failed:", e)
+            traceback.print_exc()
+        for j, i in enumerate(chunk):
+            results[i] = core.chat_reply(*preds[j]) if preds is not None else core.fallback_reply(cleaned[i], reason)
+    return results
+
+
+@endpoint('chat_batch_endpoint')
+async def chat_batch_endpoint(request):
+    limited = rate_limited(request, 'chat_batch_endpoint')
+    if limited is not None:
+        return limited
+    body = await json_body(request) or {}
+    messages = body.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return JSONResponse({'error': "Provide a non-empty 'messages' list."}, 400)
+
+    stream = bool(body.get('stream')) or 'application/x-ndjson' in (request.headers.get('Accept') or '')
+    if not stream:
+        if len(messages) > core.CHAT_BATCH_MAX:
+            return JSONResponse({'error': f"Batch too large (max {core.CHAT_BATCH_MAX}); use stream=true."}, 413)
+        try:
+            return JSONResponse({'results': await chat_batch(messages)})
+        except PoolBusy:
+            return JSONResponse({'error': "Server busy, please retry shortly.", 'retry_after': 1}, 503,
+                                headers={'Retry-After': '1'})
+
+    async def generate():
+        for start in range(0, len(messages), core.CHAT_BATCH_MAX):
+            chunk = messages[start:start + core.CHAT_BATCH_MAX]
+            try:
+                results = await chat_batch(chunk)
+            except PoolBusy:
+                yield json.dumps({'index': start, 'error': "Server busy, please retry shortly."}) + "\n"
+                return
+            for offset, result in enumerate(results):
+                yield json.dumps({'index': start + offset, **result}) + "\n"
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+# -----------------------------
+# Quiz
+# -----------------------------
+@endpoint('quiz_questions')
+async def quiz_questions(request):
+    try:
+        n = int(request.query_params.get('n', '12'))
+    except ValueError:
+        n = 12
+    return JSONResponse({"questions": core.get_symptom_index().sample_questions(n)})
+
+
+@endpoint('quiz_result')
+async def quiz_result(request):
+    body = await json_body(request) or {}
+    yes_symptoms = body.get('yes_symptoms', []) or []
+    return JSONResponse({'results': core.get_symptom_index().score(yes_symptoms)})
+
+
+# -----------------------------
+# Contact
+# -----------------------------
+async def send_contact_email(sender_name, sender_email, message_text):
+    """Async twin of app.send_contact_email() over aiosmtplib."""
+    import aiosmtplib
+    if not core.smtp_configured():
+        raise RuntimeError("SMTP not configured on server.")
+    msg = core.build_contact_email(sender_name, sender_email, message_text)
+    smtp = aiosmtplib.SMTP(hostname=core.MAIL_SERVER, port=core.MAIL_PORT, timeout=15,
+                           start_tls=core.MAIL_PORT in (587,))
+    with metrics.timer('mentallify_smtp_seconds', op='connect'):
+        await smtp.connect()
+    try:
+        if smtp.supports_extension('auth'):
+            await smtp.login(core.MAIL_USERNAME, core.MAIL_PASSWORD)
+        with metrics.timer('mentallify_smtp_seconds', op='send'):
+            await smtp.send_message(msg)
+    finally:
+        smtp.close()
+
+
+@endpoint('send_contact')
+async def send_contact(request):
+    limited = rate_limited(request, 'send_contact')
+    if limited is not None:
+        return limited
+    try:
+        data = await json_body(request) or {}
+        name = (data.get('name') or "").strip()
+        email = (data.get('email') or "").strip()
+        message_text = (data.get('message') or "").strip()
+
+        if not (name and email and message_text):
+            return JSONResponse({"ok": False, "error": "Please provide name, email and message."}, 400)
+
+        if not core._mail_initialized:
+            await run_in_threadpool(core.init_mail)
+
+        # backup to the message store
+        try:
+            store = core.message_store
+            if store is None:
+                raise RuntimeError("message store unavailable")
+            if hasattr(store, 'append_async'):
+                fut = store.append_async(time.time(), name, email, message_text)
+                await asyncio.wait_for(asyncio.wrap_future(fut), 10)
+            else:
+                await run_in_threadpool(store.append, time.time(), name, email, message_text)
+        except Exception as e:
+            print("[send_contact] backup failed:", e)
+
+        # the outbox only does a local insert; inline sends go over async SMTP
+        try:
+            if core.mail_outbox is not None:
+                await run_in_threadpool(core.queue_contact_email, name, email, message_text)
+            else:
+                await send_contact_email(name, email, message_text)
+        except Exception as send_err:
+            print("[send_contact] failed to send email:", send_err)
+            traceback.print_exc()
+            return JSONResponse({"ok": False, "error": "Failed to send email. Check server logs."}, 500)
+
+        return JSONResponse({"ok": True, "message": "Message sent. We'll get back to you soon."})
+    except Exception as e:
+        print("[send_contact] unexpected error:", e)
+        traceback.print_exc()
+        return JSONResponse({"ok": False, "error": "Server error"}, 500)
+
+
+# -----------------------------
+# Google OAuth callback
+# -----------------------------
+_http_client = None
+
+def http_client():
+    """One pooled AsyncClient per process (created on the serving event loop)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(
+            max_connections=int(os.getenv("ASGI_HTTP_MAX_CONNECTIONS") or 200), max_keepalive_connections=20))
+    return _http_client
+
+
+@endpoint('auth_google_callback')
+async def auth_google_callback(request):
+    limited = rate_limited(request, 'auth_google_callback')
+    if limited is not None:
+        return limited
+    code = request.query_params.get('code')
+    if not code:
+        return HTMLResponse("Missing code parameter", 400)
+
+    client = core.oauth_client()
+    try:
+        with metrics.timer('mentallify_oauth_seconds', step='token'):
+            resp = await http_client().post(client.token_url, data=client.token_form(code, core.OAUTH_REDIRECT_URI))
+            resp.raise_for_status()
+            token_json = resp.json()
+    except Exception as e:
+        print("[auth] token exchange failed:", e)
+        return HTMLResponse("Token exchange failed", 500)
+
+    access_token = token_json.get("access_token")
+    id_token = token_json.get("id_token")
+    if not (access_token or id_token):
+        print("[auth] no access_token in token response:", token_json)
+        return HTMLResponse("Token exchange didn't return access token", 500)
+
+    userinfo = None
+    fallback_reason = 'no_id_token'
+    if id_token and not client.can_verify_locally:
+        fallback_reason = 'no_crypto'
+    elif id_token:
+        try:
+            # CPU-only while the JWKS keys are cached; may fetch them on a miss
+            with metrics.timer('mentallify_oauth_seconds', step='verify_id_token'):
+                claims = await run_in_threadpool(client.verify_id_token, id_token)
+            userinfo = {k: claims.get(k) for k in core.PROFILE_CLAIMS}
+            if not userinfo.get('email'):
+                userinfo, fallback_reason = None, 'no_email_claim'
+        except Exception as e:
+            fallback_reason = 'invalid_id_token'
+            print("[auth] id_token verification failed, using userinfo:", e)
+
+    if userinfo is None:
+        metrics.inc('mentallify_oauth_userinfo_fallback_total', reason=fallback_reason)
+        if not access_token:
+            return HTMLResponse("Failed to fetch user info", 500)
+        try:
+            with metrics.timer('mentallify_oauth_seconds', step='userinfo'):
+                resp = await http_client().get(client.userinfo_url,
+                                               headers={"Authorization": f"Bearer {access_token}"})
+                resp.raise_for_status()
+                userinfo = resp.json()
+        except Exception as e:
+            print("[auth] userinfo fetch failed:", e)
+            return HTMLResponse("Failed to fetch user info", 500)
+
+    if not core.OAUTH_SECRET_KEY:
+        print("[auth] OAUTH_SECRET_KEY not set in environment")
+        return HTMLResponse("Server not configured for sessions", 500)
+    return HTMLResponse(core.login_popup_html(core.session_token(userinfo), userinfo))
+
+
+# -----------------------------
+# Static files
+# -----------------------------
+async def static_response(request, full_path, render=None, render_key=None, media_type=None):
+    """ASGI twin of StaticAssets.response() (no Range support on cached bodies)."""
+    assets = core.static_assets
+    entry = await run_in_threadpool(assets.get, full_path, render, render_key)
+    if entry is None:
+        assets.from_disk += 1
+        return FileResponse(full_path, media_type=media_type)
+
+    accepted = parse_accept_header(request.headers.get('Accept-Encoding'))
+    body, encoding, etag = assets.negotiate(entry, accepted)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': entry.cache_control}
+    if entry.variants:
+        headers['Vary'] = 'Accept-Encoding'
+    if parse_etags(request.headers.get('If-None-Match')).contains(etag):
+        assets.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=media_type or entry.mimetype, headers=headers)
+
+
+@endpoint('contact_page')
+async def contact_page(request):
+    contact_path = core.static_assets.resolve('contact.html')
+    if contact_path is None:
+        return HTMLResponse("contact.html not found on server", 500)
+    try:
+        return await static_response(request, contact_path, render=core.render_contact, render_key='contact',
+                                     media_type='text/html')
+    except Exception as e:
+        print("[contact_page] failed to read contact.html:", e)
+        traceback.print_exc()
+        return HTMLResponse("Failed to render contact page", 500)
+
+
+@endpoint('models_static')
+async def models_static(request):
+    full = core.static_assets.resolve(os.path.join('models', request.path_params['filename']))
+    if full is None or not full.startswith(core.MODELS_DIR + os.sep):
+        return HTMLResponse(NotFound().get_body(), 404)
+    return await static_response(request, full)
+
+
+@endpoint('serve_frontend')
+async def serve_frontend(request):
+    safe_path = request.path_params.get('path') or 'front.html'
+    requested_full = os.path.normpath(os.path.join(core.FRONTEND_ROOT, safe_path))
+    if not requested_full.startswith(core.FRONTEND_ROOT):
+        return HTMLResponse("Invalid path", 400)
+    if core.static_assets.is_private(os.path.relpath(requested_full, core.FRONTEND_ROOT)):
+        return HTMLResponse(NotFound().get_body(), 404)
+    full = core.static_assets.resolve(safe_path)
+    if full is not None:
+        return await static_response(request, full)
+    for name in ('front.html', 'index.html'):
+        full = core.static_assets.resolve(name)
+        if full is not None:
+            return await static_response(request, full)
+    return HTMLResponse("front.html/index.html not found on server", 500)
+
+
+# -----------------------------
+# App
+# -----------------------------
+NATIVE_ROUTES = [
+    Route('/chat', chat, methods=['POST']),
+    Route('/chat/batch', chat_batch_endpoint, methods=['POST']),
+    Route('/quiz_questions', quiz_questions, methods=['GET']),
+    Route('/quiz_result', quiz_result, methods=['POST']),
+    Route('/contact', contact_page, methods=['GET']),
+    Route('/send_contact', send_contact, methods=['POST']),
+    Route('/auth/google/callback', auth_google_callback, methods=['GET']),
+    Route('/models/{filename:path}', models_static, methods=['GET']),
+]
+FRONTEND_ROUTES = [
+    Route('/', serve_frontend, methods=['GET']),
+    Route('/{path:path}', serve_frontend, methods=['GET']),
+]
+NATIVE_ENDPOINTS = {route.endpoint.__name__ for route in NATIVE_ROUTES + FRONTEND_ROUTES}
+
+
+def flask_routes():
+    """Routes for the Flask endpoints without a native handler, forwarded through WSGI."""
+    bridge = WSGIMiddleware(core.app)
+    routes = []
+    for rule in core.app.url_map.iter_rules():
+        if rule.endpoint in NATIVE_ENDPOINTS or rule.endpoint == 'static':
+            continue
+        if '<' in rule.rule:
+            raise ValueError(f"Route {rule.rule} has converters; give it a native handler in asgi_app.py")
+        routes.append(Route(rule.rule, bridge, methods=sorted(rule.methods - {'HEAD', 'OPTIONS'})))
+    return routes
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    inference.shutdown()
+    if _http_client is not None:
+        await _http_client.aclose()
+
+
+app = Starlette(
+    routes=NATIVE_ROUTES + flask_routes() + FRONTEND_ROUTES,     # the frontend catch-all stays last
+    # like flask_cors' defaults: any origin, echoed back rather than '*'
+    middleware=[Middleware(CORSMiddleware, allow_origin_regex='.*', allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+def main(argv=None):
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve the ASGI variant with uvicorn")
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and not core.QUIZ_SECRET:
+        # each worker imports the app separately and would sign quiz tokens with its own random key
+        sys.exit("--workers > 1 needs QUIZ_SECRET (or OAUTH_SECRET_KEY) so all workers accept the same "
+                 "adaptive quiz tokens")
+    host, port = args.bind.rsplit(':', 1)
+    uvicorn.run('asgi_app:app' if args.workers > 1 else app, host=host, port=int(port),
+                workers=args.workers, log_level='warning', backlog=4096)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,534 @@
+# backend/benchmark.py
+"""
+Offline benchmark suite for the API and the training/export pipeline.
+
+Everything runs against a synthetic dataset (see generate_rows) in a temporary
+directory: the trained pickles, published artifacts, exports, outbox and
+message store never touch the real ones in backend/, models/ or data/.
+
+Suites:
+    chat    /chat through the Flask test client (cache misses and hits), then
+            through serve.py on a local port driven by a keep-alive HTTP load
+            generator at several concurrency levels: req/s and p50/p95/p99
+    quiz    SymptomIndex build + score (what /quiz_result runs) on synthetic
+            symptom banks of increasing size, and the adaptive quiz: time per
+            question choice, questions asked and top-1 hit rate
+    train   train_model.main() wall time and peak RSS per row count (each run in
+            a fresh process so ru_maxrss is per run)
+    export  export_model_for_browser.py output sizes (json, binary, gzip) and
+            load/parse time of each
+
+Results are one JSON file of flat metrics, each {"value", "unit", "better"}.
+--compare checks them against a baseline and exits 1 when any metric is worse
+by more than --threshold (fraction).
+
+Usage (from backend/):
+    python benchmark.py                                  # all suites -> reports/benchmark_results.json
+    python benchmark.py --quick --suites chat quiz
+    python benchmark.py --save-baseline                  # also copy to reports/benchmark_baseline.json
+    python benchmark.py --compare reports/benchmark_baseline.json --threshold 0.15
+"""
+import argparse
+import csv
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+REPORTS_DIR = os.path.join(BASE, 'reports')
+SAMPLE_PATH = os.path.join(REPORTS_DIR, 'sample_predictions.csv')
+RESULTS_PATH = os.path.join(REPORTS_DIR, 'benchmark_results.json')
+BASELINE_PATH = os.path.join(REPORTS_DIR, 'benchmark_baseline.json')
+
+SUITES = ('chat', 'quiz', 'train', 'export')
+
+# used when reports/sample_predictions.csv is missing
+BUILTIN_SYMPTOMS = {
+    "Major Depressive Disorder": ["persistent low mood", "loss of interest or pleasure in activities",
+                                  "fatigue or loss of energy", "insomnia or hypersomnia",
+                                  "significant weight/appetite change"],
+    "Generalized Anxiety Disorder": ["excessive worry", "restlessness", "muscle tension",
+                                     "difficulty concentrating", "irritability"],
+    "Panic Disorder": ["recurrent panic attacks", "palpitations", "fear of dying", "sweating",
+                       "shortness of breath"],
+    "Insomnia Disorder": ["difficulty falling asleep", "early morning awakening", "daytime sleepiness",
+                          "non-restorative sleep"],
+}
+BUILTIN_MODIFIERS = ["(worse in the morning)", "(often present for weeks)", "(interferes with work/school)",
+                     "(occurs most days)"]
+SEVERITIES = ["mild", "moderate", "severe"]
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+def load_symptom_vocab(path=SAMPLE_PATH):
+    """
+    {disease: [symptom, ...]} and the list of modifiers, parsed from
+    sample_predictions.csv ("symptom (modifier); symptom; ...; severity: x").
+    A trailing parenthetical counts as a modifier when it appears in 3+ items.
+    """
+    if not os.path.exists(path):
+        return BUILTIN_SYMPTOMS, BUILTIN_MODIFIERS
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            items = [s.strip() for s in (row.get('text') or '').split(';') if s.strip()]
+            rows.append((row.get('pred') or '', [s for s in items if not s.startswith('severity:')]))
+    trailing = {}
+    for _, items in rows:
+        for item in items:
+            m = re.search(r'\s(\([^()]*\))$', item)
+            if m:
+                trailing[m.group(1)] = trailing.get(m.group(1), 0) + 1
+    modifiers = sorted(p for p, n in trailing.items() if n >= 3)
+    vocab = {}
+    for disease, items in rows:
+        for item in items:
+            for mod in modifiers:
+                if item.endswith(' ' + mod):
+                    item = item[:-len(mod) - 1]
+                    break
+            vocab.setdefault(disease, set()).add(item)
+    vocab = {d: sorted(s) for d, s in vocab.items() if d and len(s) >= 2}
+    return (vocab or BUILTIN_SYMPTOMS), (modifiers or BUILTIN_MODIFIERS)
+
+
+def generate_rows(n, seed=0, vocab=None, modifiers=None):
+    """n (symptoms, disease) rows in the training CSV format."""
+    if vocab is None:
+        vocab, modifiers = load_symptom_vocab()
+    rng = random.Random(seed)
+    diseases = sorted(vocab)
+    for _ in range(n):
+        disease = rng.choice(diseases)
+        pool = vocab[disease]
+        items = []
+        for s in rng.sample(pool, rng.randint(min(2, len(pool)), len(pool))):
+            items.append(f"{s} {rng.choice(modifiers)}" if rng.random() < 0.5 else s)
+        if rng.random() < 0.3:
+            items.append(f"severity: {rng.choice(SEVERITIES)}")
+        yield "; ".join(items), disease
+
+
+def write_dataset(path, n, seed=0):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symptoms', 'disease'])
+        writer.writerows(generate_rows(n, seed))
+    return path
+
+
+def synthetic_symptom_bank(n_diseases, n_symptoms, per_disease=8, seed=0):
+    rng = random.Random(seed)
+    symptoms = [f"symptom {i}" for i in range(n_symptoms)]
+    diseases = {f"Disease {d}": {"symptoms": rng.sample(symptoms, min(per_disease, n_symptoms)),
+                                 "precautions": "See a professional."}
+                for d in range(n_diseases)}
+    questions = [{"text": f"Do you have {s}?", "symptom_key": s} for s in symptoms]
+    return {"diseases": diseases, "questions": questions}
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def latency_metrics(prefix, latencies, elapsed, results):
+    lat = sorted(latencies)
+    results[f'{prefix}.req_per_s'] = metric(len(lat) / elapsed if elapsed else 0.0, 'req/s', 'higher')
+    for q in (50, 95, 99):
+        results[f'{prefix}.p{q}_ms'] = metric(percentile(lat, q) * 1000.0, 'ms')
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(float(value), 4), 'unit': unit, 'better': better}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_json_subprocess(args, env=None, timeout=3600):
+    """Runs `python benchmark.py <args>` and returns the JSON object it prints last."""
+    out = subprocess.run([sys.executable, os.path.abspath(__file__)] + args, cwd=BASE, env=env,
+                         capture_output=True, text=True, timeout=timeout)
+    if out.returncode != 0:
+        raise RuntimeError(f"benchmark worker failed: {out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# -----------------------------
+# Workers (run in fresh processes)
+# -----------------------------
+def worker_train(csv_path, out_dir):
+    """Trains with train_model.main() writing into out_dir; prints wall time and peak RSS."""
+    import train_model
+    train_model.TFIDF_PATH = os.path.join(out_dir, 'tfidf_vectorizer.pkl')
+    train_model.MODEL_PATH = os.path.join(out_dir, 'mental_health_model.pkl')
+    train_model.LE_PATH = os.path.join(out_dir, 'label_encoder.pkl')
+    train_model.REPORTS_DIR = out_dir
+    started = time.perf_counter()
+    train_model.main(csv_path)
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_rss_mb': train_model.peak_rss_mb()}))
+
+
+# -----------------------------
+# Suites
+# -----------------------------
+def prepare_model(workdir, rows, seed):
+    """Trains on synthetic data and publishes it as an artifact version in workdir/artifacts."""
+    model_dir = os.path.join(workdir, 'model')
+    if os.path.exists(os.path.join(model_dir, 'mental_health_model.pkl')):
+        return model_dir
+    os.makedirs(model_dir, exist_ok=True)
+    csv_path = write_dataset(os.path.join(workdir, f'train_{rows}.csv'), rows, seed)
+    run_json_subprocess(['train-worker', csv_path, model_dir])
+    import joblib
+    import artifact_store
+    objs = {key: joblib.load(os.path.join(model_dir, name)) for key, name in artifact_store.PICKLES.items()}
+    artifact_store.publish(objs['tfidf'], objs['model'], objs['label_encoder'], version='bench',
+                           root=os.path.join(workdir, 'artifacts'))
+    return model_dir
+
+
+def app_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        'ARTIFACTS_DIR': os.path.join(workdir, 'artifacts'),
+        'OUTBOX_PATH': os.path.join(workdir, 'outbox.sqlite3'),
+        'MESSAGES_DB_PATH': os.path.join(workdir, 'messages.sqlite3'),
+        'STARTUP_MODE': 'eager',
+    })
+    return env
+
+
+def bench_chat(workdir, cfg, results):
+    messages = [text for text, _ in generate_rows(cfg['chat_requests'], seed=cfg['seed'] + 1)]
+    env = app_env(workdir)
+
+    # in-process, through the Flask test client (fresh process: app reads env at import)
+    out = run_json_subprocess(['chat-worker', str(cfg['chat_requests']), str(cfg['seed'])], env=env)
+    for mode in ('miss', 'hit'):
+        latency_metrics(f'chat.test_client.{mode}', out[mode]['latencies'], out[mode]['elapsed'], results)
+
+    # over HTTP, through serve.py
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BASE, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+         '--workers', str(cfg['http_workers']), '--threads', str(cfg['http_threads'])],
+        cwd=BASE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 120
+        while True:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                conn.request('GET', '/readyz')
+                if conn.getresponse().status == 200:
+                    break
+            except OSError:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("serve.py did not become ready")
+            time.sleep(0.2)
+        for concurrency in cfg['concurrency']:
+            latencies, elapsed, errors = load_generate(port, messages, concurrency, cfg['http_seconds'])
+            latency_metrics(f'chat.http.c{concurrency}', latencies, elapsed, results)
+            results[f'chat.http.c{concurrency}.errors'] = metric(errors, 'count')
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def worker_chat(n, seed):
+    import app
+    app.warm_up()
+    client = app.app.test_client()
+    messages = [text for text, _ in generate_rows(n, seed=seed + 1)]
+    out = {}
+    for mode in ('miss', 'hit'):
+        if mode == 'miss':
+            app.prediction_cache.clear()
+        latencies = []
+        started = time.perf_counter()
+        for m in messages:
+            t = time.perf_counter()
+            client.post('/chat', json={'message': m})
+            latencies.append(time.perf_counter() - t)
+        out[mode] = {'latencies': latencies, 'elapsed': time.perf_counter() - started}
+    print(json.dumps(out))
+
+
+def load_generate(port, messages, concurrency, seconds):
+    """Keep-alive POST /chat from `concurrency` threads for `seconds`; returns latencies, elapsed, errors."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def run(worker):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, i = [], worker
+        while time.perf_counter() < stop_at:
+            body = json.dumps({'message': messages[i % len(messages)]})
+            i += concurrency
+            t = time.perf_counter()
+            try:
+                conn.request('POST', '/chat', body=body, headers={'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    raise OSError(resp.status)
+                local.append(time.perf_counter() - t)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(w,)) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - started, errors[0]
+
+
+def bench_quiz(cfg, results):
+    from symptom_index import SymptomIndex
+    rng = random.Random(cfg['seed'])
+    for n_diseases in cfg['quiz_sizes']:
+        n_symptoms = max(50, n_diseases * 2)
+        bank = synthetic_symptom_bank(n_diseases, n_symptoms, seed=cfg['seed'])
+        started = time.perf_counter()
+        index = SymptomIndex(bank)
+        results[f'quiz.d{n_diseases}.build_ms'] = metric((time.perf_counter() - started) * 1000.0, 'ms')
+        symptoms = [q['symptom_key'] for q in bank['questions']]
+        answers = [rng.sample(symptoms, 12) for _ in range(cfg['quiz_calls'])]
+        latencies = []
+        started = time.perf_counter()
+        for yes in answers:
+            t = time.perf_counter()
+            index.score(yes)
+            latencies.append(time.perf_counter() - t)
+        latency_metrics(f'quiz.d{n_diseases}.score', latencies, time.perf_counter() - started, results)
+        if n_diseases <= 1000:      # the likelihood matrices are questions x diseases floats
+            bench_adaptive_quiz(index, n_diseases, cfg, rng, results)
+
+
+def bench_adaptive_quiz(index, n_diseases, cfg, rng, results):
+    """Simulated respondents answering truthfully for a random disease; choices bypass the memo."""
+    from adaptive_quiz import AdaptiveQuiz
+    quiz = AdaptiveQuiz(index, 'benchmark')
+    choose_times, asked, correct = [], 0, 0
+    runs = max(20, cfg['quiz_calls'] // 20)
+    for _ in range(runs):
+        name, symptoms = index.diseases[rng.randrange(len(index.diseases))][:2]
+        symptoms = set(symptoms)
+        answered = yes = 0
+        while True:
+            t = time.perf_counter()
+            qi = quiz._choose(answered, yes)
+            choose_times.append(time.perf_counter() - t)
+            if qi < 0:
+                break
+            answered |= 1 << qi
+            if quiz.questions[qi]['symptom_key'] in symptoms:
+                yes |= 1 << qi
+        asked += bin(answered).count("1")
+        correct += quiz.results(answered, yes)[0]['disease'] == name
+    choose_times.sort()
+    results[f'quiz.d{n_diseases}.adaptive.choose_p50_us'] = metric(percentile(choose_times, 50) * 1e6, 'us')
+    results[f'quiz.d{n_diseases}.adaptive.choose_p99_us'] = metric(percentile(choose_times, 99) * 1e6, 'us')
+    results[f'quiz.d{n_diseases}.adaptive.avg_questions'] = metric(asked / runs, 'questions')
+    results[f'quiz.d{n_diseases}.adaptive.top1'] = metric(correct / runs, 'fraction', 'higher')
+
+
+def bench_train(workdir, cfg, results):
+    for rows in cfg['train_rows']:
+        csv_path = write_dataset(os.path.join(workdir, f'train_{rows}.csv'), rows, cfg['seed'])
+        out_dir = os.path.join(workdir, f'train_out_{rows}')
+        os.makedirs(out_dir, exist_ok=True)
+        out = run_json_subprocess(['train-worker', csv_path, out_dir])
+        results[f'train.rows{rows}.seconds'] = metric(out['seconds'], 's')
+        if out['peak_rss_mb'] is not None:
+            results[f'train.rows{rows}.peak_rss_mb'] = metric(out['peak_rss_mb'], 'MB')
+
+
+def bench_export(workdir, model_dir, results):
+    import gzip
+    import joblib
+    import export_model_for_browser as export
+    out_dir = os.path.join(workdir, 'models')
+    os.makedirs(out_dir, exist_ok=True)
+    export.OUT_DIR = out_dir
+    tfidf = joblib.load(os.path.join(model_dir, 'tfidf_vectorizer.pkl'))
+    model = joblib.load(os.path.join(model_dir, 'mental_health_model.pkl'))
+    le = joblib.load(os.path.join(model_dir, 'label_encoder.pkl'))
+
+    started = time.perf_counter()
+    export.export_json(tfidf, model, le)
+    results['export.json.seconds'] = metric(time.perf_counter() - started, 's')
+    json_path = os.path.join(out_dir, 'web_model.json')
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    results['export.json.bytes'] = metric(len(raw), 'bytes')
+    results['export.json.gzip_bytes'] = metric(len(gzip.compress(raw, 6)), 'bytes')
+    started = time.perf_counter()
+    json.loads(raw)
+    results['export.json.parse_ms'] = metric((time.perf_counter() - started) * 1000.0, 'ms')
+
+    started = time.perf_counter()
+    manifest = export.export_binary(tfidf, model, le, check=False)
+    results['export.binary.seconds'] = metric(time.perf_counter() - started, 's')
+    results['export.binary.bytes'] = metric(manifest['bytes']['identity'], 'bytes')
+    results['export.binary.gzip_bytes'] = metric(manifest['bytes']['gzip'], 'bytes')
+    with open(os.path.join(out_dir, manifest['file']), 'rb') as f:
+        data = f.read()
+    started = time.perf_counter()
+    export.load_binary(data)
+    results['export.binary.parse_ms'] = metric((time.perf_counter() - started) * 1000.0, 'ms')
+
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+# absolute differences below these never count as regressions (timer noise on tiny values)
+NOISE_FLOOR = {'ms': 0.05, 's': 0.05, 'MB': 5.0, 'req/s': 0.0, 'bytes': 0.0, 'count': 0.0}
+
+
+def compare(results, baseline, threshold):
+    """List of (name, baseline, current, change) for metrics worse than baseline by > threshold."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            continue
+        if abs(cur['value'] - base['value']) <= NOISE_FLOOR.get(cur['unit'], 0.0):
+            continue
+        change = (cur['value'] - base['value']) / abs(base['value'])
+        worse = change > threshold if cur['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append((name, base['value'], cur['value'], change))
+    return regressions
+
+
+PRESETS = {
+    'full': {'seed': 0, 'model_rows': 20000, 'chat_requests': 2000, 'concurrency': [1, 8, 32],
+             'http_seconds': 10.0, 'http_workers': 2, 'http_threads': 8,
+             'quiz_sizes': [6, 100, 1000, 10000], 'quiz_calls': 2000, 'train_rows': [5000, 20000, 60000]},
+    'quick': {'seed': 0, 'model_rows': 3000, 'chat_requests': 300, 'concurrency': [1, 8],
+              'http_seconds': 3.0, 'http_workers': 2, 'http_threads': 4,
+              'quiz_sizes': [6, 100, 1000], 'quiz_calls': 300, 'train_rows': [2000, 5000]},
+}
+
+
+def run(args):
+    cfg = PRESETS['quick' if args.quick else 'full']
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='mentallify-bench-')
+    try:
+        model_dir = None
+        if 'chat' in args.suites or 'export' in args.suites:
+            model_dir = prepare_model(workdir, cfg['model_rows'], cfg['seed'])
+        for suite in args.suites:
+            started = time.perf_counter()
+            print(f"[bench] {suite} ...")
+            if suite == 'chat':
+                bench_chat(workdir, cfg, results)
+            elif suite == 'quiz':
+                bench_quiz(cfg, results)
+            elif suite == 'train':
+                bench_train(workdir, cfg, results)
+            elif suite == 'export':
+                bench_export(workdir, model_dir, results)
+            print(f"[bench] {suite} done in {time.perf_counter() - started:.1f}s")
+    finally:
+        if args.keep:
+            print("[bench] kept work dir", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    doc = {
+        'created': datetime.datetime.utcnow().isoformat() + 'Z',
+        'preset': 'quick' if args.quick else 'full',
+        'config': cfg,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'metrics': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=2)
+    print("Wrote", args.out)
+    for name in sorted(results):
+        print(f"  {name:40s} {results[name]['value']:>14,.3f} {results[name]['unit']}")
+    if args.save_baseline:
+        shutil.copyfile(args.out, BASELINE_PATH)
+        print("Saved baseline", BASELINE_PATH)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('preset') != doc['preset']:
+            print(f"[bench] warning: baseline preset {baseline.get('preset')} != {doc['preset']}")
+        regressions = compare(results, baseline.get('metrics', {}), args.threshold)
+        for name, base, cur, change in regressions:
+            print(f"REGRESSION {name}: {base:,.3f} -> {cur:,.3f} ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Mentallify API and pipeline")
+    sub = parser.add_subparsers(dest='cmd')
+    # internal: run in fresh processes by the suites above
+    p_train = sub.add_parser('train-worker', help=argparse.SUPPRESS)
+    p_train.add_argument('csv_path')
+    p_train.add_argument('out_dir')
+    p_chat = sub.add_parser('chat-worker', help=argparse.SUPPRESS)
+    p_chat.add_argument('n', type=int)
+    p_chat.add_argument('seed', type=int)
+
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--quick', action='store_true', help="smaller sizes, for a fast sanity run")
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help=f"copy the results to {BASELINE_PATH}")
+    parser.add_argument('--compare', default=None, help="baseline JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed relative slowdown (0.10 = 10%%)")
+    parser.add_argument('--keep', action='store_true', help="keep the temporary work directory")
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'train-worker':
+        worker_train(args.csv_path, args.out_dir)
+    elif args.cmd == 'chat-worker':
+        worker_chat(args.n, args.seed)
+    else:
+        sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
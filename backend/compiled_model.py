@@ -0,0 +1,284 @@
+# backend/compiled_model.py
+"""
+"Compiled" serve-time scorer for the TF-IDF + linear model pipeline.
+
+compile_artifacts() turns the fitted sklearn objects saved by train_model.py
+into plain NumPy arrays (idf folded into the coefficient matrix, a token ->
+column dict, stop words, tokenizer settings). CompiledLinearModel then scores
+text with a direct sparse accumulate of weight rows and reproduces
+TfidfVectorizer.transform + predict_proba without importing sklearn.
+
+Usage (offline, needs sklearn to unpickle):
+    python compiled_model.py            # writes compiled_model.npz next to the pickles
+    python compiled_model.py --check    # parity vs sklearn on toy models; exit 1 on a mismatch
+"""
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+TFIDF_PATH = os.path.join(BASE, 'tfidf_vectorizer.pkl')
+MODEL_PATH = os.path.join(BASE, 'mental_health_model.pkl')
+LE_PATH = os.path.join(BASE, 'label_encoder.pkl')
+COMPILED_PATH = os.path.join(BASE, 'compiled_model.npz')
+
+FORMAT_VERSION = 1
+
+
+# -----------------------------
+# Compile (sklearn objects -> arrays)
+# -----------------------------
+def _proba_mode(model, n_classes):
+    if n_classes == 2:
+        return 'binary'
+    multi_class = getattr(model, 'multi_class', None)
+    if multi_class == 'ovr':
+        return 'ovr'
+    if multi_class in (None, 'deprecated', 'auto') and getattr(model, 'solver', None) == 'liblinear':
+        return 'ovr'
+    if model.__class__.__name__ == 'SGDClassifier':
+        return 'ovr'
+    return 'softmax'
+
+
+def compile_artifacts(tfidf, model, label_encoder):
+    """Returns a dict of arrays suitable for np.savez / CompiledLinearModel."""
+    if not hasattr(tfidf, 'vocabulary_'):
+        raise ValueError("Vectorizer has no vocabulary_ (hashing featurizers are not supported).")
+    if tfidf.analyzer != 'word' or tfidf.tokenizer is not None or tfidf.preprocessor is not None:
+        raise ValueError("Only word analyzers with the default tokenizer/preprocessor can be compiled.")
+    if tfidf.strip_accents:
+        raise ValueError("strip_accents is not supported by the compiled scorer.")
+
+    n_features = len(tfidf.vocabulary_)
+    terms = np.empty(n_features, dtype=object)
+    for term, col in tfidf.vocabulary_.items():
+        terms[col] = term
+
+    idf = np.asarray(tfidf.idf_, dtype=np.float64) if tfidf.use_idf else np.ones(n_features)
+    coef = np.asarray(model.coef_, dtype=np.float64)              # (n_rows, n_features)
+    weights = (coef * idf).T.copy()                               # (n_features, n_rows), idf folded in
+    intercept = np.asarray(model.intercept_, dtype=np.float64).ravel()
+
+    classes = np.asarray(label_encoder.classes_)[np.asarray(model.classes_, dtype=int)] \
+        if hasattr(label_encoder, 'classes_') else np.asarray(model.classes_)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'lowercase': bool(tfidf.lowercase),
+        'token_pattern': tfidf.token_pattern,
+        'ngram_range': list(tfidf.ngram_range),
+        'sublinear_tf': bool(tfidf.sublinear_tf),
+        'binary': bool(tfidf.binary),
+        'norm': tfidf.norm,
+        'proba': _proba_mode(model, len(classes)),
+    }
+    stop_words = sorted(tfidf.get_stop_words() or [])
+    return {
+        'weights': weights,
+        'idf': idf,
+        'intercept': intercept,
+        'classes': np.asarray([str(c) for c in classes]),
+        'terms': np.asarray([str(t) for t in terms]),
+        'stop_words': np.asarray(stop_words, dtype=str),
+        'meta': np.asarray(json.dumps(meta)),
+    }
+
+
+def save_compiled(arrays, path=COMPILED_PATH):
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Serve-time scorer (NumPy only)
+# -----------------------------
+class CompiledLinearModel:
+    def __init__(self, arrays):
+        meta = json.loads(str(arrays['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model version: {meta.get('format_version')}")
+        self.meta = meta
+        self.weights = np.asarray(arrays['weights'], dtype=np.float64)
+        self.idf_sq = np.asarray(arrays['idf'], dtype=np.float64) ** 2
+        self.intercept = np.asarray(arrays['intercept'], dtype=np.float64)
+        self.classes_ = np.asarray(arrays['classes'])
+        self.vocabulary = {t: i for i, t in enumerate(arrays['terms'].tolist())}
+        self.stop_words = frozenset(arrays['stop_words'].tolist())
+        self._token_re = re.compile(meta['token_pattern'])
+        self._min_n, self._max_n = meta['ngram_range']
+
+    @classmethod
+    def load(cls, path=COMPILED_PATH, mmap_mode=None):
+        with np.load(path, mmap_mode=mmap_mode, allow_pickle=False) as npz:
+            return cls({k: npz[k] for k in npz.files})
+
+    @classmethod
+    def from_sklearn(cls, tfidf, model, label_encoder):
+        return cls(compile_artifacts(tfidf, model, label_encoder))
+
+    # -- featurization --
+    def _ngrams(self, text):
+        if self.meta['lowercase']:
+            text = text.lower()
+        tokens = [t for t in self._token_re.findall(text) if t not in self.stop_words]
+        min_n, max_n = self._min_n, self._max_n
+        if max_n == 1:
+            return tokens
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                grams.append(" ".join(tokens[i:i + n]))
+        return grams
+
+    def _features(self, text):
+        vocab = self.vocabulary
+        counts = Counter()
+        for g in self._ngrams(text):
+            col = vocab.get(g)
+            if col is not None:
+                counts[col] += 1
+        if not counts:
+            return None, None
+        cols = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.meta['binary']:
+            tf[:] = 1.0
+        elif self.meta['sublinear_tf']:
+            tf = np.log(tf) + 1.0
+        return cols, tf
+
+    # -- scoring --
+    def decision_function(self, texts):
+        out = np.tile(self.intercept, (len(texts), 1))
+        norm = self.meta['norm']
+        for r, text in enumerate(texts):
+            cols, tf = self._features(text)
+            if cols is None:
+                continue
+            acc = tf @ self.weights[cols]
+            if norm == 'l2':
+                scale = np.sqrt(np.dot(tf * tf, self.idf_sq[cols]))
+            elif norm == 'l1':
+                scale = np.sum(np.abs(tf) * np.sqrt(self.idf_sq[cols]))
+            else:
+                scale = 1.0
+            out[r] += acc / scale if scale else 0.0
+        return out
+
+    def predict_proba(self, texts):
+        dec = self.decision_function(texts)
+        mode = self.meta['proba']
+        if mode == 'softmax':
+            dec -= dec.max(axis=1, keepdims=True)
+            np.exp(dec, out=dec)
+            dec /= dec.sum(axis=1, keepdims=True)
+            return dec
+        prob = 1.0 / (1.0 + np.exp(-dec))
+        if mode == 'binary':
+            p1 = prob[:, 0]
+            return np.column_stack([1.0 - p1, p1])
+        prob /= prob.sum(axis=1, keepdims=True)
+        return prob
+
+    def predict(self, texts):
+        """List of (label, probs) pairs, same shape as app.predict_messages()."""
+        proba = self.predict_proba(texts)
+        idx = proba.argmax(axis=1)
+        return [(str(self.classes_[i]), row.tolist()) for i, row in zip(idx, proba)]
+
+
+# -----------------------------
+# Parity check (needs sklearn)
+# -----------------------------
+CHECK_DOCS = [
+    ("can't sleep, waking at 4am and lying awake for hours", 'insomnia'),
+    ("insomnia again, tired all day but can't fall asleep", 'insomnia'),
+    ("restless nights, sleep problems and sleepless worry", 'insomnia'),
+    ("racing heart, sweating, fear of dying out of nowhere", 'panic'),
+    ("sudden panic attack with chest pain and shaking", 'panic'),
+    ("heart pounding, short of breath, terrified in the supermarket", 'panic'),
+    ("sad and empty most days, nothing interests me anymore", 'depression'),
+    ("low mood, hopeless, no energy and no appetite", 'depression'),
+    ("feel worthless and empty, crying, sad all the time", 'depression'),
+]
+CHECK_TEXTS = [text for text, _ in CHECK_DOCS] + [
+    "", "zzz qqq unseen words only", "SAD SAD sad and can't sleep", "panic panic panic", "heart. sleep! mood?",
+]
+
+
+def check_parity(atol=1e-6, verbose=False):
+    """
+    Fits toy TF-IDF + linear models covering each probability mode (ovr,
+    softmax, binary) and a few vectorizer settings, compiles them (through an
+    .npz round trip) and compares predict_proba with sklearn's. Returns the
+    number of failing cases.
+    """
+    import tempfile
+    import warnings
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    binary_docs = [(t, 'sleep' if y == 'insomnia' else 'other') for t, y in CHECK_DOCS]
+    cases = [
+        ('ovr', CHECK_DOCS, {}, lambda: LogisticRegression(multi_class='ovr', max_iter=1000)),
+        ('ovr-sgd', CHECK_DOCS, {}, lambda: SGDClassifier(loss='log_loss', random_state=0)),
+        ('softmax', CHECK_DOCS, {}, lambda: LogisticRegression(max_iter=1000)),
+        ('binary', binary_docs, {}, lambda: LogisticRegression(max_iter=1000)),
+        ('softmax l1 ngrams', CHECK_DOCS, {'norm': 'l1', 'ngram_range': (1, 2), 'sublinear_tf': True},
+         lambda: LogisticRegression(max_iter=1000)),
+        ('ovr no-norm binary-tf', CHECK_DOCS, {'norm': None, 'binary': True, 'use_idf': False},
+         lambda: LogisticRegression(multi_class='ovr', max_iter=1000)),
+        ('softmax stop words', CHECK_DOCS, {'stop_words': 'english', 'ngram_range': (1, 2), 'sublinear_tf': True},
+         lambda: LogisticRegression(max_iter=1000)),
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp, warnings.catch_warnings():
+        warnings.simplefilter('ignore')      # multi_class deprecation on newer sklearn
+        for name, docs, tfidf_args, make_model in cases:
+            texts, labels = zip(*docs)
+            le = LabelEncoder()
+            y = le.fit_transform(labels)
+            tfidf = TfidfVectorizer(**tfidf_args)
+            model = make_model().fit(tfidf.fit_transform(texts), y)
+            path = os.path.join(tmp, 'compiled.npz')
+            save_compiled(compile_artifacts(tfidf, model, le), path)
+            compiled = CompiledLinearModel.load(path)
+
+            ref = model.predict_proba(tfidf.transform(CHECK_TEXTS))
+            got = compiled.predict_proba(CHECK_TEXTS)
+            ok = (got.shape == ref.shape and np.allclose(got, ref, rtol=0.0, atol=atol)
+                  and list(compiled.classes_) == [str(c) for c in le.classes_[model.classes_]])
+            diff = float(np.abs(got - ref).max()) if got.shape == ref.shape else float('inf')
+            failures += not ok
+            if verbose or not ok:
+                print(f"{'ok  ' if ok else 'FAIL'}  {name:24s} mode={compiled.meta['proba']:8s} max_abs_diff={diff:.2e}")
+    print(f"[compiled] {len(cases) - failures}/{len(cases)} parity cases within atol={atol}")
+    return failures
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile the trained model for serving")
+    parser.add_argument('--check', action='store_true', help="check parity with sklearn on toy models and exit")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    if args.check:
+        return 1 if check_parity(verbose=args.verbose) else 0
+
+    import joblib
+    tfidf = joblib.load(TFIDF_PATH)
+    model = joblib.load(MODEL_PATH)
+    le = joblib.load(LE_PATH)
+    save_compiled(compile_artifacts(tfidf, model, le))
+    print("Compiled model written to", COMPILED_PATH)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
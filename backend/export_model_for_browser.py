@@ -1,25 +1,49 @@
 # backend/export_model_for_browser.py
-import os, json, joblib
+import os, json, joblib, argparse, glob, gzip, hashlib, re, struct
 import numpy as np
+import pandas as pd
+
+from compiled_model import _proba_mode
 
 BASE = os.path.dirname(os.path.abspath(__file__))
 TFIDF_PATH = os.path.join(BASE, 'tfidf_vectorizer.pkl')
 MODEL_PATH = os.path.join(BASE, 'mental_health_model.pkl')
 LE_PATH = os.path.join(BASE, 'label_encoder.pkl')
+CSV_PATH = os.path.join(BASE, 'mental_health_dataset_60000_rows.csv')
+SAMPLE_PATH = os.path.join(BASE, 'reports', 'sample_predictions.csv')
 
 OUT_DIR = os.path.join(BASE, '..', 'models')
 os.makedirs(OUT_DIR, exist_ok=True)
 
+MANIFEST_NAME = 'web_model.manifest.json'
+
+# -----------------------------
+# Binary format (little-endian)
+# -----------------------------
+#   magic  b"MNTL" | u16 version | u16 reserved | u32 header_len | header JSON (utf-8)
+#   zero padding to a 4-byte boundary, then the sections listed in header["sections"]
+#   (name -> [offset, byte length, dtype]):
+#     idf          float16[n_features]        for the l2 norm
+#     feature_ptr  uint32[n_features + 1]     CSR row pointers, one row per feature
+#     entry_class  uint8[nnz]                 class index of each kept weight
+#     entry_weight int8|float16[nnz]          quantized idf-folded weight
+#     term_offsets uint32[n_features + 1]     into term_bytes
+#     term_bytes   utf-8                      vocabulary, sorted; feature id = sorted rank
+# Dequantized weight = entry_weight * header["scales"][entry_class].
+MAGIC = b'MNTL'
+FORMAT_VERSION = 1
+# the browser loader tokenizes with the JS equivalent of sklearn's default pattern only
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+# export_binary refuses to write a model that disagrees with sklearn more than this
+MIN_TOP1_AGREEMENT = 0.99
+MAX_PROB_DIFF = 0.05
+
 def to_py(x):
     if hasattr(x, 'tolist'):
         return x.tolist()
     return x
 
-def main():
-    tfidf = joblib.load(TFIDF_PATH)
-    model = joblib.load(MODEL_PATH)
-    le = joblib.load(LE_PATH)
-
+def export_json(tfidf, model, le):
     vocab = {k:int(v) for k,v in tfidf.vocabulary_.items()}
     idf = to_py(getattr(tfidf, 'idf_', None))
     coefs = to_py(getattr(model, 'coef_', None))
@@ -42,5 +66,336 @@ def main():
 
     print("Exported web_model.json and vocab.json to", OUT_DIR)
 
+def pack_binary(tfidf, model, le, quant='int8', prune=1e-4):
+    """Returns the binary model as bytes plus a small summary dict."""
+    if not hasattr(tfidf, 'vocabulary_'):
+        raise ValueError("Binary export needs a vocabulary-based TfidfVectorizer.")
+    if tfidf.norm not in ('l2', 'l1', None):
+        raise ValueError(f"Binary export supports norm='l2', 'l1' or None, not {tfidf.norm!r}.")
+    if tfidf.token_pattern != DEFAULT_TOKEN_PATTERN:
+        raise ValueError(f"Binary export needs the default token_pattern {DEFAULT_TOKEN_PATTERN!r} "
+                         f"(the browser tokenizer mirrors it), not {tfidf.token_pattern!r}.")
+    terms = sorted(tfidf.vocabulary_)
+    cols = np.array([tfidf.vocabulary_[t] for t in terms])
+    idf = np.asarray(tfidf.idf_, dtype=np.float64)[cols] if tfidf.use_idf else np.ones(len(terms))
+
+    # fold idf into the weights, feature-major: (n_features, n_rows)
+    weights = (np.asarray(model.coef_, dtype=np.float64)[:, cols] * idf).T
+    n_features, n_rows = weights.shape
+    keep = np.abs(weights) >= prune
+    if quant == 'int8':
+        scales = np.abs(weights).max(axis=0) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.clip(np.rint(weights / scales), -127, 127).astype(np.int8)
+        keep &= q != 0
+    elif quant == 'float16':
+        scales = np.ones(n_rows)
+        q = weights.astype(np.float16)
+    else:
+        raise ValueError(f"Unknown quantization: {quant}")
+
+    feat_idx, cls_idx = np.nonzero(keep)              # row-major => grouped by feature
+    feature_ptr = np.zeros(n_features + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(feat_idx, minlength=n_features), out=feature_ptr[1:])
+    entry_class = cls_idx.astype(np.uint8)
+    entry_weight = q[feat_idx, cls_idx]
+
+    encoded = [t.encode('utf-8') for t in terms]
+    term_offsets = np.zeros(n_features + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=term_offsets[1:])
+    term_bytes = b''.join(encoded)
+
+    sections = [
+        ('idf', idf.astype('<f2').tobytes(), 'float16'),
+        ('feature_ptr', feature_ptr.astype('<u4').tobytes(), 'uint32'),
+        ('entry_class', entry_class.tobytes(), 'uint8'),
+        ('entry_weight', entry_weight.astype('<f2' if quant == 'float16' else 'i1').tobytes(), quant),
+        ('term_offsets', term_offsets.astype('<u4').tobytes(), 'uint32'),
+        ('term_bytes', term_bytes, 'utf8'),
+    ]
+    header = {
+        'classes': [str(c) for c in np.asarray(le.classes_)[np.asarray(model.classes_, dtype=int)]],
+        'n_features': n_features,
+        'n_rows': n_rows,
+        'nnz': int(len(entry_class)),
+        'quant': quant,
+        'scales': [float(s) for s in scales],
+        'intercept': [float(v) for v in np.asarray(model.intercept_).ravel()],
+        'proba': _proba_mode(model, len(le.classes_)),
+        'tokenizer': {
+            'lowercase': bool(tfidf.lowercase),
+            'token_pattern': tfidf.token_pattern,
+            'ngram_range': list(tfidf.ngram_range),
+            'stop_words': sorted(tfidf.get_stop_words() or []),
+            'sublinear_tf': bool(tfidf.sublinear_tf),
+            'binary': bool(tfidf.binary),
+            'norm': tfidf.norm,
+        },
+    }
+
+    # offsets depend on the header length, which contains the offsets: lay out
+    # again until the header length stops changing (it only grows, so this settles)
+    header['sections'] = {}
+    hjson = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    for _ in range(16):
+        pos = 12 + len(hjson)
+        offsets = {}
+        for name, blob, dtype in sections:
+            pos += (-pos) % 4
+            offsets[name] = [pos, len(blob), dtype]
+            pos += len(blob)
+        header['sections'] = offsets
+        laid_out_for = len(hjson)
+        hjson = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if len(hjson) == laid_out_for:
+            break
+    else:
+        raise RuntimeError("Binary model header layout did not settle")
+
+    out = bytearray(MAGIC + struct.pack('<HHI', FORMAT_VERSION, 0, len(hjson)) + hjson)
+    for name, blob, _ in sections:
+        if len(out) > offsets[name][0]:
+            raise RuntimeError(f"Section {name} overlaps the previous one ({len(out)} > {offsets[name][0]})")
+        out += b'\0' * (offsets[name][0] - len(out))
+        assert len(out) == offsets[name][0]
+        out += blob
+    summary = {'n_features': n_features, 'nnz': header['nnz'], 'dense': n_features * n_rows, 'quant': quant}
+    return bytes(out), summary
+
+# -----------------------------
+# Reference decoder (mirrors the JS loader in app.js)
+# -----------------------------
+def load_binary(data):
+    if data[:4] != MAGIC:
+        raise ValueError("Not a Mentallify binary model")
+    version, _, hlen = struct.unpack_from('<HHI', data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary model version {version}")
+    header = json.loads(data[12:12 + hlen].decode('utf-8'))
+    np_types = {'float16': '<f2', 'uint32': '<u4', 'uint8': 'u1', 'int8': 'i1'}
+    arrays = {}
+    for name, (off, length, dtype) in header['sections'].items():
+        raw = data[off:off + length]
+        arrays[name] = raw if dtype == 'utf8' else np.frombuffer(raw, dtype=np_types[dtype])
+    offs = arrays['term_offsets']
+    blob = arrays['term_bytes']
+    terms = [blob[offs[i]:offs[i + 1]].decode('utf-8') for i in range(header['n_features'])]
+    return header, arrays, {t: i for i, t in enumerate(terms)}
+
+def predict_binary(decoded, texts):
+    header, arrays, vocab = decoded
+    tok = header['tokenizer']
+    token_re = re.compile(tok['token_pattern'])
+    stop = set(tok['stop_words'])
+    min_n, max_n = tok['ngram_range']
+    idf = arrays['idf'].astype(np.float64)
+    ptr, ecls = arrays['feature_ptr'], arrays['entry_class']
+    ew = arrays['entry_weight'].astype(np.float64) * np.asarray(header['scales'])[ecls]
+    intercept = np.asarray(header['intercept'])
+    out = np.tile(intercept, (len(texts), 1))
+    for r, text in enumerate(texts):
+        toks = [t for t in token_re.findall(text.lower() if tok['lowercase'] else text) if t not in stop]
+        grams = list(toks) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(toks)) + 1):
+            grams += [" ".join(toks[i:i + n]) for i in range(len(toks) - n + 1)]
+        counts = {}
+        for g in grams:
+            j = vocab.get(g)
+            if j is not None:
+                counts[j] = counts.get(j, 0) + 1
+        if not counts:
+            continue
+        norm_sq = norm_l1 = 0.0
+        acc = np.zeros(len(intercept))
+        for j, c in counts.items():
+            tf = 1.0 if tok['binary'] else (1.0 + np.log(c) if tok['sublinear_tf'] else float(c))
+            norm_sq += (tf * idf[j]) ** 2
+            norm_l1 += abs(tf * idf[j])
+            s, e = ptr[j], ptr[j + 1]
+            np.add.at(acc, ecls[s:e], tf * ew[s:e])
+        norm = {'l2': np.sqrt(norm_sq), 'l1': norm_l1}.get(tok['norm'], 1.0)
+        out[r] += acc / (norm or 1.0)
+    if header['proba'] == 'softmax':
+        e = np.exp(out - out.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+    p = 1.0 / (1.0 + np.exp(-out))
+    if header['proba'] == 'binary':
+        return np.column_stack([1.0 - p[:, 0], p[:, 0]])
+    return p / p.sum(axis=1, keepdims=True)
+
+def holdout_texts(le, n):
+    """Up to `n` texts from train_model.py's test split of the CSV, or None if it can't be rebuilt."""
+    import train_model
+    df = train_model.load_csv(CSV_PATH)
+    try:
+        y_enc = le.transform(df['disease'].astype(str).values)
+    except ValueError:
+        print("[export] CSV labels don't match the label encoder; can't rebuild the test split")
+        return None
+    _, test_idx = train_model.split_indices(y_enc)
+    return df['symptoms'].astype(str).values[np.sort(test_idx)[:n]]
+
+def accuracy_check(decoded, tfidf, model, le, n=2000):
+    """
+    Compares the exported binary model with the sklearn model on the test rows
+    train_model.py held out, falling back to reports/sample_predictions.csv
+    (training rows) when the CSV is unavailable.
+    """
+    texts = holdout_texts(le, n) if os.path.exists(CSV_PATH) else None
+    source = 'test_split'
+    if texts is None and os.path.exists(SAMPLE_PATH):
+        texts = pd.read_csv(SAMPLE_PATH)['text'].dropna().astype(str).values[:n]
+        source = 'sample_predictions'
+    if texts is None:
+        print("[export] no CSV or sample_predictions.csv found, skipping accuracy check")
+        return None
+    ref = model.predict_proba(tfidf.transform(texts))
+    got = predict_binary(decoded, list(texts))
+    result = {
+        'source': source,
+        'samples': int(len(texts)),
+        'top1_agreement': float((ref.argmax(axis=1) == got.argmax(axis=1)).mean()),
+        'max_abs_prob_diff': float(np.abs(ref - got).max()),
+    }
+    print("[export] accuracy check vs sklearn:", result)
+    return result
+
+def export_binary(tfidf, model, le, quant='int8', prune=1e-4, check=True,
+                  min_agreement=MIN_TOP1_AGREEMENT, max_prob_diff=MAX_PROB_DIFF):
+    """Writes the binary model and manifest; raises ValueError (writing nothing) if the accuracy check fails."""
+    data, summary = pack_binary(tfidf, model, le, quant=quant, prune=prune)
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'web_model.{digest[:12]}.bin'
+    check_result = accuracy_check(load_binary(data), tfidf, model, le) if check else None
+    if check_result is not None:
+        agreement, diff = check_result['top1_agreement'], check_result['max_abs_prob_diff']
+        if agreement < min_agreement or diff > max_prob_diff:
+            raise ValueError(f"Binary model disagrees with sklearn (top-1 agreement {agreement:.4f}, min "
+                             f"{min_agreement}; max prob diff {diff:.4f}, max {max_prob_diff}); not exporting. "
+                             f"Try --quant float16 or a smaller --prune.")
+
+    for old in glob.glob(os.path.join(OUT_DIR, 'web_model.*.bin*')):
+        if not os.path.basename(old).startswith(name):
+            os.remove(old)
+    path = os.path.join(OUT_DIR, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    variants = {'identity': len(data)}
+    with open(path + '.gz', 'wb') as f:
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        f.write(gz)
+        variants['gzip'] = len(gz)
+    try:
+        import brotli
+        br = brotli.compress(data, quality=11)
+        with open(path + '.br', 'wb') as f:
+            f.write(br)
+        variants['br'] = len(br)
+    except ImportError:
+        print("[export] brotli not installed, skipping .br variant")
+
+    manifest = {
+        'format': 'mntl-binary',
+        'format_version': FORMAT_VERSION,
+        'file': name,
+        'sha256': digest,
+        'bytes': variants,
+        'quant': quant,
+        'prune': prune,
+        'nnz': summary['nnz'],
+        'dense_weights': summary['dense'],
+        'accuracy_check': check_result,
+    }
+    with open(os.path.join(OUT_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Exported {name} ({variants}) and {MANIFEST_NAME} to", OUT_DIR)
+    return manifest
+
+# -----------------------------
+# Format check (needs sklearn)
+# -----------------------------
+FORMAT_CHECK_SIZES = (1, 5, 300, 1000, 4097, 6222, 16582, 16596, 40000)
+
+def check_format(sizes=FORMAT_CHECK_SIZES, verbose=False):
+    """
+    Packs toy models with each vocabulary size, decodes them with load_binary()
+    and checks that every section comes back byte-for-byte where the header
+    says it is. Returns the number of failing sizes.
+    """
+    import warnings
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import LabelEncoder
+
+    rng = np.random.default_rng(0)
+    failures = 0
+    for n in sizes:
+        vocab = [f"t{i:x}" for i in range(n)]
+        docs = [" ".join(rng.choice(vocab, size=8)) for _ in range(60)]
+        le = LabelEncoder()
+        y = le.fit_transform([f"class{i % 3}" for i in range(len(docs))])
+        tfidf = TfidfVectorizer(vocabulary=vocab)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = LogisticRegression(max_iter=200).fit(tfidf.fit_transform(docs), y)
+        problems = []
+        for quant in ('int8', 'float16'):
+            data, summary = pack_binary(tfidf, model, le, quant=quant, prune=0.0)
+            try:
+                header, arrays, terms = load_binary(data)
+            except Exception as e:
+                problems.append(f"{quant}: load failed ({e})")
+                continue
+            hlen = struct.unpack_from('<I', data, 8)[0]
+            first = min(off for off, _, _ in header['sections'].values())
+            if first < 12 + hlen:
+                problems.append(f"{quant}: first section at {first} inside the {12 + hlen}-byte header")
+            if sorted(terms, key=terms.get) != sorted(vocab):
+                problems.append(f"{quant}: term table differs")
+            if arrays['feature_ptr'][0] != 0 or int(arrays['feature_ptr'][-1]) != summary['nnz']:
+                problems.append(f"{quant}: feature_ptr does not span the {summary['nnz']} entries")
+            if arrays['entry_class'].size and int(arrays['entry_class'].max()) >= header['n_rows']:
+                problems.append(f"{quant}: entry_class out of range")
+            idf = np.asarray(tfidf.idf_)[[tfidf.vocabulary_[t] for t in sorted(vocab)]].astype('<f2')
+            if not np.array_equal(arrays['idf'], idf):
+                problems.append(f"{quant}: idf section differs")
+        failures += bool(problems)
+        if verbose or problems:
+            print(f"{'FAIL' if problems else 'ok  '}  n_features={n}" + "".join(f"\n      {p}" for p in problems))
+    print(f"[export] {len(sizes) - failures}/{len(sizes)} vocabulary sizes round-trip through load_binary")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the trained model for in-browser use")
+    parser.add_argument('--format', choices=['json', 'binary', 'both'], default='both')
+    parser.add_argument('--quant', choices=['int8', 'float16'], default='int8')
+    parser.add_argument('--prune', type=float, default=1e-4, help="drop idf-folded weights with |w| below this")
+    parser.add_argument('--no-check', action='store_true', help="skip the accuracy check against sklearn")
+    parser.add_argument('--min-agreement', type=float, default=MIN_TOP1_AGREEMENT,
+                        help="refuse the binary export below this top-1 agreement with sklearn")
+    parser.add_argument('--max-prob-diff', type=float, default=MAX_PROB_DIFF,
+                        help="refuse the binary export above this max probability difference")
+    parser.add_argument('--check-format', action='store_true',
+                        help="round-trip toy models of several vocabulary sizes through load_binary and exit")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    if args.check_format:
+        return 1 if check_format(verbose=args.verbose) else 0
+
+    tfidf = joblib.load(TFIDF_PATH)
+    model = joblib.load(MODEL_PATH)
+    le = joblib.load(LE_PATH)
+
+    if args.format in ('json', 'both'):
+        export_json(tfidf, model, le)
+    if args.format in ('binary', 'both'):
+        try:
+            export_binary(tfidf, model, le, quant=args.quant, prune=args.prune, check=not args.no_check,
+                          min_agreement=args.min_agreement, max_prob_diff=args.max_prob_diff)
+        except ValueError as e:
+            print("[export]", e)
+            return 1
+    return 0
+
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,169 @@
+# backend/fake_oauth_server.py
+"""
+Local stand-in for Google's OAuth endpoints, for testing the login flow offline.
+
+Signs id_tokens with a throwaway RSA key (needs `cryptography`) and serves:
+    GET  /auth       redirects to redirect_uri?code=...&state=...
+    POST /token      access_token + id_token for any code
+    GET  /userinfo   the same profile (Bearer access_token required)
+    GET  /certs      JWKS, with Cache-Control: public, max-age=--max-age
+    GET  /stats      request counts per endpoint
+--latency-ms adds a delay to every response to mimic real round trips.
+
+Usage (from backend/):
+    python fake_oauth_server.py --port 9010 --client-id test-client
+then start the app with the environment lines it prints.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class FakeOAuth:
+    def __init__(self, issuer, client_id, profile, max_age=300, latency_ms=0.0):
+        self.issuer = issuer
+        self.client_id = client_id
+        self.profile = profile
+        self.max_age = max_age
+        self.latency = latency_ms / 1000.0
+        self.kid = uuid.uuid4().hex[:16]
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.access_tokens = set()
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def jwks(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.key.public_key()))
+        jwk.update(kid=self.kid, use='sig', alg='RS256')
+        return {'keys': [jwk]}
+
+    def token_response(self):
+        now = int(time.time())
+        access_token = 'fake-access-' + uuid.uuid4().hex
+        with self.lock:
+            self.access_tokens.add(access_token)
+        claims = {'iss': self.issuer, 'aud': self.client_id, 'sub': '1000000001', 'iat': now,
+                  'exp': now + 3600, 'email_verified': True, **self.profile}
+        id_token = jwt.encode(claims, self.key, algorithm='RS256', headers={'kid': self.kid})
+        return {'access_token': access_token, 'id_token': id_token, 'token_type': 'Bearer',
+                'expires_in': 3600, 'scope': 'openid email profile'}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True     # headers and body go out in separate writes
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, body=None, headers=None):
+            data = json.dumps(body).encode() if body is not None else b''
+            self.send_response(status)
+            if body is not None:
+                self.send_header('Content-Type', 'application/json')
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _count(self, path):
+            if fake.latency:
+                time.sleep(fake.latency)
+            with fake.lock:
+                fake.counts[path] = fake.counts.get(path, 0) + 1
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            self._count(url.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == '/auth':
+                target = query.get('redirect_uri', '')
+                params = {'code': 'fake-code-' + uuid.uuid4().hex[:8], 'state': query.get('state', '')}
+                return self._send(302, headers={'Location': f"{target}?{urlencode(params)}"})
+            if url.path == '/certs':
+                return self._send(200, fake.jwks(), {'Cache-Control': f'public, max-age={fake.max_age}'})
+            if url.path == '/userinfo':
+                token = (self.headers.get('Authorization') or '').removeprefix('Bearer ')
+                if token not in fake.access_tokens:
+                    return self._send(401, {'error': 'invalid_token'})
+                return self._send(200, fake.profile)
+            if url.path == '/stats':
+                return self._send(200, fake.counts)
+            return self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            self._count(url.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+            if url.path != '/token':
+                return self._send(404, {'error': 'not found'})
+            if form.get('grant_type') != 'authorization_code' or form.get('client_id') != fake.client_id:
+                return self._send(400, {'error': 'invalid_grant'})
+            return self._send(200, fake.token_response())
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024      # the default of 5 resets connections under concurrent load tests
+
+
+def serve(host='127.0.0.1', port=9010, client_id='test-client', profile=None, max_age=300, latency_ms=0.0):
+    """Starts the fake server in a daemon thread; returns (server, FakeOAuth)."""
+    base = f"http://{host}:{port}"
+    profile = profile or {'email': 'test.user@example.com', 'name': 'Test User',
+                          'picture': 'https://example.com/avatar.png'}
+    fake = FakeOAuth(base, client_id, profile, max_age, latency_ms)
+    server = _Server((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-oauth", daemon=True).start()
+    return server, fake
+
+
+def env_for(host, port, client_id):
+    base = f"http://{host}:{port}"
+    return {
+        'ID': client_id,
+        'GOOGLE_AUTH_URL': base + '/auth',
+        'GOOGLE_TOKEN_URL': base + '/token',
+        'GOOGLE_USERINFO_URL': base + '/userinfo',
+        'GOOGLE_JWKS_URL': base + '/certs',
+        'GOOGLE_ISSUERS': base,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Google OAuth server for local testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9010)
+    parser.add_argument('--client-id', default='test-client')
+    parser.add_argument('--email', default='test.user@example.com')
+    parser.add_argument('--name', default='Test User')
+    parser.add_argument('--max-age', type=int, default=300, help="JWKS Cache-Control max-age")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="delay added to every response")
+    args = parser.parse_args(argv)
+
+    profile = {'email': args.email, 'name': args.name, 'picture': 'https://example.com/avatar.png'}
+    server, _ = serve(args.host, args.port, args.client_id, profile, args.max_age, args.latency_ms)
+    print(f"Fake OAuth server on http://{args.host}:{args.port}. Start the app with:")
+    for k, v in env_for(args.host, args.port, args.client_id).items():
+        print(f"  {k}={v}")
+    print("  (plus any non-empty Pasww and Nothing)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
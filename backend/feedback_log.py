@@ -0,0 +1,132 @@
+# backend/feedback_log.py
+"""
+Append-only, rotating log of /chat predictions for reviewer feedback.
+
+One JSON line per prediction:
+    {"id": "...", "ts": 1718000000.1, "version": "v2024...", "message": "...",
+     "label": "Anxiety", "probs": {"Anxiety": 0.81, ...}}
+
+Every record is a single os.write() on an O_APPEND descriptor, so pre-fork
+workers (serve.py) can share the file without interleaving lines. When the
+file passes `max_bytes` the writer that notices renames it to
+<name>.<YYYYmmdd-HHMMSSffffff>-<pid>.jsonl and starts a fresh one; other
+processes see the inode change within `check_interval` seconds and reopen.
+Only the newest `backups` rotated files are kept.
+
+Reviewers export the log to CSV, fill in a `label` column, and feed it to
+update_model.py.
+"""
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class FeedbackLog:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=20, check_interval=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.check_interval = check_interval
+        self._fd = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.written = self.rotations = self.errors = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def _open(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._checked_at = time.monotonic()
+
+    def _reopen_if_rotated(self):
+        # another process may have renamed the file out from under us
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                return
+        except FileNotFoundError:
+            pass
+        self._open()
+
+    def _rotate(self):
+        try:
+            if os.stat(self.path).st_ino != os.fstat(self._fd).st_ino:
+                return self._open()        # someone else already rotated
+        except FileNotFoundError:
+            return self._open()
+        stem, ext = os.path.splitext(self.path)
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"{int(now % 1 * 1e6):06d}"
+        os.replace(self.path, f"{stem}.{stamp}-{os.getpid()}{ext or '.jsonl'}")
+        self._open()
+        self.rotations += 1
+        for old in self.rotated_files()[:-self.backups or None]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def append(self, message, label, probs, classes=None, version=None):
+        """Writes one record; returns its id. Never raises (logging must not break /chat)."""
+        record_id = uuid.uuid4().hex
+        if classes is not None and len(classes) == len(probs):
+            probs = {str(c): round(float(p), 6) for c, p in zip(classes, probs)}
+        else:
+            probs = [round(float(p), 6) for p in probs]
+        line = json.dumps({'id': record_id, 'ts': round(time.time(), 3), 'version': version,
+                           'message': message, 'label': label, 'probs': probs},
+                          ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._fd is None:
+                    self._open()
+                else:
+                    self._reopen_if_rotated()
+                os.write(self._fd, line.encode('utf-8'))
+                self.written += 1
+                if self.max_bytes and os.fstat(self._fd).st_size >= self.max_bytes:
+                    self._rotate()
+        except OSError as e:
+            self.errors += 1
+            print("[feedback] write failed:", e)
+        return record_id
+
+    def rotated_files(self):
+        stem, ext = os.path.splitext(self.path)
+        return sorted(glob.glob(f"{glob.escape(stem)}.*-*{ext or '.jsonl'}"))
+
+    def files(self):
+        """Rotated files oldest first, then the live file."""
+        return self.rotated_files() + ([self.path] if os.path.exists(self.path) else [])
+
+    def records(self):
+        """Yields every logged record, oldest file first; skips a torn final line."""
+        for path in self.files():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'written': self.written,
+            'rotations': self.rotations,
+            'errors': self.errors,
+            'files': len(self.files()),
+        }
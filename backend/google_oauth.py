@@ -0,0 +1,204 @@
+# backend/google_oauth.py
+"""
+Google OAuth helpers for /auth/google/callback.
+
+The token response for the "openid" scope already carries an id_token (a JWT
+signed by Google), so the profile is taken from it after verifying the
+signature locally against Google's JWKS keys, plus audience, issuer and
+expiry. The userinfo endpoint is only called as a fallback (no id_token, a
+token that fails verification, or PyJWT without the `cryptography` package).
+
+All outbound calls share one pooled keep-alive requests.Session per process.
+JWKSCache keeps the signing keys for as long as the response's Cache-Control
+max-age allows, refreshes them in a background thread once 80% of that has
+passed, and re-fetches early (rate-limited) when a token names an unknown kid.
+
+Endpoint URLs are configurable so local testing can use fake_oauth_server.py.
+"""
+import os
+import re
+import threading
+import time
+
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+
+def max_age(headers, default):
+    """Freshness lifetime in seconds from Cache-Control max-age minus Age, else `default`."""
+    m = re.search(r'max-age=(\d+)', headers.get('Cache-Control') or '')
+    if not m:
+        return default
+    try:
+        age = int(headers.get('Age') or 0)
+    except ValueError:
+        age = 0
+    return max(0, int(m.group(1)) - age)
+
+
+class JWKSCache:
+    def __init__(self, url, session_fn, default_ttl=3600.0, min_ttl=60.0, max_ttl=86400.0,
+                 refresh_fraction=0.8, unknown_kid_interval=30.0, timeout=5.0):
+        self.url = url
+        self.session_fn = session_fn
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.refresh_fraction = refresh_fraction     # background refresh after this share of the TTL
+        self.unknown_kid_interval = unknown_kid_interval
+        self.timeout = timeout
+        self._keys = {}               # kid -> PyJWK
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+        self.fetches = self.fetch_errors = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # keep the keys; the refresher thread and lock state don't survive fork()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+
+    def refresh(self, force=True):
+        """Fetches the key set (unless force=False and the cached one is fresh); returns {kid: PyJWK}."""
+        with self._lock:
+            if not force and self._keys and time.monotonic() < self._expires_at:
+                return self._keys      # another thread refreshed while we waited for the lock
+            self._last_fetch = time.monotonic()
+            try:
+                resp = self.session_fn().get(self.url, timeout=self.timeout)
+                resp.raise_for_status()
+                keyset = jwt.PyJWKSet.from_dict(resp.json())
+            except Exception:
+                self.fetch_errors += 1
+                raise
+            ttl = min(self.max_ttl, max(self.min_ttl, max_age(resp.headers, self.default_ttl)))
+            self._keys = {k.key_id: k for k in keyset.keys if k.key_id}
+            self._expires_at = time.monotonic() + ttl
+            self._refresh_at = time.monotonic() + ttl * self.refresh_fraction
+            self.fetches += 1
+            return self._keys
+
+    def get_key(self, kid):
+        self.start()
+        keys = self._keys
+        if not keys or time.monotonic() >= self._expires_at:
+            keys = self.refresh(force=False)
+        key = keys.get(kid)
+        if key is None and time.monotonic() - self._last_fetch >= self.unknown_kid_interval:
+            key = self.refresh().get(kid)      # Google may have rotated keys before our copy expired
+        if key is None:
+            raise jwt.InvalidTokenError(f"No JWKS key with kid {kid!r}")
+        return key
+
+    def start(self):
+        """Starts the background refresher (once per process)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        retry = 0.0
+        while True:
+            wait = retry or max(0.0, self._refresh_at - time.monotonic())
+            if self._wake.wait(wait):
+                return
+            if not retry and time.monotonic() < self._refresh_at:
+                continue            # a request refreshed the keys while we slept
+            try:
+                self.refresh()
+                retry = 0.0
+            except Exception as e:
+                retry = min(300.0, (retry or 5.0) * 2)
+                print(f"[auth] JWKS refresh failed (retrying in {retry:.0f}s):", e)
+
+    def stats(self):
+        return {
+            'keys': sorted(self._keys),
+            'expires_in_s': max(0.0, self._expires_at - time.monotonic()),
+            'fetches': self.fetches,
+            'fetch_errors': self.fetch_errors,
+        }
+
+
+class GoogleOAuthClient:
+    def __init__(self, client_id, client_secret, token_url=GOOGLE_TOKEN_URL,
+                 userinfo_url=GOOGLE_USERINFO_URL, jwks_url=GOOGLE_JWKS_URL, issuers=GOOGLE_ISSUERS,
+                 timeout=10.0, pool_size=10, leeway=60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.userinfo_url = userinfo_url
+        self.issuers = list(issuers)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.leeway = leeway
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.jwks = JWKSCache(jwks_url, self.session)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # pooled sockets must not be shared between processes
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def can_verify_locally(self):
+        return jwt.algorithms.has_crypto
+
+    def token_form(self, code, redirect_uri):
+        return {
+            "code": code,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": redirect_uri,
+            "grant_type": "authorization_code",
+        }
+
+    def exchange_code(self, code, redirect_uri):
+        resp = self.session().post(self.token_url, data=self.token_form(code, redirect_uri), timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def verify_id_token(self, id_token):
+        """Verified claims of a Google id_token; raises jwt.InvalidTokenError (or a fetch error)."""
+        header = jwt.get_unverified_header(id_token)
+        key = self.jwks.get_key(header.get('kid'))
+        return jwt.decode(id_token, key.key, algorithms=['RS256'], audience=self.client_id,
+                          issuer=self.issuers, leeway=self.leeway,
+                          options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']})
+
+    def fetch_userinfo(self, access_token):
+        resp = self.session().get(self.userinfo_url, headers={"Authorization": f"Bearer {access_token}"},
+                                  timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
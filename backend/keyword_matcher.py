@@ -0,0 +1,79 @@
+# backend/keyword_matcher.py
+"""
+Single-pass multi-pattern keyword matcher (Aho-Corasick) for keyword_fallback().
+
+The keyword table lives in data/keywords.json:
+    {"categories": [{"name": ..., "keywords": [...], "suggestion": "..."}, ...]}
+Matching is case-insensitive substring matching, like the `k in text` checks
+it replaces, but every keyword of every category is found in one scan of the
+text, so cost grows with text length rather than vocabulary size.
+"""
+import json
+from collections import deque
+
+
+class KeywordMatcher:
+    def __init__(self, categories):
+        self.categories = [c['name'] for c in categories]
+        self.suggestions = {c['name']: c['suggestion'] for c in categories if c.get('suggestion')}
+        self._goto = [{}]       # state -> {char: next_state}
+        self._fail = [0]
+        self._out = [[]]        # state -> [(category_index, keyword)]
+        for ci, c in enumerate(categories):
+            for kw in c.get('keywords', []):
+                kw = kw.lower()
+                if kw:
+                    self._add(kw, ci)
+        self._build()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f).get('categories', []))
+
+    def _add(self, keyword, category):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((category, keyword))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text):
+        """
+        Returns {category: {"hits": n, "matches": [(start, keyword), ...]}}
+        for every category with at least one match, in table order.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = {}
+        state = 0
+        for i, ch in enumerate((text or "").lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for ci, kw in out[state]:
+                found.setdefault(ci, []).append((i - len(kw) + 1, kw))
+        return {
+            self.categories[ci]: {"hits": len(found[ci]), "matches": found[ci]}
+            for ci in sorted(found)
+        }
+
+    def matched_categories(self, text):
+        return list(self.scan(text))
@@ -0,0 +1,244 @@
+# backend/mail_outbox.py
+"""
+Durable outbox for contact-form mail.
+
+enqueue() stores the serialized message in a small SQLite table and returns
+immediately. A background sender thread keeps one authenticated SMTP
+connection open (reconnecting when it drops or sits idle too long), drains due
+messages in batches and retries failures with exponential backoff. Rows are
+claimed with a lease, and each row's lease is renewed right before it is sent
+(only if it is still ours), so several worker processes can share one outbox
+file without sending a message twice. `lease_seconds` must outlast one
+message's connect + send time, not the whole batch.
+"""
+import email
+import email.policy
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+from metrics import REGISTRY as metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    next_attempt REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+# SMTP errors that will not succeed on retry
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)
+
+
+class MailOutbox:
+    def __init__(self, db_path, connect_fn, batch_size=20, max_attempts=8, base_backoff=2.0,
+                 max_backoff=600.0, idle_timeout=60.0, lease_seconds=120.0, poll_interval=5.0):
+        self.db_path = db_path
+        self.connect_fn = connect_fn          # () -> logged-in smtplib.SMTP
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.sent = self.failed_attempts = self.dead = self.connections = 0
+        self.last_send_ms = self.total_send_ms = 0.0
+        with self._db() as db:
+            db.executescript(SCHEMA)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def enqueue(self, msg):
+        """Persists an EmailMessage for delivery and wakes the sender; returns its row id."""
+        now = time.time()
+        with self._db() as db:
+            cur = db.execute("INSERT INTO outbox (created, next_attempt, payload) VALUES (?, ?, ?)",
+                             (now, now, msg.as_bytes()))
+            row_id = cur.lastrowid
+        self.start()
+        self._wake.set()
+        return row_id
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._close_smtp()
+
+    def stats(self):
+        with self._db() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = db.execute("SELECT MIN(created) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        with self._stats_lock:
+            return {
+                "queue_depth": counts.get('pending', 0),
+                "dead_letters": counts.get('dead', 0),
+                "oldest_pending_age_s": (time.time() - oldest) if oldest else 0.0,
+                "sent": self.sent,
+                "failed_attempts": self.failed_attempts,
+                "connections_opened": self.connections,
+                "last_send_ms": self.last_send_ms,
+                "avg_send_ms": (self.total_send_ms / self.sent) if self.sent else 0.0,
+            }
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _after_fork(self):
+        # SQLite/SMTP connections and the sender thread must not cross fork()
+        self._local = threading.local()
+        self._thread = None
+        self._smtp = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def _db(self):
+        # one long-lived connection per thread: closing the last connection to a
+        # WAL database forces a checkpoint + fsync, which dominated enqueue latency
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return nullcontext(db)
+
+    def _claim(self):
+        """Leases up to batch_size due rows; returns [(id, attempts, payload, lease_until)]."""
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, attempts, payload FROM outbox WHERE status = 'pending' AND next_attempt <= ? "
+                    "ORDER BY next_attempt LIMIT ?", (now, self.batch_size)).fetchall()
+                if rows:
+                    db.executemany("UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                                   [(lease_until, r[0]) for r in rows])
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        return [row + (lease_until,) for row in rows]
+
+    def _renew(self, row_id, lease_until):
+        """Extends our lease on a row before sending it; False if the lease lapsed and another sender took it."""
+        with self._db() as db:
+            cur = db.execute("UPDATE outbox SET next_attempt = ? WHERE id = ? AND status = 'pending' "
+                             "AND next_attempt = ?", (time.time() + self.lease_seconds, row_id, lease_until))
+        return cur.rowcount == 1
+
+    def _next_due_in(self):
+        with self._db() as db:
+            due = db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        if due is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.0, due - time.time()))
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.idle_timeout / 2:
+            # probe a connection that has been quiet for a while before reusing it
+            try:
+                self._smtp.noop()
+            except Exception:
+                self._close_smtp()
+        if self._smtp is None:
+            self._smtp = self.connect_fn()
+            with self._stats_lock:
+                self.connections += 1
+        return self._smtp
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send_batch(self, rows):
+        for row_id, attempts, payload, lease_until in rows:
+            if not self._renew(row_id, lease_until):
+                continue
+            msg = email.message_from_bytes(payload, policy=email.policy.default)
+            started = time.perf_counter()
+            try:
+                self._connection().send_message(msg)
+            except Exception as e:
+                permanent = isinstance(e, PERMANENT_ERRORS)
+                if not permanent:
+                    # the connection may be in an unknown state; rebuild it on the next message
+                    self._close_smtp()
+                self._mark_failed(row_id, attempts + 1, e, permanent)
+                continue
+            elapsed = (time.perf_counter() - started) * 1000.0
+            metrics.observe('mentallify_smtp_seconds', elapsed / 1000.0, op='send')
+            self._smtp_last_used = time.monotonic()
+            with self._db() as db:
+                db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+            with self._stats_lock:
+                self.sent += 1
+                self.last_send_ms = elapsed
+                self.total_send_ms += elapsed
+
+    def _mark_failed(self, row_id, attempts, err, permanent):
+        dead = permanent or attempts >= self.max_attempts
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        with self._db() as db:
+            db.execute("UPDATE outbox SET attempts = ?, status = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                       (attempts, 'dead' if dead else 'pending', time.time() + delay, repr(err)[:500], row_id))
+        with self._stats_lock:
+            self.failed_attempts += 1
+            self.dead += int(dead)
+        print(f"[outbox] send failed for message {row_id} (attempt {attempts}{', giving up' if dead else ''}):", err)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                rows = self._claim()
+                if rows:
+                    self._send_batch(rows)
+                    continue
+                if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.idle_timeout:
+                    self._close_smtp()
+                self._wake.wait(self._next_due_in())
+                self._wake.clear()
+            except Exception as e:
+                print("[outbox] sender loop error:", e)
+                self._close_smtp()
+                self._stop.wait(self.base_backoff)
+
@@ -0,0 +1,304 @@
+# backend/message_store.py
+"""
+Storage for contact-form messages (the /send_contact backup step).
+
+Backends:
+  - SqliteMessageStore (default): WAL-mode SQLite with indexes on timestamp and
+    email. Writes from concurrent requests are group-committed by one writer
+    thread: each caller waits only until the batch containing its row commits.
+  - CsvMessageStore: the original append-only data/messages.csv.
+
+The SQLite file lives in backend/data/, outside the frontend tree app.py
+serves; a database left at the old data/messages.sqlite3 is moved there on
+first open.
+
+CLI (run from backend/):
+    python message_store.py list [--limit N] [--before TS --before-id ID] [--email ADDR]
+    python message_store.py export messages.csv
+    python message_store.py import messages.csv      # e.g. migrate the old CSV backup
+"""
+import argparse
+import csv
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE, '..', 'data')
+CSV_PATH = os.path.join(DATA_DIR, 'messages.csv')
+PRIVATE_DATA_DIR = os.path.join(BASE, 'data')
+DB_PATH = os.path.join(PRIVATE_DATA_DIR, 'messages.sqlite3')
+LEGACY_DB_PATH = os.path.join(DATA_DIR, 'messages.sqlite3')
+
+FIELDS = ['ts', 'name', 'email', 'message']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS messages_email ON messages (email, ts);
+"""
+
+
+def move_sqlite_file(src, dst):
+    """Moves a SQLite database (and its -wal/-shm files) to `dst` unless `dst` already exists."""
+    if not os.path.exists(src) or os.path.exists(dst):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    for suffix in ('-wal', '-shm', ''):        # the main file last: its presence marks the move done
+        if os.path.exists(src + suffix):
+            os.replace(src + suffix, dst + suffix)
+    print(f"[store] moved {src} -> {dst}")
+    return True
+
+
+def _before(rec, before, before_id):
+    if before is None:
+        return True
+    if before_id is None:
+        return rec['ts'] < before
+    return rec['ts'] < before or (rec['ts'] == before and rec['id'] < before_id)
+
+
+class CsvMessageStore:
+    """Legacy backend: one append per message to a CSV file (ts, name, email, message)."""
+
+    def __init__(self, path=CSV_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, ts, name, email, message, timeout=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock, open(self.path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow([int(ts), name, email, message])
+
+    def recent(self, limit=50, before=None, before_id=None, email=None):
+        if not os.path.exists(self.path):
+            return []
+        rows = []
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            for i, row in enumerate(csv.reader(f)):
+                if len(row) < 4 or not row[0].isdigit():
+                    continue
+                rec = {'id': i + 1, 'ts': int(row[0]), 'name': row[1], 'email': row[2], 'message': row[3]}
+                if _before(rec, before, before_id) and (email is None or rec['email'] == email):
+                    rows.append(rec)
+        rows.sort(key=lambda r: (r['ts'], r['id']), reverse=True)
+        return rows[:limit]
+
+    def close(self):
+        pass
+
+
+class SqliteMessageStore:
+    def __init__(self, path=DB_PATH, batch_size=256, commit_interval_ms=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # SQLite connections and the writer thread must not cross fork()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # -----------------------------
+    # Writes (group commit)
+    # -----------------------------
+    def append(self, ts, name, email, message, timeout=10):
+        """Queues the row and waits (up to `timeout` s) for its batch to commit; returns the row id."""
+        fut = self.append_async(ts, name, email, message)
+        return fut.result(timeout=timeout) if timeout else None
+
+    def append_async(self, ts, name, email, message):
+        self._ensure_writer()
+        fut = Future()
+        self._queue.put(((int(ts), name, email, message), fut))
+        return fut
+
+    def insert_many(self, rows):
+        """Bulk insert of (ts, name, email, message) tuples in one transaction (used by import)."""
+        db = self._connect()
+        db.execute("BEGIN")
+        db.executemany("INSERT INTO messages (ts, name, email, message) VALUES (?, ?, ?, ?)", rows)
+        db.execute("COMMIT")
+
+    def _ensure_writer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._writer, name="message-store", daemon=True)
+                self._thread.start()
+
+    def _writer(self):
+        db = self._connect()
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                db.execute("BEGIN")
+                ids = [db.execute("INSERT INTO messages (ts, name, email, message) VALUES (?, ?, ?, ?)",
+                                  row).lastrowid for row, _ in batch]
+                db.execute("COMMIT")
+            except Exception as e:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), row_id in zip(batch, ids):
+                fut.set_result(row_id)
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def recent(self, limit=50, before=None, before_id=None, email=None):
+        """
+        Newest-first page of messages. For the next page pass the last row's
+        ts and id as `before`/`before_id`: ts has one-second resolution, so
+        `before` alone would skip the rest of that second.
+        """
+        sql = "SELECT id, ts, name, email, message FROM messages"
+        where, args = [], []
+        if email is not None:
+            where.append("email = ?")
+            args.append(email)
+        if before is not None and before_id is not None:
+            where.append("(ts < ? OR (ts = ? AND id < ?))")
+            args += [int(before), int(before), int(before_id)]
+        elif before is not None:
+            where.append("ts < ?")
+            args.append(int(before))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        args.append(int(limit))
+        cols = ['id'] + FIELDS
+        return [dict(zip(cols, r)) for r in self._connect().execute(sql, args).fetchall()]
+
+    def iter_all(self):
+        return self._connect().execute("SELECT ts, name, email, message FROM messages ORDER BY ts, id")
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def open_message_store(kind=None, data_dir=DATA_DIR):
+    kind = (kind or os.getenv("MESSAGE_STORE") or "sqlite").lower()
+    if kind == 'csv':
+        return CsvMessageStore(os.path.join(data_dir, 'messages.csv'))
+    if kind == 'sqlite':
+        path = os.getenv("MESSAGES_DB_PATH") or DB_PATH
+        if path == DB_PATH:
+            move_sqlite_file(LEGACY_DB_PATH, DB_PATH)
+        return SqliteMessageStore(path)
+    raise ValueError(f"Unknown MESSAGE_STORE: {kind}")
+
+
+# -----------------------------
+# CSV export / import tool
+# -----------------------------
+def export_csv(store, path):
+    n = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for row in store.iter_all():
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def import_csv(store, path, batch=5000):
+    """Imports rows written by the legacy CSV backup (ts, name, email, message; no header)."""
+    n = 0
+    pending = []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 4 or not row[0].strip().isdigit():
+                continue
+            pending.append((int(row[0]), row[1], row[2], row[3]))
+            if len(pending) >= batch:
+                store.insert_many(pending)
+                n += len(pending)
+                pending = []
+    if pending:
+        store.insert_many(pending)
+        n += len(pending)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contact message store tool")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite message store path")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_list = sub.add_parser('list', help="show recent messages, newest first")
+    p_list.add_argument('--limit', type=int, default=20)
+    p_list.add_argument('--before', type=int, default=None, help="only messages older than BEFORE (ts)")
+    p_list.add_argument('--before-id', type=int, default=None,
+                        help="with --before: also messages at ts BEFORE with id < BEFORE_ID")
+    p_list.add_argument('--email', default=None)
+    p_exp = sub.add_parser('export', help="write all messages to a CSV file")
+    p_exp.add_argument('path')
+    p_imp = sub.add_parser('import', help="load a legacy messages.csv into the store")
+    p_imp.add_argument('path', nargs='?', default=CSV_PATH)
+    args = parser.parse_args(argv)
+
+    if args.db == DB_PATH:
+        move_sqlite_file(LEGACY_DB_PATH, DB_PATH)
+    store = SqliteMessageStore(args.db)
+    if args.cmd == 'list':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['id'] + FIELDS)
+        for rec in store.recent(limit=args.limit, before=args.before, before_id=args.before_id, email=args.email):
+            writer.writerow([rec['id']] + [rec[k] for k in FIELDS])
+    elif args.cmd == 'export':
+        print(f"Exported {export_csv(store, args.path)} messages to {args.path}")
+    elif args.cmd == 'import':
+        print(f"Imported {import_csv(store, args.path)} messages from {args.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+# backend/metrics.py
+"""
+Lightweight in-process metrics with a Prometheus text exposition.
+
+Counters, up/down gauges and histograms are recorded into a per-thread shard
+(a plain dict only its own thread writes), so the hot path takes no lock.
+render() sums the shards when /metrics is scraped. Shards of threads that have
+exited are folded into one retired shard so thread churn doesn't grow memory.
+
+    from metrics import REGISTRY as metrics
+    metrics.inc('mentallify_chat_fallback_total', reason='error')
+    with metrics.timer('mentallify_inference_stage_seconds', stage='transform'):
+        ...
+    metrics.set('mentallify_artifact_load_seconds', 0.42)
+
+Also here: SamplingProfiler, a background thread that samples every thread's
+stack via sys._current_frames() and aggregates collapsed stacks
+("frame;frame;frame count", the flamegraph.pl input format).
+"""
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; tuned for in-process inference (sub-ms) up to slow SMTP/OAuth calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    __slots__ = ('thread', 'counters', 'hists')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}     # (name, labels) -> float
+        self.hists = {}        # (name, labels) -> [count per bucket..., +Inf count, sum]
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_live_shards=256):
+        self.buckets = tuple(buckets)
+        self.max_live_shards = max_live_shards
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+        self._gauges = {}      # (name, labels) -> float; set() values, last write wins
+        self._meta = {}        # name -> (type, help)
+        self._collectors = []
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # only the forking thread survives; fold every other shard into the retired one
+        self._lock = threading.Lock()
+        me = getattr(self._local, 'shard', None)
+        for shard in self._shards:
+            if shard is not me:
+                self._merge(self._retired, shard)
+        self._shards = [me] if me is not None else []
+        if me is not None:
+            me.thread = threading.current_thread()
+
+    # -----------------------------
+    # Recording (hot path)
+    # -----------------------------
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                if len(self._shards) >= self.max_live_shards:
+                    self._retire_dead()
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name, value=1.0, **labels):
+        counters = self._shard().counters
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0.0) + value
+
+    def dec(self, name, value=1.0, **labels):
+        self.inc(name, -value, **labels)
+
+    def observe(self, name, value, **labels):
+        hists = self._shard().hists
+        key = (name, tuple(sorted(labels.items())))
+        h = hists.get(key)
+        if h is None:
+            h = hists[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        h[bisect.bisect_left(self.buckets, value)] += 1
+        h[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def set(self, name, value, **labels):
+        self._gauges[(name, tuple(sorted(labels.items())))] = float(value)
+
+    # -----------------------------
+    # Metadata / collectors
+    # -----------------------------
+    def describe(self, name, kind, help_text):
+        """kind: 'counter' | 'gauge' | 'histogram'. Undescribed metrics are exported as untyped."""
+        self._meta[name] = (kind, help_text)
+
+    def add_collector(self, fn):
+        """fn() -> iterable of (name, kind, help, value, labels dict), evaluated at scrape time."""
+        self._collectors.append(fn)
+
+    # -----------------------------
+    # Aggregation / exposition
+    # -----------------------------
+    def _merge(self, into, shard):
+        for key, v in shard.counters.copy().items():
+            into.counters[key] = into.counters.get(key, 0.0) + v
+        for key, h in shard.hists.copy().items():
+            acc = into.hists.get(key)
+            if acc is None:
+                into.hists[key] = list(h)
+            else:
+                for i, v in enumerate(h):
+                    acc[i] += v
+
+    def _retire_dead(self):
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def snapshot(self):
+        """A merged _Shard of everything recorded so far."""
+        total = _Shard(None)
+        with self._lock:
+            self._retire_dead()
+            self._merge(total, self._retired)
+            for shard in self._shards:
+                self._merge(total, shard)
+        return total
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        total = self.snapshot()
+        families = collections.defaultdict(list)      # name -> sample lines
+        for (name, labels), v in total.counters.items():
+            families[name].append(_sample(name, labels, v))
+        for (name, labels), v in self._gauges.copy().items():
+            families[name].append(_sample(name, labels, v))
+        for (name, labels), h in total.hists.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), h[:-1]):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                families[name].append(_sample(name + '_bucket', labels + (('le', le),), cumulative))
+            families[name].append(_sample(name + '_sum', labels, h[-1]))
+            families[name].append(_sample(name + '_count', labels, cumulative))
+        for fn in self._collectors:
+            try:
+                for name, kind, help_text, v, labels in fn():
+                    if v is None:
+                        continue
+                    self._meta.setdefault(name, (kind, help_text))
+                    families[name].append(_sample(name, tuple(sorted(labels.items())), v))
+            except Exception as e:
+                print("[metrics] collector failed:", e)
+
+        lines = []
+        for name in sorted(families):
+            kind, help_text = self._meta.get(name, ('untyped', ''))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(families[name])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    if labels:
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        return f"{name}{{{inner}}} {float(value)!r}"
+    return f"{name} {float(value)!r}"
+
+
+REGISTRY = Registry()
+
+
+# -----------------------------
+# Sampling profiler
+# -----------------------------
+class SamplingProfiler:
+    """Samples all threads' stacks every `interval_ms` while running; near-zero cost when stopped."""
+
+    def __init__(self, interval_ms=10.0, max_depth=64):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()          # start/stop
+        self._stacks_lock = threading.Lock()   # stacks/samples, shared with the sampler thread
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None):
+        with self._lock:
+            if interval_ms:
+                self.interval = float(interval_ms) / 1000.0
+            if self.running:
+                return
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._thread = None
+
+    def reset(self):
+        with self._stacks_lock:
+            self.stacks = collections.Counter()
+            self.samples = 0
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                sampled.append(";".join(reversed(stack)))
+            with self._stacks_lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+
+    def collapsed(self, limit=200):
+        """Most frequent stacks in collapsed format, one "a;b;c count" line each."""
+        with self._stacks_lock:
+            top = self.stacks.most_common(limit)
+        return "\n".join(f"{stack} {n}" for stack, n in top) + "\n"
+
+    def stats(self):
+        with self._stacks_lock:
+            samples, distinct = self.samples, len(self.stacks)
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1000.0,
+            'samples': samples,
+            'distinct_stacks': distinct,
+            'started_at': self.started_at,
+        }
@@ -0,0 +1,151 @@
+# backend/microbatch.py
+"""
+Opt-in micro-batching for /chat inference.
+
+Concurrent callers submit single messages; a background thread coalesces
+whatever arrives within `max_latency_ms` (or until `max_batch` items are
+waiting) and scores them with one call to `predict_fn(list_of_messages)`.
+Each caller gets back its own element of the returned list.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch=32, max_latency_ms=3.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._reset_stats()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def submit(self, message, timeout=None):
+        """Blocks until the batch containing `message` is scored; returns its result."""
+        return self.submit_async(message).result(timeout=timeout)
+
+    def submit_async(self, message):
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((message, fut, time.perf_counter()))
+        return fut
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "max_batch": self.max_batch,
+                "max_latency_ms": self.max_latency * 1000.0,
+                "batches": batches,
+                "items": self._items,
+                "errors": self._errors,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": (self._items / batches) if batches else 0.0,
+                "avg_queue_wait_ms": (self._wait_total / self._items * 1000.0) if self._items else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+                # power-of-two buckets: "1", "2", "4", ... -> number of batches of size <= bucket
+                "batch_size_histogram": dict(self._size_hist),
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _reset_stats(self):
+        self._batches = self._items = self._errors = 0
+        self._wait_total = self._wait_max = 0.0
+        self._size_hist = {}
+
+    def _after_fork(self):
+        # a forked child has no batching thread; start with a fresh queue and locks
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # started lazily so the thread is created in the process that serves
+        # requests (not in a pre-fork master)
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="microbatch", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            messages = [m for m, _, _ in batch]
+            try:
+                results = self.predict_fn(messages)
+                if results is None:
+                    results = [None] * len(batch)
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+                failed = False
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                failed = True
+            self._record(batch, started, failed)
+
+    def _record(self, batch, started, failed):
+        size = len(batch)
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._errors += int(failed)
+            for _, _, enqueued in batch:
+                wait = started - enqueued
+                self._wait_total += wait
+                if wait > self._wait_max:
+                    self._wait_max = wait
+            key = str(bucket)
+            self._size_hist[key] = self._size_hist.get(key, 0) + 1
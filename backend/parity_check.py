@@ -0,0 +1,199 @@
+# backend/parity_check.py
+"""
+Replays the same requests against the Flask app (app.py) and the ASGI
+variant (asgi_app.py) in-process and compares the responses: status,
+content type, the headers clients rely on (ETag, Cache-Control,
+Content-Encoding, Vary, Retry-After, X-Degraded, CORS) and the body (parsed
+JSON, or decoded bytes). Values that differ per call by design (random quiz
+sample, session token) are normalized first, and so is the `Origin` token that
+Starlette's CORS middleware always adds to Vary.
+
+When `cryptography` is installed the Google login callback is included, against
+fake_oauth_server.py on a free local port.
+
+Usage (from backend/):
+    python parity_check.py            # exit status 1 on any mismatch
+    python parity_check.py -v         # show every request, not just mismatches
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import socket
+import sys
+
+COMPARED_HEADERS = ('etag', 'cache-control', 'content-encoding', 'vary', 'retry-after', 'x-degraded',
+                    'access-control-allow-origin')
+# httpx asks for gzip unless told otherwise; the Flask test client sends nothing
+DEFAULT_HEADERS = {'Accept-Encoding': 'identity'}
+
+CHAT_MESSAGES = [
+    "I can't sleep and I wake up at 4am every night",
+    "racing heart, sweating and fear of dying",
+    "I feel sad and empty most days and nothing interests me",
+    "   ",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def build_requests(oauth=False):
+    """(name, method, path, kwargs) tuples; kwargs: json, headers, query."""
+    reqs = []
+    for i, m in enumerate(CHAT_MESSAGES):
+        reqs.append((f'chat[{i}]', 'POST', '/chat', {'json': {'message': m}}))
+    reqs += [
+        ('chat cors', 'POST', '/chat', {'json': {'message': CHAT_MESSAGES[0]},
+                                        'headers': {'Origin': 'http://example.test'}}),
+        ('chat bad body', 'POST', '/chat', {'data': b'not json', 'headers': {'Content-Type': 'application/json'}}),
+        ('chat/batch', 'POST', '/chat/batch', {'json': {'messages': CHAT_MESSAGES + [42]}}),
+        ('chat/batch stream', 'POST', '/chat/batch', {'json': {'messages': CHAT_MESSAGES, 'stream': True}}),
+        ('chat/batch empty', 'POST', '/chat/batch', {'json': {'messages': []}}),
+        ('quiz_questions', 'GET', '/quiz_questions', {'query': {'n': '5'}}),
+        ('quiz_questions bad n', 'GET', '/quiz_questions', {'query': {'n': 'x'}}),
+        ('quiz_result', 'POST', '/quiz_result', {'json': {'yes_symptoms': ['insomnia', 'fatigue', 'low mood']}}),
+        ('quiz_adaptive start', 'POST', '/quiz_adaptive', {'json': {'lookahead': 2}}),
+        ('quiz_adaptive bad token', 'POST', '/quiz_adaptive', {'json': {'token': 'x.y.z', 'answers': [True]}}),
+        ('send_contact missing', 'POST', '/send_contact', {'json': {'name': 'A'}}),
+        ('contact', 'GET', '/contact', {}),
+        ('front', 'GET', '/', {}),
+        ('front gzip', 'GET', '/', {'headers': {'Accept-Encoding': 'gzip'}}),
+        ('app.js', 'GET', '/app.js', {'headers': {'Accept-Encoding': 'gzip, br'}}),
+        ('unknown path', 'GET', '/no/such/page.html', {}),
+        ('models 404', 'GET', '/models/missing.bin', {}),
+        ('models vocab', 'GET', '/models/vocab.json', {}),
+        ('healthz', 'GET', '/healthz', {}),
+        ('auth start', 'GET', '/auth/google', {}),
+        ('callback no code', 'GET', '/auth/google/callback', {}),
+        ('admin forbidden', 'GET', '/admin/artifacts', {}),
+    ]
+    if oauth:
+        reqs.append(('callback', 'GET', '/auth/google/callback', {'query': {'code': 'parity-code'}}))
+    return reqs
+
+
+def normalize(name, path, body):
+    if path == '/quiz_questions' and isinstance(body, dict):
+        return {'questions': len(body.get('questions', []))}
+    if path == '/auth/google/callback' and isinstance(body, bytes):
+        return re.sub(rb'token: "[^"]*"', b'token: "..."', body)
+    return body
+
+
+def decode(content_type, content):
+    if content_type.startswith('application/json'):
+        return json.loads(content)
+    if content_type.startswith('application/x-ndjson'):
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    return content
+
+
+def headers_for(kw):
+    return dict(DEFAULT_HEADERS, **(kw.get('headers') or {}))
+
+
+def flask_call(client, method, path, kw):
+    resp = client.open(path, method=method, json=kw.get('json'), data=kw.get('data'),
+                       headers=headers_for(kw), query_string=kw.get('query'))
+    content = resp.get_data()
+    # httpx decodes the body for us, so decode Flask's the same way
+    encoding = resp.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        content = gzip.decompress(content)
+    elif encoding == 'br':
+        import brotli
+        content = brotli.decompress(content)
+    return resp.status_code, resp.headers, content
+
+
+def asgi_call(client, method, path, kw):
+    extra = {'json': kw['json']} if 'json' in kw else {'content': kw['data']} if 'data' in kw else {}
+    resp = client.request(method, path, headers=headers_for(kw), params=kw.get('query'), **extra)
+    return resp.status_code, resp.headers, resp.content
+
+
+def vary(value):
+    tokens = [t.strip() for t in value.split(',') if t.strip() and t.strip().lower() != 'origin']
+    return ', '.join(tokens) or None
+
+
+def summarize(status, headers, content, has_origin=False):
+    ctype = (headers.get('Content-Type') or '').split(';')[0].strip()
+    compared = {h: headers.get(h) for h in COMPARED_HEADERS if headers.get(h) is not None}
+    if not has_origin:
+        # flask_cors answers '*' even without an Origin header; browsers always send one
+        compared.pop('access-control-allow-origin', None)
+    if 'vary' in compared:
+        compared['vary'] = vary(compared['vary'])
+        if compared['vary'] is None:
+            del compared['vary']
+    try:
+        body = decode(ctype, content) if status != 304 else b''
+    except ValueError:
+        body = content
+    return {'status': status, 'content_type': ctype if content else '',
+            'headers': compared,
+            'body': body}
+
+
+def run(verbose=False):
+    oauth_env = None
+    try:
+        import fake_oauth_server
+        port = free_port()
+        oauth_env = fake_oauth_server.env_for('127.0.0.1', port, 'parity-client')
+        oauth_env.update({'Pasww': 'parity-secret', 'Nothing': 'parity-session-key',
+                          'OAUTH_REDIRECT_URI': 'http://localhost/auth/google/callback'})
+        os.environ.update(oauth_env)
+        fake_oauth_server.serve('127.0.0.1', port, 'parity-client')
+    except ImportError as e:
+        print(f"[parity] skipping the OAuth callback ({e})")
+
+    import app as core
+    import asgi_app
+    from starlette.testclient import TestClient
+
+    flask_client = core.app.test_client()
+    mismatches = 0
+    with TestClient(asgi_app.app) as asgi_client:
+        requests = build_requests(oauth=oauth_env is not None)
+        # a conditional request per cacheable page, using the ETag Flask hands out
+        for name, method, path, kw in list(requests):
+            if name in ('front', 'app.js'):
+                etag = flask_client.get(path, headers=headers_for(kw)).headers.get('ETag')
+                headers = dict(headers_for(kw), **{'If-None-Match': etag})
+                requests.append((name + ' 304', method, path, {'headers': headers}))
+
+        for name, method, path, kw in requests:
+            has_origin = 'Origin' in headers_for(kw)
+            f = summarize(*flask_call(flask_client, method, path, kw), has_origin=has_origin)
+            a = summarize(*asgi_call(asgi_client, method, path, kw), has_origin=has_origin)
+            f['body'], a['body'] = normalize(name, path, f['body']), normalize(name, path, a['body'])
+            diffs = [key for key in ('status', 'content_type', 'headers', 'body') if f[key] != a[key]]
+            if diffs:
+                mismatches += 1
+                print(f"DIFF  {method} {path} ({name}): {', '.join(diffs)}")
+                for key in diffs:
+                    print(f"      flask: {str(f[key])[:300]}")
+                    print(f"      asgi:  {str(a[key])[:300]}")
+            elif verbose:
+                print(f"ok    {method} {path} ({name}) -> {f['status']}")
+    total = len(requests)
+    print(f"{total - mismatches}/{total} requests matched")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare app.py and asgi_app.py responses")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    return 1 if run(args.verbose) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# backend/prediction_cache.py
+"""
+Bounded LRU/TTL cache for /chat predictions.
+
+Keys are a normalized form of the message (lowercased, whitespace collapsed)
+so trivially different retries and canned replies share an entry. Entries are
+bounded by count and by an approximate byte size; the oldest entries are
+evicted first. `generation` is bumped by clear() so callers can invalidate
+everything when the model artifacts change.
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_message(text):
+    return _WS_RE.sub(" ", (text or "").lower()).strip()
+
+
+def _approx_size(key, value):
+    size = sys.getsizeof(key)
+    label, probs = value
+    size += sys.getsizeof(label) + sys.getsizeof(probs) + 24 * len(probs)
+    return size
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl_seconds=None):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self._data = OrderedDict()        # key -> (value, size, stored_at)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, message):
+        """Cached (label, probs) for `message`, or None."""
+        if not self.enabled:
+            return None
+        key = normalize_message(message)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, message, value, generation=None):
+        """Stores `value`; ignored if the cache was cleared since `generation` was read."""
+        if not self.enabled:
+            return
+        key = normalize_message(message)
+        size = _approx_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, old_size, _) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,237 @@
+# backend/serve.py
+"""
+Production launcher: pre-fork, multi-worker, thread-pooled WSGI server.
+
+The master process imports app.py once (model artifacts, symptom bank,
+keyword matcher), freezes the GC so those objects stay untouched, opens the
+listening socket and forks N workers. Workers inherit the loaded state
+copy-on-write and each serve the shared socket with a fixed pool of threads.
+
+Signals (to the master):
+    SIGTERM / SIGINT  graceful shutdown: workers stop accepting, finish in-flight
+                      requests (up to --graceful-timeout) and exit
+    SIGHUP            reload artifacts in the master, then replace workers one at
+                      a time so the new model is shared copy-on-write again
+Workers are also recycled after --max-requests (with jitter) to bound memory growth.
+
+Usage (from backend/):
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+"""
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = 5      # seconds an idle keep-alive connection may hold a pool thread
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server on an inherited socket, handling requests on a fixed thread pool."""
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, fd, host, port, app, threads, max_requests=0, on_exhausted=None):
+        super().__init__(host, port, app, handler=KeepAliveHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self.max_requests = max_requests
+        self.on_exhausted = on_exhausted
+        self.handled = 0
+
+    def process_request(self, request, client_address):
+        self.handled += 1
+        self.pool.submit(self._process, request, client_address)
+        if self.max_requests and self.handled == self.max_requests and self.on_exhausted:
+            self.on_exhausted()
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+def run_worker(sock, host, port, wsgi_app, threads, max_requests):
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)     # reloads are driven by the master
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # Ctrl-C reaches the master, which sends SIGTERM
+
+    server = PooledWSGIServer(sock.fileno(), host, port, wsgi_app, threads, max_requests)
+
+    def stop(*_):
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    server.on_exhausted = stop
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever(poll_interval=0.5)
+    server.pool.shutdown(wait=True)                   # drain in-flight requests
+    os._exit(0)
+
+
+# -----------------------------
+# Master
+# -----------------------------
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}          # pid -> spawn time
+        self.stopping = False
+        self.reload_requested = False
+
+    def listen(self):
+        host, _, port = self.args.bind.rpartition(':')
+        self.host, self.port = host or '0.0.0.0', int(port)
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.args.backlog)
+        sock.set_inheritable(True)
+        self.sock = sock
+
+    def spawn(self):
+        max_requests = self.args.max_requests
+        if max_requests:
+            # jitter so workers don't all recycle at the same moment
+            max_requests += random.randint(0, self.args.max_requests_jitter)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.sock, self.host, self.port, self.app, self.args.threads, max_requests)
+            finally:
+                os._exit(1)
+        self.workers[pid] = time.time()
+        return pid
+
+    def reap(self, block=False):
+        reaped = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                del self.workers[pid]
+                reaped.append((pid, status))
+            if block:
+                break
+        return reaped
+
+    def stop_worker(self, pid, timeout):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.time() + timeout
+        while pid in self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        if pid in self.workers:
+            print(f"[serve] worker {pid} did not exit in {timeout}s, killing")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.pop(pid, None)
+
+    def rolling_restart(self):
+        """Reloads artifacts in the master, then swaps workers one at a time."""
+        print("[serve] reloading artifacts in master")
+        self.app_module.load_artifacts()
+        gc.collect()
+        gc.freeze()
+        for pid in list(self.workers):
+            self.spawn()
+            self.stop_worker(pid, self.args.graceful_timeout)
+        print("[serve] rolling restart complete")
+
+    def run(self, app_module):
+        self.app_module = app_module
+        self.app = app_module.app
+        self.listen()
+        gc.collect()
+        gc.freeze()                 # keep GC from writing to (and un-sharing) preloaded objects
+        os.environ['PREFORK_MASTER_PID'] = str(os.getpid())
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+
+        for _ in range(self.args.workers):
+            self.spawn()
+        print(f"[serve] master {os.getpid()} listening on {self.host}:{self.port} "
+              f"with {self.args.workers} workers x {self.args.threads} threads")
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+            for pid, status in self.reap():
+                if not self.stopping:
+                    code = os.waitstatus_to_exitcode(status)
+                    print(f"[serve] worker {pid} exited ({code}), respawning")
+                    self.spawn()
+            time.sleep(0.2)
+
+        print("[serve] shutting down workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.time() + self.args.graceful_timeout
+        while self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self.reap(block=True)
+        self.sock.close()
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_hup(self, signum, frame):
+        self.reload_requested = True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork production server for the Mentallify API")
+    parser.add_argument('--bind', default=os.getenv('BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS') or os.cpu_count() or 1))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS') or 4), help="threads per worker")
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('WEB_MAX_REQUESTS') or 0),
+                        help="recycle a worker after this many requests (0 = never)")
+    parser.add_argument('--max-requests-jitter', type=int, default=100)
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    parser.add_argument('--backlog', type=int, default=2048)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py needs os.fork(); on Windows run app.py instead.")
+    args = parse_args(argv)
+    import app as app_module
+    app_module.warm_up()        # load artifacts + symptom bank once, in the master, whatever STARTUP_MODE says
+    Master(args).run(app_module)
+
+
+if __name__ == '__main__':
+    main()
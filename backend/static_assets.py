@@ -0,0 +1,249 @@
+# backend/static_assets.py
+"""
+In-memory cache for the static files app.py serves (frontend root, models/).
+
+Each cached file keeps its bytes plus gzip (and brotli, if installed) variants
+compressed once at load time; web_model.<hash>.bin.gz/.br written by
+export_model_for_browser.py are used as-is. Responses carry a strong ETag
+(one per encoding) and go through werkzeug's make_conditional, so
+If-None-Match gets a 304 and Range requests still work on the identity body.
+
+Content-hashed names (e.g. web_model.3fa2c1d9e0b4.bin) get a one-year
+immutable Cache-Control; everything else gets no-cache, i.e. revalidate with
+the ETag. Entries are re-checked with one stat() at most every
+`check_interval` seconds, so edits on disk show up without a restart.
+Files larger than `max_file_bytes`, or that would push the cache past
+`max_total_bytes`, are streamed from disk as before, and re-checked on the same
+interval so they are cached once they shrink or room frees up.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,64}\.')
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/manifest+json',
+                'image/svg+xml', 'application/xml')
+MIN_COMPRESS_BYTES = 1024
+# never served from under the frontend root, even if the file exists: server code,
+# data/ (apart from the JSON the frontend reads), dotfiles, and working files
+PRIVATE_DIRS = ('backend', 'data', 'node_modules')
+PUBLIC_DATA_FILES = ('data/symptom_bank.json', 'data/keywords.json')
+PRIVATE_SUFFIXES = ('.py', '.pyc', '.patch', '.diff', '.jsonl', '.sqlite3', '.pkl', '.npz')
+# directories under the frontend root that index() doesn't preload
+SKIP_DIRS = {'backend', 'data', 'node_modules', '__pycache__'}
+
+
+class Asset:
+    __slots__ = ('path', 'mtime_ns', 'size', 'checked_at', 'mimetype', 'etag', 'body', 'variants',
+                 'cache_control')
+
+    def __init__(self, path, mtime_ns, size, mimetype, body, variants, cache_control):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checked_at = time.monotonic()
+        self.mimetype = mimetype
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = variants          # encoding -> bytes
+        self.cache_control = cache_control
+
+    @property
+    def nbytes(self):
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+
+class Uncached:
+    """A file get() declined to cache (too large, or over the byte budget); re-checked like an Asset."""
+    __slots__ = ('mtime_ns', 'size', 'checked_at')
+
+    def __init__(self, st):
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.checked_at = time.monotonic()
+
+
+class StaticAssets:
+    def __init__(self, root, max_file_bytes=16 * 1024 * 1024, max_total_bytes=128 * 1024 * 1024,
+                 check_interval=2.0):
+        self.root = os.path.abspath(root)
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.check_interval = check_interval
+        self._entries = {}        # (abs path, render key) -> Asset, or Uncached for "streamed from disk"
+        self._resolved = {}       # relative path -> (abs path or None, checked_at)
+        self._lock = threading.Lock()
+        self._total = 0
+        self.hits = self.misses = self.not_modified = self.from_disk = 0
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    @staticmethod
+    def is_private(rel_path):
+        """True for paths (relative to root) that must not be served."""
+        rel = os.path.normpath(rel_path).replace(os.sep, '/').lstrip('/').lower()
+        if rel in PUBLIC_DATA_FILES:
+            return False
+        return (any(part.startswith('.') for part in rel.split('/')) or rel.endswith(PRIVATE_SUFFIXES)
+                or any(rel == d or rel.startswith(d + '/') for d in PRIVATE_DIRS))
+
+    def resolve(self, rel_path):
+        """Absolute path of an existing, servable file under root, or None (also for paths escaping root)."""
+        now = time.monotonic()
+        hit = self._resolved.get(rel_path)
+        if hit is not None and now - hit[1] < self.check_interval:
+            return hit[0]
+        full = os.path.normpath(os.path.join(self.root, rel_path))
+        if (not full.startswith(self.root + os.sep) or self.is_private(os.path.relpath(full, self.root))
+                or not os.path.isfile(full)):
+            full = None
+        if len(self._resolved) > 4096:      # bound the memory arbitrary 404 paths can use
+            self._resolved.clear()
+        self._resolved[rel_path] = (full, now)
+        return full
+
+    def get(self, full_path, render=None, render_key=None):
+        """Cached Asset for `full_path` (reloaded if changed on disk), or None if it isn't cacheable."""
+        key = (full_path, render_key)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            if isinstance(entry, Uncached):
+                return None
+            self.hits += 1
+            return entry
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            self._forget(key)
+            return None
+        if isinstance(entry, Asset) and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+            entry.checked_at = now
+            self.hits += 1
+            return entry
+        if isinstance(entry, Uncached) and (st.st_size > self.max_file_bytes
+                                            or self._total + st.st_size > self.max_total_bytes):
+            # still too large, or still no room: don't re-read and recompress it just to refuse it again
+            entry.mtime_ns, entry.size, entry.checked_at = st.st_mtime_ns, st.st_size, now
+            return None
+        self.misses += 1
+        loaded = self._load(full_path, st, render)
+        with self._lock:
+            old = self._entries.get(key)
+            if isinstance(old, Asset):
+                self._total -= old.nbytes
+            if loaded is not None and render is None and self._total + loaded.nbytes > self.max_total_bytes:
+                loaded = None
+            if loaded is not None:
+                self._total += loaded.nbytes
+            self._entries[key] = loaded if loaded is not None else Uncached(st)
+        return loaded
+
+    def _forget(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if isinstance(old, Asset):
+                self._total -= old.nbytes
+
+    def _load(self, path, st, render):
+        # rendered templates are always cached: there is no on-disk copy to stream
+        if render is None and st.st_size > self.max_file_bytes:
+            return None
+        with open(path, 'rb') as f:
+            body = f.read()
+        if render is not None:
+            body = render(body)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        variants = {}
+        # precompressed siblings (export_model_for_browser.py writes .gz/.br next to the binary model)
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if render is None and os.path.isfile(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+        if not variants and len(body) >= MIN_COMPRESS_BYTES and mimetype.startswith(COMPRESSIBLE):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body) * 0.9:
+                variants['gzip'] = gz
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body) * 0.9:
+                    variants['br'] = br
+        if HASHED_NAME.search(os.path.basename(path)):
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = 'no-cache'
+        return Asset(path, st.st_mtime_ns, st.st_size, mimetype, body, variants, cache_control)
+
+    def index(self):
+        """Preloads the servable files under root (skipping SKIP_DIRS, hidden dirs and private files)."""
+        started = time.perf_counter()
+        n = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in SKIP_DIRS]
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                if name.endswith(('.gz', '.br')) or self.is_private(os.path.relpath(full, self.root)):
+                    continue
+                if self.get(full) is not None:
+                    n += 1
+        print(f"[static] indexed {n} files ({self._total / 1e6:.1f} MB) in "
+              f"{(time.perf_counter() - started) * 1000.0:.1f}ms")
+        return n
+
+    # -----------------------------
+    # Responses
+    # -----------------------------
+    @staticmethod
+    def negotiate(entry, accepted):
+        """(body, encoding or None, etag) for the best variant in `accepted` (a werkzeug Accept)."""
+        for encoding in ('br', 'gzip'):
+            if encoding in entry.variants and accepted[encoding]:
+                return entry.variants[encoding], encoding, f"{entry.etag}-{encoding}"
+        return entry.body, None, entry.etag
+
+    def response(self, full_path, render=None, render_key=None, mimetype=None):
+        """Response for `full_path`: from memory with the best accepted encoding, else streamed from disk."""
+        entry = self.get(full_path, render, render_key)
+        if entry is None:
+            self.from_disk += 1
+            return send_file(full_path, mimetype=mimetype, conditional=True, etag=True)
+
+        body, encoding, etag = self.negotiate(entry, request.accept_encodings)
+        resp = Response(body, mimetype=mimetype or entry.mimetype)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = entry.cache_control
+        if entry.variants:
+            resp.vary.add('Accept-Encoding')
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+            resp = resp.make_conditional(request)
+        else:
+            resp = resp.make_conditional(request, accept_ranges=True, complete_length=len(body))
+        if resp.status_code == 304:
+            self.not_modified += 1
+        return resp
+
+    def stats(self):
+        with self._lock:
+            cached = [e for e in self._entries.values() if isinstance(e, Asset)]
+            return {
+                'files': len(cached),
+                'bytes': self._total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'from_disk': self.from_disk,
+                'brotli': brotli is not None,
+            }
@@ -0,0 +1,209 @@
+# backend/sweep.py
+"""
+Parallel hyperparameter sweep for the TF-IDF + LogisticRegression model.
+
+Each distinct vectorizer setting (ngram range, max_features) is featurized
+once and cached under backend/cache/features/ as a sparse .npz plus labels,
+keyed by a hash of the data file and the vectorizer parameters, so reruns skip
+parsing and TF-IDF entirely. Classifier settings (C, class_weight) x CV folds
+are then fanned out over a process pool; every worker reads the cached matrix
+from disk. Results go to reports/sweep_leaderboard.{csv,txt}.
+
+Note: TF-IDF is fitted once on the full file, so vocabulary/idf see the
+validation folds. That is fine for ranking configurations; the final model
+should still be trained with train_model.py.
+
+Usage (from backend/):
+    python sweep.py --C 0.1,1,10 --ngram 1-1,1-2 --max-features 5000,20000 --class-weight none,balanced
+    python sweep.py --random 20 --jobs 8
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from train_model import BASE, CSV_PATH, REPORTS_DIR, load_csv
+
+CACHE_DIR = os.path.join(BASE, 'cache', 'features')
+
+# Matches train_model.py; only ngram_range / max_features are swept.
+BASE_VECTORIZER_PARAMS = {'stop_words': 'english', 'sublinear_tf': True}
+
+
+# -----------------------------
+# Featurized-dataset cache
+# -----------------------------
+def file_digest(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(data_digest, vec_params):
+    blob = json.dumps({'data': data_digest, 'vectorizer': vec_params}, sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:24]
+
+
+def featurize(csv_path, data_digest, ngram_range, max_features):
+    """Returns the cached matrix path for this vectorizer setting, building it on a miss."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import LabelEncoder
+
+    params = dict(BASE_VECTORIZER_PARAMS, ngram_range=list(ngram_range), max_features=max_features)
+    key = cache_key(data_digest, params)
+    x_path = os.path.join(CACHE_DIR, f'{key}.npz')
+    y_path = os.path.join(CACHE_DIR, f'{key}.labels.npy')
+    if os.path.exists(x_path) and os.path.exists(y_path):
+        print(f"[sweep] cache hit {key} {params}")
+        return x_path, y_path
+
+    print(f"[sweep] featurizing {params}")
+    df = load_csv(csv_path)
+    le = LabelEncoder()
+    y = le.fit_transform(df['disease'].astype(str).values)
+    vec = TfidfVectorizer(**dict(params, ngram_range=tuple(ngram_range)))
+    X = vec.fit_transform(df['symptoms'].astype(str).values)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    sp.save_npz(x_path + '.tmp.npz', X.tocsr())
+    np.save(y_path + '.tmp.npy', y)
+    os.replace(x_path + '.tmp.npz', x_path)
+    os.replace(y_path + '.tmp.npy', y_path)
+    with open(os.path.join(CACHE_DIR, f'{key}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'data_sha256': data_digest, 'vectorizer': params, 'classes': list(le.classes_),
+                   'shape': list(X.shape)}, f, indent=2)
+    return x_path, y_path
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+_MATRICES = {}   # per-process cache: x_path -> (X, y)
+
+
+def _load(x_path, y_path):
+    if x_path not in _MATRICES:
+        _MATRICES[x_path] = (sp.load_npz(x_path).tocsr(), np.load(y_path))
+    return _MATRICES[x_path]
+
+
+def run_fold(x_path, y_path, C, class_weight, fold, n_folds, seed):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score
+    from sklearn.model_selection import StratifiedKFold
+
+    X, y = _load(x_path, y_path)
+    splits = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y)
+    train_idx, test_idx = next(itertools.islice(splits, fold, None))
+    started = time.perf_counter()
+    clf = LogisticRegression(C=C, max_iter=300, multi_class='ovr', class_weight=class_weight)
+    clf.fit(X[train_idx], y[train_idx])
+    preds = clf.predict(X[test_idx])
+    return {
+        'accuracy': accuracy_score(y[test_idx], preds),
+        'macro_f1': f1_score(y[test_idx], preds, average='macro'),
+        'fit_seconds': time.perf_counter() - started,
+    }
+
+
+# -----------------------------
+# Sweep driver
+# -----------------------------
+def _parse_list(text, conv):
+    return [conv(v.strip()) for v in text.split(',') if v.strip()]
+
+
+def _ngram(text):
+    lo, _, hi = text.partition('-')
+    return (int(lo), int(hi or lo))
+
+
+def _class_weight(text):
+    return None if text.lower() == 'none' else text
+
+
+def build_grid(args):
+    grid = list(itertools.product(
+        _parse_list(args.ngram, _ngram),
+        _parse_list(args.max_features, int),
+        _parse_list(args.C, float),
+        _parse_list(args.class_weight, _class_weight),
+    ))
+    if args.random and args.random < len(grid):
+        grid = random.Random(args.seed).sample(grid, args.random)
+    return grid
+
+
+def write_leaderboard(rows):
+    board = pd.DataFrame(rows).sort_values(['macro_f1_mean', 'accuracy_mean'], ascending=False)
+    board.to_csv(os.path.join(REPORTS_DIR, 'sweep_leaderboard.csv'), index=False)
+    with open(os.path.join(REPORTS_DIR, 'sweep_leaderboard.txt'), 'w', encoding='utf-8') as f:
+        f.write(board.to_string(index=False, float_format=lambda v: f'{v:.4f}') + '\n')
+    return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep with cached features")
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--C', default='0.1,1,10', help="comma-separated inverse regularization strengths")
+    parser.add_argument('--ngram', default='1-1,1-2', help="comma-separated ngram ranges, e.g. 1-1,1-2")
+    parser.add_argument('--max-features', default='5000,20000')
+    parser.add_argument('--class-weight', default='none,balanced')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--random', type=int, default=0, help="sample this many configurations instead of the full grid")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    grid = build_grid(args)
+    digest = file_digest(args.csv)
+    matrices = {}
+    for ngram, max_features, _, _ in grid:
+        if (ngram, max_features) not in matrices:
+            matrices[(ngram, max_features)] = featurize(args.csv, digest, ngram, max_features)
+
+    results = {cfg: [] for cfg in grid}
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for cfg in grid:
+            ngram, max_features, C, cw = cfg
+            x_path, y_path = matrices[(ngram, max_features)]
+            for fold in range(args.folds):
+                futures[pool.submit(run_fold, x_path, y_path, C, cw, fold, args.folds, args.seed)] = cfg
+        for fut in as_completed(futures):
+            results[futures[fut]].append(fut.result())
+
+    rows = []
+    for (ngram, max_features, C, cw), folds in results.items():
+        acc = np.array([r['accuracy'] for r in folds])
+        f1 = np.array([r['macro_f1'] for r in folds])
+        rows.append({
+            'ngram_range': f'{ngram[0]}-{ngram[1]}',
+            'max_features': max_features,
+            'C': C,
+            'class_weight': cw or 'none',
+            'accuracy_mean': acc.mean(),
+            'accuracy_std': acc.std(),
+            'macro_f1_mean': f1.mean(),
+            'macro_f1_std': f1.std(),
+            'fit_seconds_mean': float(np.mean([r['fit_seconds'] for r in folds])),
+        })
+    board = write_leaderboard(rows)
+    print(board.head(10).to_string(index=False))
+    print(f"Sweep of {len(grid)} configs x {args.folds} folds finished in {time.perf_counter() - started:.1f}s. "
+          f"Leaderboard written to {REPORTS_DIR}")
+
+
+if __name__ == '__main__':
+    main()
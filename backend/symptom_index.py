@@ -0,0 +1,80 @@
+# backend/symptom_index.py
+"""
+Precompiled symptom bank for the quiz endpoints.
+
+SymptomIndex turns symptom_bank.json into:
+  - a symptom -> bit id table,
+  - one integer bitset per disease (bit i set if the disease lists symptom i),
+  - a symptom -> diseases inverted index,
+so /quiz_result scoring is a bitwise AND + popcount per candidate disease
+instead of a list scan per disease per answer.
+"""
+import random
+
+
+def _popcount(x):
+    return bin(x).count("1")
+
+
+class SymptomIndex:
+    def __init__(self, bank):
+        diseases = (bank or {}).get('diseases', {}) or {}
+        self.questions = list((bank or {}).get('questions', []) or [])
+        self.symptom_ids = {}
+        self.diseases = []        # [(name, symptoms, mask, has_duplicates, precautions)]
+        self.inverted = {}        # symptom id -> [disease index]
+        for name, meta in diseases.items():
+            symptoms = list(meta.get('symptoms', []))
+            mask = 0
+            for sym in symptoms:
+                sid = self.symptom_ids.setdefault(sym, len(self.symptom_ids))
+                if not (mask >> sid) & 1:
+                    self.inverted.setdefault(sid, []).append(len(self.diseases))
+                mask |= 1 << sid
+            has_dups = _popcount(mask) != len(symptoms)
+            self.diseases.append((name, symptoms, mask, has_dups, meta.get('precautions', '')))
+        for q in self.questions:
+            key = q.get('symptom_key') if isinstance(q, dict) else None
+            if key is not None:
+                self.symptom_ids.setdefault(key, len(self.symptom_ids))
+
+    def answer_mask(self, yes_symptoms):
+        mask = 0
+        ids = self.symptom_ids
+        for sym in yes_symptoms or []:
+            sid = ids.get(sym) if isinstance(sym, str) else None
+            if sid is not None:
+                mask |= 1 << sid
+        return mask
+
+    def score(self, yes_symptoms):
+        """Same result list as the original /quiz_result loop, sorted by score."""
+        answers = self.answer_mask(yes_symptoms)
+        candidates = set()
+        a = answers
+        while a:
+            low = a & -a
+            candidates.update(self.inverted.get(low.bit_length() - 1, ()))
+            a ^= low
+        results = []
+        for di, (name, symptoms, mask, has_dups, precautions) in enumerate(self.diseases):
+            if di in candidates:
+                hit = answers & mask
+                matched = [s for s in symptoms if (hit >> self.symptom_ids[s]) & 1]
+                count = len(matched) if has_dups else _popcount(hit)
+            else:
+                matched, count = [], 0
+            score = (count / len(symptoms)) if symptoms else 0.0
+            results.append({
+                "disease": name,
+                "score": round(score, 3),
+                "matched_symptoms": matched,
+                "precautions": precautions
+            })
+        results.sort(key=lambda r: r['score'], reverse=True)
+        return results
+
+    def sample_questions(self, n, rng=random):
+        """Up to n distinct questions in random order; never mutates the bank."""
+        k = max(0, min(int(n), len(self.questions)))
+        return rng.sample(self.questions, k)
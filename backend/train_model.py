@@ -1,9 +1,12 @@
 # backend/train_model.py
-import os, joblib
+import os, sys, joblib, argparse, time
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import LabelEncoder
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 
@@ -15,8 +18,11 @@ LE_PATH = os.path.join(BASE, 'label_encoder.pkl')
 REPORTS_DIR = os.path.join(BASE, 'reports')
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
-def load_csv(path):
-    df = pd.read_csv(path)
+# train/test split; export_model_for_browser.py reproduces it to find held-out rows
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
+def normalize_columns(df):
     # Ensure explicit mapping
     if 'symptoms' not in df.columns or 'disease' not in df.columns:
         # try to remap common alternate names:
@@ -27,8 +33,25 @@ def load_csv(path):
     df = df[['symptoms','disease']].dropna()
     return df
 
-def main():
-    df = load_csv(CSV_PATH)
+def load_csv(path):
+    return normalize_columns(pd.read_csv(path))
+
+def iter_csv_chunks(path, chunksize):
+    """Yields (texts, labels) arrays chunk by chunk without loading the whole file."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk = normalize_columns(chunk)
+        yield chunk['symptoms'].astype(str).values, chunk['disease'].astype(str).values
+
+def write_report(acc, report):
+    with open(os.path.join(REPORTS_DIR, 'training_report.txt'), 'w', encoding='utf-8') as f:
+        f.write(f'Accuracy: {acc}\n\n{report}')
+
+def split_indices(y_enc):
+    """(train row indices, test row indices) of the stratified split main() trains on."""
+    return train_test_split(np.arange(len(y_enc)), test_size=TEST_SIZE, stratify=y_enc, random_state=SPLIT_SEED)
+
+def main(csv_path=CSV_PATH):
+    df = load_csv(csv_path)
     X_text = df['symptoms'].astype(str).values
     y = df['disease'].astype(str).values
 
@@ -38,7 +61,8 @@ def main():
     tfidf = TfidfVectorizer(stop_words='english', max_features=20000, sublinear_tf=True, ngram_range=(1,2))
     X = tfidf.fit_transform(X_text)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y_enc, test_size=0.2, stratify=y_enc, random_state=42)
+    train_idx, test_idx = split_indices(y_enc)
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y_enc[train_idx], y_enc[test_idx]
 
     clf = LogisticRegression(max_iter=300, multi_class='ovr')
     clf.fit(X_train, y_train)
@@ -51,8 +75,7 @@ def main():
     joblib.dump(clf, MODEL_PATH)
     joblib.dump(le, LE_PATH)
 
-    with open(os.path.join(REPORTS_DIR, 'training_report.txt'), 'w', encoding='utf-8') as f:
-        f.write(f'Accuracy: {acc}\n\n{report}')
+    write_report(acc, report)
 
     # sample preds
     sample_texts = X_text[:100]
@@ -61,5 +84,116 @@ def main():
 
     print("Training finished. Artifacts saved.")
 
+# -----------------------------
+# Streaming (out-of-core) training
+# -----------------------------
+def peak_rss_mb():
+    """Peak resident set size in MB, or None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def main_streaming(csv_path=CSV_PATH, chunksize=50000, epochs=3, n_features=2**20, holdout_every=5, alpha=1e-6):
+    """
+    Trains with memory bounded by `chunksize` rather than dataset size:
+      pass 0   - hash every chunk, accumulate document frequencies (streaming IDF)
+                 and the label set;
+      passes 1..epochs - SGDClassifier(log_loss).partial_fit on TF-IDF chunks;
+      final    - score the held-out rows (every `holdout_every`-th row).
+    The saved vectorizer is a HashingVectorizer -> TfidfTransformer Pipeline and the
+    model exposes predict_proba, so app.py's load_artifacts() serves them unchanged.
+    """
+    started = time.perf_counter()
+    hasher = HashingVectorizer(stop_words='english', ngram_range=(1,2), n_features=n_features,
+                               alternate_sign=False, norm=None)
+
+    doc_freq = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    labels = set()
+    for texts, y in iter_csv_chunks(csv_path, chunksize):
+        X = hasher.transform(texts)
+        X.sum_duplicates()
+        doc_freq += np.bincount(X.indices, minlength=n_features)
+        n_docs += X.shape[0]
+        labels.update(y)
+    if not n_docs:
+        raise ValueError("CSV has no usable rows.")
+    print(f"[stream] pass 0: {n_docs} rows, {len(labels)} classes")
+
+    # same formula as TfidfTransformer(smooth_idf=True)
+    idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1.0
+    transformer = TfidfTransformer(sublinear_tf=True)
+    transformer.fit(sp.csr_matrix((1, n_features)))
+    transformer.idf_ = idf
+    tfidf = Pipeline([('hash', hasher), ('tfidf', transformer)])
+
+    le = LabelEncoder()
+    le.fit(sorted(labels))
+    classes = np.arange(len(le.classes_))
+    clf = SGDClassifier(loss='log_loss', alpha=alpha, random_state=42)
+    rng = np.random.default_rng(42)
+
+    rows_processed = n_docs
+    for epoch in range(epochs):
+        offset = 0
+        for texts, y in iter_csv_chunks(csv_path, chunksize):
+            train_mask = (np.arange(offset, offset + len(texts)) % holdout_every) != 0
+            offset += len(texts)
+            order = rng.permutation(np.flatnonzero(train_mask))
+            if len(order):
+                clf.partial_fit(tfidf.transform(texts[order]), le.transform(y[order]), classes=classes)
+            rows_processed += len(texts)
+        print(f"[stream] epoch {epoch + 1}/{epochs} done")
+
+    y_true, y_pred = [], []
+    offset = 0
+    for texts, y in iter_csv_chunks(csv_path, chunksize):
+        test_mask = (np.arange(offset, offset + len(texts)) % holdout_every) == 0
+        offset += len(texts)
+        if test_mask.any():
+            y_true.append(le.transform(y[test_mask]))
+            y_pred.append(clf.predict(tfidf.transform(texts[test_mask])))
+        rows_processed += len(texts)
+    y_true, y_pred = np.concatenate(y_true), np.concatenate(y_pred)
+    acc = accuracy_score(y_true, y_pred)
+    report = classification_report(y_true, y_pred, labels=classes, target_names=le.classes_, zero_division=0)
+
+    joblib.dump(tfidf, TFIDF_PATH)
+    joblib.dump(clf, MODEL_PATH)
+    joblib.dump(le, LE_PATH)
+
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_mb()
+    stats = (f"Mode: streaming (chunksize={chunksize}, epochs={epochs}, n_features={n_features})\n"
+             f"Rows: {n_docs}  Rows processed (all passes): {rows_processed}\n"
+             f"Wall time: {elapsed:.1f}s  Throughput: {rows_processed / elapsed:.0f} rows/s\n"
+             f"Peak RSS: {f'{peak:.1f} MB' if peak is not None else 'n/a'}\n\n")
+    write_report(acc, stats + report)
+
+    first_texts, _ = next(iter_csv_chunks(csv_path, 100))
+    sample_texts = first_texts[:100]
+    sample_preds = le.inverse_transform(clf.predict(tfidf.transform(sample_texts)))
+    pd.DataFrame({'text': sample_texts, 'pred': sample_preds}).to_csv(os.path.join(REPORTS_DIR, 'sample_predictions.csv'), index=False)
+
+    print(stats.strip())
+    print("Streaming training finished. Artifacts saved.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Mentallify text classifier")
+    parser.add_argument('--csv', default=CSV_PATH, help="training CSV with 'symptoms' and 'disease' columns")
+    parser.add_argument('--streaming', action='store_true', help="out-of-core training for datasets that don't fit in memory")
+    parser.add_argument('--chunksize', type=int, default=50000, help="rows per chunk in streaming mode")
+    parser.add_argument('--epochs', type=int, default=3, help="passes over the data in streaming mode")
+    parser.add_argument('--n-features', type=int, default=2**20, help="hashing space size in streaming mode")
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
-    main()
+    args = parse_args()
+    if args.streaming:
+        main_streaming(args.csv, chunksize=args.chunksize, epochs=args.epochs, n_features=args.n_features)
+    else:
+        main(args.csv)
@@ -0,0 +1,302 @@
+# backend/update_model.py
+"""
+Incremental model updates from reviewer-labelled /chat feedback.
+
+    1. Run the app with FEEDBACK_LOG=1 (see feedback_log.py).
+    2. python update_model.py export feedback_review.csv
+       Writes one row per distinct logged message with the predicted label and
+       confidence, plus an empty `label` column for the reviewer.
+    3. python update_model.py apply feedback_review.csv
+       Refits the serving model on the labelled rows that earlier updates have
+       not used yet, publishes the result as a new artifact version
+       (artifact_store.py) and prints accuracy before/after.
+    4. POST /admin/reload (or SIGHUP serve.py) to start serving it.
+
+The update keeps the fitted TF-IDF vocabulary and the label set frozen. The
+model must be a one-vs-rest linear classifier (train_model.py's
+LogisticRegression(multi_class='ovr') or the streaming SGDClassifier). Each
+class's weights are refit with L-BFGS, starting from the current
+coefficients, on
+
+    mean logistic loss over the new rows + anchor/2 * ||w - w_current||^2
+
+The anchor term keeps the model close to the one trained on the full
+dataset, so a few hundred corrections shift it without the rest being
+forgotten. That makes an update take seconds. A full retrain with
+train_model.py is only needed to add classes or vocabulary.
+
+Accuracy is reported on a held-out share of the labelled rows (`--holdout`;
+those rows are not marked as used, so a later update picks them up) and on a
+sample of the training CSV (`--eval-csv`) as a regression check. With
+`--max-drop`, a version that loses more than that much accuracy on either set
+is published but not activated.
+"""
+import argparse
+import copy
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import expit
+
+import artifact_store
+from compiled_model import _proba_mode
+from feedback_log import FeedbackLog
+from prediction_cache import normalize_message
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+FEEDBACK_PATH = os.getenv("FEEDBACK_LOG_PATH") or os.path.join(BASE, 'feedback', 'feedback.jsonl')
+CSV_PATH = os.path.join(BASE, 'mental_health_dataset_60000_rows.csv')
+
+
+def row_key(message, label):
+    return hashlib.sha256(f"{normalize_message(message)}\t{label}".encode('utf-8')).hexdigest()[:16]
+
+
+# -----------------------------
+# Feedback export / label files
+# -----------------------------
+def export_feedback(log_path, out_path, since=None):
+    """Latest prediction per distinct message -> review CSV; returns the row count."""
+    latest = {}
+    for rec in FeedbackLog(log_path).records():
+        if since and rec.get('ts', 0) < since:
+            continue
+        latest[normalize_message(rec.get('message'))] = rec
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['id', 'ts', 'version', 'predicted', 'confidence', 'message', 'label'])
+        for rec in latest.values():
+            probs = rec.get('probs') or {}
+            values = probs.values() if isinstance(probs, dict) else probs
+            confidence = max(values, default=None)
+            w.writerow([rec.get('id'), rec.get('ts'), rec.get('version'), rec.get('label'),
+                        '' if confidence is None else f"{confidence:.4f}", rec.get('message'), ''])
+    return len(latest)
+
+
+def read_labels(path):
+    """(messages, labels) from a CSV with message,label (or symptoms,disease) columns; unlabelled rows skipped."""
+    messages, labels = [], []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = set(reader.fieldnames or [])
+        if {'message', 'label'} <= fields:
+            text_col, label_col = 'message', 'label'
+        elif {'symptoms', 'disease'} <= fields:
+            text_col, label_col = 'symptoms', 'disease'
+        else:
+            raise ValueError(f"{path} needs 'message' and 'label' (or 'symptoms' and 'disease') columns")
+        for row in reader:
+            text, label = (row.get(text_col) or '').strip(), (row.get(label_col) or '').strip()
+            if text and label:
+                messages.append(text)
+                labels.append(label)
+    return messages, labels
+
+
+# -----------------------------
+# Warm-started refit
+# -----------------------------
+def load_current(root):
+    """(bundle, parent name); falls back to the pickles in backend/ when there is no CURRENT version."""
+    if artifact_store.current_version(root):
+        bundle = artifact_store.load_version(root=root, mmap=False)
+        return bundle, bundle.version
+    objs = {key: joblib.load(os.path.join(BASE, name)) for key, name in artifact_store.PICKLES.items()}
+    return artifact_store.ArtifactBundle(None, **objs), 'legacy-pickles'
+
+
+def refit_ovr(model, X, y, anchor=0.1, max_iter=200):
+    """Copy of `model` with each one-vs-rest problem refit on (X, y) from the current weights."""
+    n_classes = len(model.classes_)
+    if _proba_mode(model, n_classes) == 'softmax':
+        raise ValueError("Only one-vs-rest models can be updated incrementally; retrain with train_model.py.")
+    coef = np.array(model.coef_, dtype=np.float64)
+    intercept = np.array(np.broadcast_to(model.intercept_, (coef.shape[0],)), dtype=np.float64)
+    # binary models keep one row, scoring classes_[1] against classes_[0]
+    targets = [model.classes_[1]] if coef.shape[0] == 1 else list(model.classes_)
+    n, d = X.shape
+
+    for k, target in enumerate(targets):
+        s = np.where(y == target, 1.0, -1.0)
+        # the intercept is anchored too: a batch of corrections is rarely class-balanced
+        p0 = np.append(coef[k], intercept[k])
+
+        def objective(params):
+            margin = s * (X @ params[:d] + params[d])
+            delta = params - p0
+            loss = np.logaddexp(0.0, -margin).mean() + 0.5 * anchor * np.dot(delta, delta)
+            g = -s * expit(-margin) / n
+            grad = anchor * delta
+            grad[:d] += X.T @ g
+            grad[d] += g.sum()
+            return loss, grad
+
+        res = minimize(objective, p0, jac=True, method='L-BFGS-B', options={'maxiter': max_iter})
+        coef[k], intercept[k] = res.x[:d], res.x[d]
+
+    updated = copy.deepcopy(model)
+    updated.coef_ = coef
+    updated.intercept_ = intercept
+    return updated
+
+
+def accuracy(tfidf, model, X_text, y):
+    if not len(y):
+        return None
+    return float(np.mean(model.predict(tfidf.transform(X_text)) == y))
+
+
+def reference_sample(path, rows, seed):
+    """Up to `rows` random (texts, labels) from the training CSV, or None if it is missing."""
+    if not path or not os.path.exists(path) or rows <= 0:
+        return None
+    from train_model import load_csv
+    df = load_csv(path)
+    if len(df) > rows:
+        df = df.sample(rows, random_state=seed)
+    return df['symptoms'].astype(str).values, df['disease'].astype(str).values
+
+
+def apply_labels(labels_path, root=artifact_store.ARTIFACTS_DIR, anchor=0.1, holdout=0.2,
+                 eval_csv=CSV_PATH, eval_rows=5000, max_iter=200, max_drop=None, version=None,
+                 activate=True, dry_run=False, seed=42):
+    """Runs one update; returns the report dict (also stored in the new version's manifest)."""
+    started = time.perf_counter()
+    bundle, parent = load_current(root)
+    tfidf, model, le = bundle.tfidf, bundle.model, bundle.label_encoder
+    if tfidf is None or model is None or le is None:
+        raise ValueError("No trained model to update; run train_model.py first.")
+    parent_meta = bundle.manifest.get('metadata', {})
+    applied = set(parent_meta.get('applied_rows', []))
+
+    messages, labels = read_labels(labels_path)
+    known = set(str(c) for c in le.classes_)
+    rows, unknown, seen = {}, 0, 0
+    for text, label in zip(messages, labels):
+        key = row_key(text, label)
+        if label not in known:
+            unknown += 1
+        elif key in applied:
+            seen += 1
+        else:
+            rows[key] = (text, label)          # duplicates in the file collapse to one row
+    if unknown:
+        print(f"[update] skipped {unknown} rows with labels the model doesn't know (needs a full retrain)")
+    if seen:
+        print(f"[update] skipped {seen} rows already applied in an earlier update")
+    if not rows:
+        raise ValueError("No new labelled rows to apply.")
+
+    keys = list(rows)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(keys))
+    n_holdout = int(round(len(keys) * holdout)) if len(keys) >= 10 else 0
+    test_keys = [keys[i] for i in order[:n_holdout]]
+    train_keys = [keys[i] for i in order[n_holdout:]]
+    train_text = [rows[k][0] for k in train_keys]
+    train_y = le.transform([rows[k][1] for k in train_keys])
+
+    fit_started = time.perf_counter()
+    updated = refit_ovr(model, tfidf.transform(train_text), train_y, anchor=anchor, max_iter=max_iter)
+    fit_seconds = time.perf_counter() - fit_started
+
+    sets = {}
+    if test_keys:
+        sets['holdout'] = ([rows[k][0] for k in test_keys], le.transform([rows[k][1] for k in test_keys]))
+    sets['train_rows'] = (train_text, train_y)
+    ref = reference_sample(eval_csv, eval_rows, seed)
+    if ref is not None:
+        mask = np.isin(ref[1], list(known))
+        sets['reference'] = (ref[0][mask], le.transform(ref[1][mask]))
+    scores = {}
+    for name, (X_text, y) in sets.items():
+        if not len(y):
+            continue
+        before, after = accuracy(tfidf, model, X_text, y), accuracy(tfidf, updated, X_text, y)
+        scores[name] = {'n': int(len(y)), 'before': before, 'after': after, 'diff': after - before}
+
+    regressed = [name for name in ('holdout', 'reference')
+                 if max_drop is not None and name in scores and scores[name]['diff'] < -max_drop]
+    report = {
+        'parent': parent,
+        'labels_file': os.path.basename(labels_path),
+        'rows': {'train': len(train_keys), 'holdout': len(test_keys), 'unknown_label': unknown,
+                 'already_applied': seen},
+        'anchor': anchor,
+        'accuracy': scores,
+        'regressed': regressed,
+        'fit_seconds': round(fit_seconds, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if not dry_run:
+        metadata = {'source': 'update_model', 'update': report,
+                    'applied_rows': sorted(applied | set(train_keys))}
+        report['version'] = artifact_store.publish(tfidf, updated, le, version=version, root=root,
+                                                   activate=activate and not regressed, metadata=metadata)
+        report['activated'] = activate and not regressed
+    return report
+
+
+def print_report(report):
+    rows = report['rows']
+    print(f"Parent: {report['parent']}  rows: {rows['train']} train, {rows['holdout']} held out")
+    print(f"{'set':<12}{'n':>7}{'before':>9}{'after':>9}{'diff':>9}")
+    for name, s in report['accuracy'].items():
+        print(f"{name:<12}{s['n']:>7}{s['before']:>9.4f}{s['after']:>9.4f}{s['diff']:>+9.4f}")
+    print(f"Refit: {report['fit_seconds']:.2f}s  total: {report['seconds']:.2f}s")
+    if report['regressed']:
+        print("Accuracy dropped by more than --max-drop on:", ", ".join(report['regressed']))
+    if 'version' in report:
+        state = "activated" if report['activated'] else "published (not activated)"
+        print(f"Version {report['version']} {state}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental model updates from reviewed feedback")
+    parser.add_argument('--root', default=artifact_store.ARTIFACTS_DIR)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_exp = sub.add_parser('export', help="feedback log -> CSV for reviewers to label")
+    p_exp.add_argument('out')
+    p_exp.add_argument('--log', default=FEEDBACK_PATH)
+    p_exp.add_argument('--since', type=float, default=None, help="only records at/after this unix time")
+    p_app = sub.add_parser('apply', help="refit on a labelled CSV and publish a new version")
+    p_app.add_argument('labels')
+    p_app.add_argument('--anchor', type=float, default=0.1, help="pull towards the current weights")
+    p_app.add_argument('--holdout', type=float, default=0.2, help="share of new rows kept for evaluation")
+    p_app.add_argument('--eval-csv', default=CSV_PATH, help="training CSV sampled for the regression check")
+    p_app.add_argument('--eval-rows', type=int, default=5000)
+    p_app.add_argument('--max-iter', type=int, default=200)
+    p_app.add_argument('--max-drop', type=float, default=None,
+                       help="don't activate if accuracy drops by more than this on either set")
+    p_app.add_argument('--version', default=None)
+    p_app.add_argument('--no-activate', action='store_true')
+    p_app.add_argument('--dry-run', action='store_true', help="report only, publish nothing")
+    p_app.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'export':
+        n = export_feedback(args.log, args.out, args.since)
+        print(f"Wrote {n} messages to {args.out}; fill in the 'label' column and run `apply`.")
+        return 0
+
+    report = apply_labels(args.labels, root=args.root, anchor=args.anchor, holdout=args.holdout,
+                          eval_csv=args.eval_csv, eval_rows=args.eval_rows, max_iter=args.max_iter,
+                          max_drop=args.max_drop, version=args.version, activate=not args.no_activate,
+                          dry_run=args.dry_run)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 2 if report['regressed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())